@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+# Command line converter. Converts RTF files, or every .rtf file in one or
+# more directory trees, to plain text, HTML or JSON using a pool of worker
+# processes.
+#
+# Usage: python -m pyrtfdom [-f text|html|json] [-o DIR] [-j WORKERS]
+#                           [--force] [--slowest N] PATH [PATH ...]
+#
+# Each output file is written next to its input unless an output directory is
+# given, in which case the layout of each directory tree is mirrored inside of
+# it. A manifest in the output directory (or each input's directory) records
+# what's already been converted, so files that haven't changed since the last
+# run are skipped. Files that fail to convert are reported without stopping
+# the others, and the exit status is 1 if any of them failed.
+
+import argparse, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from pyrtfdom.convert import FORMAT_EXTENSIONS, convertWorker
+
+# Name of the manifest file kept in each output directory
+MANIFEST_FILENAME = '.pyrtfdom-manifest.json'
+
+###############################################################################
+
+# Returns (inputFilename, outputFilename) for every file we've been asked to
+# convert.
+def findFiles(paths, outputDir, outputFormat):
+
+	extension = FORMAT_EXTENSIONS[outputFormat]
+	files = []
+
+	def outputFor(filename, relativeTo):
+		if outputDir is None:
+			base = filename
+		else:
+			base = os.path.join(outputDir, os.path.relpath(filename, relativeTo))
+		return os.path.splitext(base)[0] + extension
+
+	for path in paths:
+
+		if os.path.isdir(path):
+			for dirpath, dirnames, filenames in os.walk(path):
+				dirnames.sort()
+				for filename in sorted(filenames):
+					if filename.lower().endswith('.rtf'):
+						filename = os.path.join(dirpath, filename)
+						files.append((filename, outputFor(filename, path)))
+
+		else:
+			files.append((path, outputFor(path, os.path.dirname(path))))
+
+	return files
+
+###############################################################################
+
+# Keeps track of which files have already been converted, and what they
+# looked like when they were, in a manifest file in each output directory.
+class Manifest(object):
+
+	def __init__(self):
+
+		# Manifest contents, by manifest filename
+		self.__manifests = {}
+
+	###########################################################################
+
+	def __manifestFor(self, outputFilename):
+
+		manifestFilename = os.path.join(os.path.dirname(os.path.abspath(outputFilename)), MANIFEST_FILENAME)
+
+		if manifestFilename not in self.__manifests:
+			try:
+				manifestFile = open(manifestFilename, 'r', encoding = 'utf-8')
+				self.__manifests[manifestFilename] = json.load(manifestFile)
+				manifestFile.close()
+			except (OSError, ValueError):
+				self.__manifests[manifestFilename] = {}
+
+		return self.__manifests[manifestFilename]
+
+	###########################################################################
+
+	# Returns what we record about an input file: its size, when it was last
+	# modified and the format it's being converted to.
+	@staticmethod
+	def __signature(inputFilename, outputFormat):
+
+		stat = os.stat(inputFilename)
+		return [stat.st_size, stat.st_mtime_ns, outputFormat]
+
+	###########################################################################
+
+	# Returns True if the input file was already converted to the output file
+	# and hasn't changed since.
+	def isCurrent(self, inputFilename, outputFilename, outputFormat):
+
+		entry = self.__manifestFor(outputFilename).get(os.path.basename(outputFilename))
+
+		return (
+			entry is not None and
+			os.path.exists(outputFilename) and
+			entry == [os.path.abspath(inputFilename)] + self.__signature(inputFilename, outputFormat)
+		)
+
+	###########################################################################
+
+	# Records that the input file was converted to the output file.
+	def update(self, inputFilename, outputFilename, outputFormat):
+
+		manifest = self.__manifestFor(outputFilename)
+		manifest[os.path.basename(outputFilename)] = [os.path.abspath(inputFilename)] + self.__signature(inputFilename, outputFormat)
+
+	###########################################################################
+
+	# Writes every manifest we've changed back to disk.
+	def save(self):
+
+		for manifestFilename, manifest in self.__manifests.items():
+			if manifest:
+				tmpFilename = manifestFilename + '.tmp'
+				manifestFile = open(tmpFilename, 'w', encoding = 'utf-8')
+				json.dump(manifest, manifestFile)
+				manifestFile.close()
+				os.replace(tmpFilename, manifestFilename)
+
+###############################################################################
+
+def parseArguments(argv):
+
+	parser = argparse.ArgumentParser(prog = 'python -m pyrtfdom', description = 'Convert RTF files to plain text, HTML or JSON.')
+
+	parser.add_argument('paths', nargs = '+', metavar = 'PATH', help = 'RTF files, or directories to search for .rtf files')
+	parser.add_argument('-f', '--format', choices = sorted(FORMAT_EXTENSIONS.keys()), default = 'text', help = 'output format (default: text)')
+	parser.add_argument('-o', '--output', metavar = 'DIR', help = 'directory to write output files to (default: next to each input)')
+	parser.add_argument('-j', '--jobs', type = int, default = os.cpu_count(), metavar = 'WORKERS', help = 'number of worker processes (default: one per CPU)')
+	parser.add_argument('--force', action = 'store_true', help = "convert every file, even if it hasn't changed since it was last converted")
+	parser.add_argument('--slowest', type = int, default = 5, metavar = 'N', help = 'number of slowest files to report (default: 5)')
+
+	return parser.parse_args(argv)
+
+###############################################################################
+
+def main(argv = None):
+
+	args = parseArguments(argv)
+
+	manifest = Manifest()
+	files = []
+	skipped = 0
+
+	for inputFilename, outputFilename in findFiles(args.paths, args.output, args.format):
+		if not args.force and manifest.isCurrent(inputFilename, outputFilename, args.format):
+			skipped += 1
+		else:
+			files.append((inputFilename, outputFilename))
+
+	outputFilenames = dict(files)
+	failures = 0
+	totalBytes = 0
+	timings = []
+
+	def fail(inputFilename, error):
+		nonlocal failures
+		failures += 1
+		print('error: ' + inputFilename + ': ' + error, file = sys.stderr)
+
+	start = time.perf_counter()
+
+	# The manifest is saved even if we're interrupted, so that the files that
+	# were converted don't have to be converted again
+	try:
+		with ProcessPoolExecutor(max_workers = max(1, args.jobs)) as executor:
+
+			# Input filename of each file's future
+			futures = {}
+
+			for inputFilename, outputFilename in files:
+				outputDir = os.path.dirname(outputFilename)
+				if outputDir:
+					os.makedirs(outputDir, exist_ok = True)
+				try:
+					futures[executor.submit(convertWorker, inputFilename, outputFilename, args.format)] = inputFilename
+				except BrokenProcessPool as e:
+					fail(inputFilename, type(e).__name__ + ': ' + str(e))
+
+			# Report each file as soon as it's done, in whatever order they
+			# finish. If a worker process dies (running out of memory, for
+			# example), the file it was converting fails, and so does every
+			# file that was still waiting, since the pool can't be used again.
+			for future in as_completed(futures):
+
+				try:
+					inputFilename, fileElapsed, error = future.result()
+				except Exception as e:
+					inputFilename, fileElapsed, error = futures[future], 0, type(e).__name__ + ': ' + str(e)
+
+				if error is not None:
+					fail(inputFilename, error)
+					continue
+
+				print(outputFilenames[inputFilename])
+				manifest.update(inputFilename, outputFilenames[inputFilename], args.format)
+				totalBytes += os.path.getsize(inputFilename)
+				timings.append((fileElapsed, inputFilename))
+
+	finally:
+		manifest.save()
+
+	elapsed = time.perf_counter() - start
+
+	converted = len(timings)
+	print('', file = sys.stderr)
+	print('%d converted, %d skipped, %d failed in %.2fs' % (converted, skipped, failures, elapsed), file = sys.stderr)
+
+	if converted and elapsed > 0:
+		print('%.1f files/s, %.2f MB/s' % (converted / elapsed, totalBytes / elapsed / 1e6), file = sys.stderr)
+
+	if timings and args.slowest > 0:
+		print('Slowest files:', file = sys.stderr)
+		for fileElapsed, inputFilename in sorted(timings, reverse = True)[:args.slowest]:
+			print('  %8.3fs  %s' % (fileElapsed, inputFilename), file = sys.stderr)
+
+	return 1 if failures else 0
+
+###############################################################################
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+# asyncio support. The parser itself is synchronous, so it's driven one step
+# at a time (see RTFParser.parseSteps), every step being at most yieldEvery
+# tokens long. By default, the steps run in the event loop's own thread, and
+# control is handed back to the event loop between them whenever
+# yieldInterval seconds have passed since it last was. Alternatively, the
+# steps can run in an executor, in which case the event loop isn't held up at
+# all, and between steps the parser checks whether the awaiting task has been
+# cancelled or has run out of time, hands any buffered events back to the
+# event loop, and briefly releases the GIL so the loop can run.
+
+import asyncio, threading, time
+
+from pyrtfdom.parse import RTFParser
+
+# Raised inside the parsing thread to unwind the parser when the task that
+# was waiting on it is cancelled or times out. Callers never see this
+# exception; they get asyncio.CancelledError or asyncio.TimeoutError instead.
+class ParseCancelledError(Exception):
+	pass
+
+###############################################################################
+
+# Default minimum number of seconds between handing control back to the
+# event loop (see ParseYielder)
+DEFAULT_YIELD_INTERVAL = 0.005
+
+# Names of the parser callbacks that are turned into events by parseEvents().
+EVENT_CALLBACKS = [
+	'onOpenParagraph',
+	'onAppendParagraph',
+	'onCloseParagraph',
+	'onStateChange',
+	'onPageBreak',
+	'onField',
+	'onImage'
+]
+
+###############################################################################
+
+class ParseYielder(object):
+
+	# yieldInterval is the minimum number of seconds between handing control
+	# back to the event loop (or releasing the GIL, when parsing in an
+	# executor), so that we don't give it up more often than necessary. If
+	# onYield is set, it's called with the parser after every step.
+	def __init__(self, yieldInterval = DEFAULT_YIELD_INTERVAL, onYield = None):
+
+		self.__stop = threading.Event()
+		self.__onYield = onYield
+		self.__yieldInterval = yieldInterval
+		self.__lastYield = time.monotonic()
+
+	###########################################################################
+
+	# Tells the parsing thread to stop the next time it yields.
+	def stop(self):
+
+		self.__stop.set()
+
+	###########################################################################
+
+	# Returns True if stop() has been called.
+	def stopped(self):
+
+		return self.__stop.is_set()
+
+	###########################################################################
+
+	# Called after every step of the parse. Returns True if it's time to
+	# hand control back.
+	def __call__(self, parser):
+
+		if self.__stop.is_set():
+			raise ParseCancelledError()
+
+		if self.__onYield:
+			self.__onYield(parser)
+
+		now = time.monotonic()
+		if now - self.__lastYield >= self.__yieldInterval:
+			self.__lastYield = now
+			return True
+
+		return False
+
+###############################################################################
+
+# Runs the steps of a parse (a generator like the one returned by
+# RTFParser.parseSteps) in the event loop's own thread, yielding after every
+# one of them, and awaits asyncio.sleep(0) whenever the yielder says it's
+# time to hand control back to the event loop. Raises asyncio.TimeoutError
+# if the parse takes more than timeout seconds.
+async def iterSteps(parser, steps, timeout = None, yielder = None):
+
+	loop = asyncio.get_running_loop()
+	deadline = None if timeout is None else loop.time() + timeout
+
+	if yielder is None:
+		yielder = ParseYielder()
+
+	try:
+		for unused in steps:
+
+			if deadline is not None and loop.time() >= deadline:
+				raise asyncio.TimeoutError()
+
+			if yielder(parser):
+				await asyncio.sleep(0)
+
+			yield
+
+	finally:
+		steps.close()
+
+###############################################################################
+
+# Runs the steps of a parse (see iterSteps) to completion. If executor is
+# set, they run there instead of in the event loop's thread (pass
+# concurrent.futures.ThreadPoolExecutor() or the like; the parser's state
+# can't be sent to another process.) Either way, if the awaiting task is
+# cancelled, or if timeout seconds elapse first, the parser is stopped after
+# its current step and the cancellation (or asyncio.TimeoutError) is
+# propagated.
+async def runParser(parser, steps, executor = None, timeout = None, yielder = None):
+
+	if yielder is None:
+		yielder = ParseYielder()
+
+	if executor is None:
+		async for unused in iterSteps(parser, steps, timeout, yielder):
+			pass
+		return
+
+	def run():
+		try:
+			for unused in steps:
+				if yielder(parser):
+					time.sleep(0)
+		finally:
+			steps.close()
+
+	loop = asyncio.get_running_loop()
+	future = loop.run_in_executor(executor, run)
+
+	try:
+		await asyncio.wait_for(asyncio.shield(future), timeout)
+	except BaseException:
+		yielder.stop()
+		try:
+			await future
+		except ParseCancelledError:
+			pass
+		raise
+
+###############################################################################
+
+# Asynchronously parses an RTF string, yielding events of the form
+# (callbackName, arg1, arg2, ...) as the parser produces them. For example,
+# text appended to the current paragraph results in
+# ('onAppendParagraph', text). The state passed along with onStateChange and
+# the other events are copies that are safe to keep. The parse runs in the
+# event loop's thread unless an executor is given (see runParser.) Events
+# are delivered in batches (one per step), and when parsing in an executor,
+# at most maxBatches batches are allowed to queue up before the parser waits
+# for the consumer to catch up.
+async def parseEvents(rtfContent, executor = None, timeout = None, yieldEvery = RTFParser.DEFAULT_YIELD_EVERY, maxBatches = 16, yieldInterval = DEFAULT_YIELD_INTERVAL):
+
+	batch = []
+
+	def makeCallback(name):
+		def callback(parser, *args):
+			batch.append((name,) + args)
+		return callback
+
+	callbacks = {}
+	for name in EVENT_CALLBACKS:
+		callbacks[name] = makeCallback(name)
+
+	parser = RTFParser({'callbacks': callbacks})
+	parser.openString(rtfContent)
+	steps = parser.parseSteps(yieldEvery)
+
+	# In the event loop's thread, the consumer gets each step's events as
+	# soon as the step is done, so nothing ever queues up
+	if executor is None:
+
+		async for unused in iterSteps(parser, steps, timeout, ParseYielder(yieldInterval)):
+			events = list(batch)
+			del batch[:]
+			for event in events:
+				yield event
+
+		for event in batch:
+			yield event
+
+		return
+
+	loop = asyncio.get_running_loop()
+	queue = asyncio.Queue()
+	slots = threading.Semaphore(maxBatches)
+	yielder = ParseYielder(yieldInterval, lambda parser: flush())
+
+	# Hands the current batch of events back to the event loop. If the
+	# consumer has fallen too far behind, wait for it (but don't wait forever
+	# if we've been told to stop.)
+	def flush():
+		if batch:
+			while not slots.acquire(timeout = 0.1):
+				if yielder.stopped():
+					raise ParseCancelledError()
+			loop.call_soon_threadsafe(queue.put_nowait, list(batch))
+			del batch[:]
+
+	# The events from the last step are flushed once the parse is done
+	def run():
+		yield from steps
+		flush()
+
+	task = asyncio.ensure_future(runParser(parser, run(), executor, timeout, yielder))
+	task.add_done_callback(lambda t: loop.call_soon(queue.put_nowait, None))
+
+	try:
+		while True:
+			events = await queue.get()
+			if events is None:
+				break
+			slots.release()
+			for event in events:
+				yield event
+
+		# Re-raises any exception that occurred while parsing
+		await task
+
+	finally:
+		if not task.done():
+			yielder.stop()
+			task.cancel()
+			try:
+				await task
+			except (asyncio.CancelledError, ParseCancelledError):
+				pass
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# Utilities for parsing many documents at once on a thread pool. Parser and
+# DOM instances don't share any mutable state, so each worker thread simply
+# keeps its own RTFDOM. On a regular CPython build, the GIL limits how much
+# this can speed things up, but on free-threaded builds parsing scales with
+# the number of workers.
+
+import contextlib, queue, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pyrtfdom.dom import RTFDOM
+
+# Each worker thread's RTFDOM instance
+_workerDOM = threading.local()
+
+###############################################################################
+
+# Returns the calling thread's RTFDOM instance, creating it if necessary.
+def _getWorkerDOM():
+
+	dom = getattr(_workerDOM, 'dom', None)
+	if dom is None:
+		dom = RTFDOM()
+		_workerDOM.dom = dom
+
+	return dom
+
+###############################################################################
+
+# Parses a single RTF string and returns the root node of its DOM tree.
+def _parseString(rtfString):
+
+	dom = _getWorkerDOM()
+	dom.openString(rtfString)
+	dom.parse()
+
+	return dom.rootNode
+
+###############################################################################
+
+# Parses a single RTF file and returns the root node of its DOM tree.
+def _parseFile(filename):
+
+	dom = _getWorkerDOM()
+	dom.openFile(filename)
+	dom.parse()
+
+	return dom.rootNode
+
+###############################################################################
+
+# Parses a batch of RTF documents using a pool of maxWorkers threads and
+# returns the root node of each document's DOM tree, in the same order the
+# documents were given. If fromFiles is True, documents should be a list of
+# filenames. Otherwise, it should be a list of RTF strings. If any document
+# fails to parse, its exception is raised here.
+def parseBatch(documents, maxWorkers = None, fromFiles = False):
+
+	parseFunc = _parseFile if fromFiles else _parseString
+
+	with ThreadPoolExecutor(max_workers = maxWorkers) as executor:
+		return list(executor.map(parseFunc, documents))
+
+###############################################################################
+
+# A pool of warm, reusable RTFDOM instances that can be shared between worker
+# threads. Creating an RTFDOM sets up its parser, callbacks and field drivers,
+# which for small snippets costs more than parsing them, so it pays to create
+# a handful once and hand them out as needed. Use it like this:
+#
+#   pool = RTFDOMPool()
+#   with pool.dom() as dom:
+#       dom.openString(rtfString)
+#       dom.parse()
+#
+# Each instance is only ever handed to one thread at a time. Note that the
+# tree of the last document parsed belongs to the instance, so hold on to
+# dom.rootNode (or a copy via getTreeNodes()) before giving it back.
+class RTFDOMPool(object):
+
+	# If maxSize is set, at most that many idle instances are kept around.
+	def __init__(self, maxSize = None):
+
+		self.__maxSize = maxSize
+		self.__idle = queue.LifoQueue()
+
+	###########################################################################
+
+	# Returns an idle instance, or a new one if none are available.
+	def acquire(self):
+
+		try:
+			return self.__idle.get_nowait()
+		except queue.Empty:
+			return RTFDOM()
+
+	###########################################################################
+
+	# Resets an instance and returns it to the pool.
+	def release(self, dom):
+
+		dom.reset()
+
+		if self.__maxSize is None or self.__idle.qsize() < self.__maxSize:
+			self.__idle.put(dom)
+
+	###########################################################################
+
+	# Context manager that acquires an instance and releases it when done.
+	@contextlib.contextmanager
+	def dom(self):
+
+		dom = self.acquire()
+		try:
+			yield dom
+		finally:
+			self.release(dom)
+
+	###########################################################################
+
+	# Parses a list of RTF snippets, reusing one pooled instance for all of
+	# them, and returns the root node of each snippet's tree in order.
+	def parseMany(self, rtfStrings):
+
+		with self.dom() as dom:
+			return list(dom.parseMany(rtfStrings))
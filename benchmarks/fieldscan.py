@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# Checks that extractFields (see fields.py), which scans for fields without
+# parsing, finds the same fields as the parser does: the same instructions
+# and results, in the same order. The documents are chosen to exercise the
+# places where scanning ahead for the end of a group can go wrong (escaped
+# braces, \binN data containing braces, nested groups, etc.) They leave out
+# things the parser doesn't put in a field's result as text (like escaped
+# symbols and hex encoded pictures), since it's where fields begin and end
+# that's being checked. It also reports how much faster scanning is than
+# parsing. The exit status is 1 if the scanner and the parser disagree on
+# any document.
+#
+# Usage: python -m pyrtfdom.benchmarks.fieldscan
+
+import sys, time
+
+from pyrtfdom.fields import extractFields, parseInstruction
+from pyrtfdom.parse import RTFParser
+from pyrtfdom.benchmarks.memory import makeDocument
+
+def wrapDocument(body):
+
+	return '{\\rtf1\\ansi\\ansicpg1252\\deff0{\\fonttbl{\\f0 Arial;}}\n' + body + '\\par}'
+
+# Name and content of each document
+DOCUMENTS = [
+	('plain', wrapDocument(
+		'See {\\field{\\*\\fldinst HYPERLINK "http://example.com/"}{\\fldrslt link}} here.'
+	)),
+	('formatted result', wrapDocument(
+		'{\\field{\\*\\fldinst {\\b HYPERLINK} "http://example.com/"}{\\fldrslt {\\b bold} and {\\i italic}}}'
+	)),
+	('escaped braces', wrapDocument(
+		'\\{\\field \\} {\\field{\\*\\fldinst HYPERLINK "http://example.com/"}{\\fldrslt link}} \\{'
+	)),
+	('binary data', wrapDocument(
+		'{\\field{\\*\\fldinst HYPERLINK "http://example.com/"}{\\fldrslt {\\pict\\bin1 {}link}}'
+		'{\\field{\\*\\fldinst PAGE}{\\fldrslt {\\pict\\pngblip\\bin4 }}{{}two}}'
+	)),
+	('picture', wrapDocument(
+		'{\\field{\\*\\fldinst INCLUDEPICTURE "a.png"}{\\fldrslt {\\pict\\pngblip\\bin3 }{}}caption}}'
+		'{\\pict\\pngblip\\bin1 {}{\\field{\\*\\fldinst PAGE}{\\fldrslt 1}}'
+	)),
+	('page breaks', wrapDocument(
+		'A{\\field{\\*\\fldinst PAGE}{\\fldrslt 1\\page 2\\par 3}}B'
+	)),
+	('generated', makeDocument(500)),
+	('generated bytes', makeDocument(500).encode('latin-1'))
+]
+
+###############################################################################
+
+# Returns (field type, arguments, result) for every field the parser finds.
+def parseFields(rtfContent):
+
+	fields = []
+
+	def onField(parser, fldinst, fldrslt):
+		fieldType, arguments = parseInstruction(fldinst)
+		fields.append((fieldType, arguments, fldrslt))
+
+	ignore = lambda *args: None
+
+	parser = RTFParser({'callbacks': {
+		'onOpenParagraph':   ignore,
+		'onAppendParagraph': ignore,
+		'onStateChange':     None,
+		'onField':           onField
+	}})
+	parser.openString(rtfContent)
+	parser.parse()
+
+	return fields
+
+###############################################################################
+
+# Returns (field type, arguments, result) for every field the scanner finds.
+def scanFields(rtfContent):
+
+	return [(fieldType, arguments, result) for fieldType, arguments, result, offset in extractFields(rtfContent)]
+
+###############################################################################
+
+def main():
+
+	failures = []
+
+	for name, rtfContent in DOCUMENTS:
+
+		start = time.perf_counter()
+		parsed = parseFields(rtfContent)
+		parseTime = time.perf_counter() - start
+
+		start = time.perf_counter()
+		scanned = scanFields(rtfContent)
+		scanTime = time.perf_counter() - start
+
+		status = 'ok'
+		if parsed != scanned:
+			failures.append('%s: parser found %r, scanner found %r' % (name, parsed, scanned))
+			status = 'FAIL'
+
+		print('%-16s %4d fields  parse %.4fs  scan %.4fs  %s' % (name, len(parsed), parseTime, scanTime, status))
+
+	if failures:
+		print('')
+		for failure in failures:
+			print('FAILED: ' + failure)
+		return 1
+
+	return 0
+
+###############################################################################
+
+if '__main__' == __name__:
+	sys.exit(main())
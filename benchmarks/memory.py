@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+# Measures memory use with tracemalloc while parsing synthetic documents of
+# increasing size, in a few different ways (the parser alone, a full RTFDOM,
+# streaming, lazy parsing and a FlatTree.) For each scenario and size, it
+# reports peak traced memory, how much is still allocated once parsing's done
+# (for a DOM, that's the size of the tree), how many allocations that's made
+# up of (from tracemalloc's statistics), and each of those per MB of input.
+# Retained memory and allocations are also broken down by the module that
+# allocated them.
+#
+# Each scenario's figures are checked against the budgets (per MB of input)
+# recorded in memory_budgets.json, and the exit status is 1 if any of them
+# were exceeded. Running with --record measures everything and records new
+# budgets, with some headroom.
+#
+# Usage: python -m pyrtfdom.benchmarks.memory [--record] [paragraphs ...]
+
+import argparse, gc, json, os, sys, tracemalloc
+
+from pyrtfdom.dom import RTFDOM
+from pyrtfdom.parse import RTFParser
+
+# Where budgets are recorded
+BUDGETS_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'memory_budgets.json')
+
+# How much higher than what we measure recorded budgets are
+BUDGET_HEADROOM = 1.25
+
+# Fixed amount of memory, in bytes, allowed on top of each memory budget.
+# This covers one-off allocations (caches, codecs, etc.) that don't grow with
+# the input and would otherwise dominate the per MB figures for small
+# documents.
+BUDGET_ALLOWANCE = 256 * 1024
+
+# Same as BUDGET_ALLOWANCE, but for the number of allocations
+BLOCK_ALLOWANCE = 2000
+
+# Budgeted figures, with the allowance and unit of each
+METRICS = [
+	('peakPerMB',           BUDGET_ALLOWANCE, 'MB'),
+	('retainedPerMB',       BUDGET_ALLOWANCE, 'MB'),
+	('retainedBlocksPerMB', BLOCK_ALLOWANCE,  'allocations')
+]
+
+# Document sizes, in paragraphs, used when none are given
+DEFAULT_SIZES = [500, 2000]
+
+# The package's root directory, so that allocations can be attributed to its
+# modules
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+###############################################################################
+
+# Generates a synthetic document with the given number of paragraphs, with
+# the kind of formatting, fields and images a word processor would produce.
+def makeDocument(paragraphs):
+
+	body = []
+	for i in range(paragraphs):
+
+		if 0 == i % 50:
+			body.append('{\\pict\\pngblip\\picw16\\pich16 ' + '89504e470d0a1a0a' * 32 + '}\\par\n')
+
+		elif 0 == i % 10:
+			body.append('\\pard\\qc See {\\field{\\*\\fldinst HYPERLINK "http://example.com/' + str(i) + '"}{\\fldrslt link ' + str(i) + '}} for details.\\par\n')
+
+		else:
+			body.append('\\pard\\plain Paragraph ' + str(i) + ' with {\\b bold}, {\\i italic {\\ul underlined}} and plain text, caf\\\'e9.\\par\n')
+
+	return '{\\rtf1\\ansi\\ansicpg1252\\deff0{\\fonttbl{\\f0 Arial;}}{\\colortbl;\\red255\\green0\\blue0;}\n' + ''.join(body) + '}'
+
+###############################################################################
+
+# Each scenario parses a document and returns whatever it leaves behind,
+# which is kept alive while retained memory is measured.
+
+def parserScenario(rtfContent):
+
+	ignore = lambda *args: None
+
+	parser = RTFParser({'callbacks': {
+		'onOpenParagraph':   ignore,
+		'onAppendParagraph': ignore,
+		'onStateChange':     ignore,
+		'onField':           ignore
+	}})
+
+	parser.openString(rtfContent)
+	parser.parse()
+
+	return parser
+
+def domScenario(rtfContent):
+
+	dom = RTFDOM()
+	dom.openString(rtfContent)
+	dom.parse()
+
+	return dom
+
+def streamingScenario(rtfContent):
+
+	dom = RTFDOM()
+	dom.openString(rtfContent)
+	dom.parseStreaming(lambda para: None)
+
+	return dom
+
+def lazyScenario(rtfContent):
+
+	dom = RTFDOM()
+	dom.openString(rtfContent)
+	dom.parseLazy()
+
+	return dom
+
+def flatScenario(rtfContent):
+
+	dom = RTFDOM()
+	dom.openString(rtfContent)
+
+	return dom.parseFlat().tree
+
+SCENARIOS = [
+	('parser',    parserScenario),
+	('dom',       domScenario),
+	('streaming', streamingScenario),
+	('lazy',      lazyScenario),
+	('flat',      flatScenario)
+]
+
+###############################################################################
+
+# Returns the name of the package module that allocated memory in the given
+# file, or 'other' if it isn't one of ours.
+def moduleName(filename):
+
+	filename = os.path.abspath(filename)
+
+	if filename.startswith(PACKAGE_DIR + os.sep):
+		return os.path.relpath(filename, PACKAGE_DIR).replace(os.sep, '/')
+
+	return 'other'
+
+###############################################################################
+
+# Runs a scenario and returns (peak bytes, retained bytes, retained
+# allocations, retained bytes and allocations by module as (bytes,
+# allocations) pairs.) Memory allocated before the scenario started,
+# including the document itself, isn't counted.
+def measure(scenario, rtfContent):
+
+	gc.collect()
+	tracemalloc.start()
+
+	try:
+		result = scenario(rtfContent)
+
+		unused, peak = tracemalloc.get_traced_memory()
+
+		gc.collect()
+		snapshot = tracemalloc.take_snapshot()
+
+	finally:
+		tracemalloc.stop()
+
+	byModule = {}
+	for statistic in snapshot.statistics('filename'):
+		module = moduleName(statistic.traceback[0].filename)
+		size, blocks = byModule.get(module, (0, 0))
+		byModule[module] = (size + statistic.size, blocks + statistic.count)
+
+	# Keep the result alive until we've taken the snapshot
+	del result
+
+	retained = sum(size for size, blocks in byModule.values())
+	retainedBlocks = sum(blocks for size, blocks in byModule.values())
+
+	return peak, retained, retainedBlocks, byModule
+
+###############################################################################
+
+def loadBudgets():
+
+	if not os.path.exists(BUDGETS_FILENAME):
+		return {}
+
+	budgetsFile = open(BUDGETS_FILENAME, 'r')
+	budgets = json.load(budgetsFile)
+	budgetsFile.close()
+
+	return budgets
+
+###############################################################################
+
+def saveBudgets(budgets):
+
+	budgetsFile = open(BUDGETS_FILENAME, 'w')
+	json.dump(budgets, budgetsFile, indent = '\t', sort_keys = True)
+	budgetsFile.write('\n')
+	budgetsFile.close()
+
+###############################################################################
+
+def main():
+
+	argParser = argparse.ArgumentParser(prog = 'python -m pyrtfdom.benchmarks.memory')
+	argParser.add_argument('--record', action = 'store_true', help = 'record new budgets instead of checking them')
+	argParser.add_argument('sizes', nargs = '*', type = int, metavar = 'paragraphs', help = 'document sizes to test, in paragraphs')
+	args = argParser.parse_args()
+
+	sizes = args.sizes or DEFAULT_SIZES
+	budgets = loadBudgets()
+	newBudgets = {}
+	failures = []
+
+	for paragraphs in sizes:
+
+		rtfContent = makeDocument(paragraphs)
+		inputMB = len(rtfContent) / 1e6
+
+		print('%d paragraphs (%.2f MB)' % (paragraphs, inputMB))
+
+		for name, scenario in SCENARIOS:
+
+			peak, retained, retainedBlocks, byModule = measure(scenario, rtfContent)
+			measured = {'peakPerMB': peak, 'retainedPerMB': retained, 'retainedBlocksPerMB': retainedBlocks}
+			perMB = {key: value / inputMB for key, value in measured.items()}
+
+			print('  %-10s peak %8.2f MB (%6.1f MB/MB)   retained %8.2f MB (%6.1f MB/MB) in %8d allocations (%9.0f/MB)' % (
+				name, peak / 1e6, perMB['peakPerMB'] / 1e6, retained / 1e6, perMB['retainedPerMB'] / 1e6,
+				retainedBlocks, perMB['retainedBlocksPerMB']
+			))
+
+			for module, (size, blocks) in sorted(byModule.items(), key = lambda item: -item[1][0]):
+				if size >= 1024:
+					print('      %-28s %10.1f KB %10d allocations' % (module, size / 1024, blocks))
+
+			# Budgets are what we measured per MB, with some headroom. For
+			# small documents, that includes fixed overhead, so budgets are
+			# never zero.
+			if args.record:
+				budget = newBudgets.setdefault(name, {})
+				for key, value in perMB.items():
+					budget[key] = max(budget.get(key, 0), int(value * BUDGET_HEADROOM))
+
+			elif name in budgets:
+				for key, allowance, unit in METRICS:
+					if key in budgets[name]:
+						limit = budgets[name][key] * inputMB + allowance
+						if measured[key] > limit:
+							if 'MB' == unit:
+								failures.append('%s at %d paragraphs: %s used %.2f MB, over its budget of %.2f MB' % (
+									name, paragraphs, key[:-len('PerMB')], measured[key] / 1e6, limit / 1e6
+								))
+							else:
+								failures.append('%s at %d paragraphs: %s was %d %s, over its budget of %d' % (
+									name, paragraphs, key[:-len('PerMB')], measured[key], unit, limit
+								))
+
+	if args.record:
+		saveBudgets(newBudgets)
+		print('Recorded budgets in ' + BUDGETS_FILENAME)
+		return 0
+
+	if failures:
+		print('')
+		for failure in failures:
+			print('OVER BUDGET: ' + failure)
+		return 1
+
+	return 0
+
+###############################################################################
+
+if '__main__' == __name__:
+	sys.exit(main())
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+# Checks that parsing scales no worse than n log n. Each feature (plain text,
+# long paragraphs, fields, images, nesting, styles, colors and fonts) is
+# parsed into an RTFDOM at a series of doubling sizes, and the runtime and
+# peak traced memory at each size are fitted to a power curve after dividing
+# out n log n. Anything that grows at least that fast shows up as a positive
+# exponent, and quadratic behavior as an exponent close to 1. The exit status
+# is 1 if any feature's exponent is above the tolerance, so that new
+# quadratic paths fail the build instead of turning up in production.
+#
+# Runtime is noisy, so the number of lines of Python executed while parsing
+# (see countSteps) is also fitted, after dividing out n, at sizes small
+# enough to trace. It's the same on every run, so it gets a much tighter
+# tolerance, and it's what the tests check (see tests/test_scaling.py.) It
+# doesn't see work done inside of builtins (like copying strings), which is
+# what the runtime and memory checks are still for.
+#
+# Usage: python -m pyrtfdom.benchmarks.scaling [feature ...]
+
+import gc, math, sys, time, tracemalloc
+
+from pyrtfdom.dom import RTFDOM
+
+# Number of doubling steps each feature is measured at
+STEPS = 5
+
+# Runtime is the best of this many runs, which filters out most noise
+REPEATS = 3
+
+# How far above n log n the fitted exponents are allowed to go. Timing is
+# noisier than memory, so it gets more leeway. Quadratic growth gives an
+# exponent of about 1.
+TIME_TOLERANCE = 0.3
+MEMORY_TOLERANCE = 0.2
+
+# How far above linear the fitted exponent of the number of steps is allowed
+# to go
+STEP_TOLERANCE = 0.05
+
+###############################################################################
+
+def wrapDocument(header, body):
+
+	return '{\\rtf1\\ansi\\ansicpg1252\\deff0{\\fonttbl{\\f0 Arial;}}' + header + '\n' + body + '}'
+
+# Each feature generates a document whose size is proportional to n
+
+def textDocument(n):
+
+	return wrapDocument('', ''.join('Paragraph ' + str(i) + ' with {\\b bold} and {\\i italic} text.\\par\n' for i in range(n)))
+
+def longParagraphDocument(n):
+
+	return wrapDocument('', ''.join('word' + str(i) + ' {\\b bold} ' for i in range(n)) + '\\par\n')
+
+def fieldsDocument(n):
+
+	return wrapDocument('', ''.join('See {\\field{\\*\\fldinst HYPERLINK "http://example.com/' + str(i) + '"}{\\fldrslt link}} here.\\par\n' for i in range(n)))
+
+def fieldResultDocument(n):
+
+	return wrapDocument('', '{\\field{\\*\\fldinst HYPERLINK "http://example.com/"}{\\fldrslt ' + 'link text ' * n + '}}\\par\n')
+
+def imageDocument(n):
+
+	return wrapDocument('', '{\\pict\\pngblip\\picw16\\pich16 ' + '89504e470d0a1a0a\n' * n + '}\\par\n')
+
+def nestingDocument(n):
+
+	return wrapDocument('', ''.join('{\\b' + str(i % 2) + ' level ' for i in range(n)) + '}' * n + '\\par\n')
+
+def stylesDocument(n):
+
+	styles = ''.join('{\\s' + str(i) + '\\q' + 'lrcj'[i % 4] + ' Style ' + str(i) + ';}' for i in range(1, n + 1))
+	body = ''.join('\\pard\\s' + str(i) + ' Styled paragraph.\\par\n' for i in range(1, n + 1))
+
+	return wrapDocument('{\\stylesheet{\\s0 Normal;}' + styles + '}', body)
+
+def colorsDocument(n):
+
+	colors = ''.join('\\red' + str(i % 256) + '\\green' + str(i // 256 % 256) + '\\blue0;' for i in range(n))
+	body = ''.join('{\\cf' + str(i + 1) + ' Colored} text.\\par\n' for i in range(n))
+
+	return wrapDocument('{\\colortbl;' + colors + '}', body)
+
+def fontsDocument(n):
+
+	fonts = ''.join('{\\f' + str(i) + '\\fnil\\fcharset0 Font ' + str(i) + ';}' for i in range(1, n + 1))
+	body = ''.join('{\\f' + str(i) + ' In font ' + str(i) + '.}\\par\n' for i in range(1, n + 1))
+
+	return '{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Arial;}' + fonts + '}\n' + body + '}'
+
+# Name, document generator, smallest size and smallest size to count steps
+# at of each feature
+FEATURES = [
+	('text',          textDocument,          125,   25),
+	('longParagraph', longParagraphDocument, 250,   25),
+	('fields',        fieldsDocument,        125,   25),
+	('fieldResult',   fieldResultDocument,   20000, 500),
+	('images',        imageDocument,         20000, 500),
+	('nesting',       nestingDocument,       250,   25),
+	('styles',        stylesDocument,        125,   25),
+	('colors',        colorsDocument,        125,   25),
+	('fonts',         fontsDocument,         125,   25)
+]
+
+###############################################################################
+
+def parse(rtfContent):
+
+	dom = RTFDOM()
+	dom.openString(rtfContent)
+	dom.parse()
+
+	return dom
+
+###############################################################################
+
+# Returns the best of REPEATS runtimes, in seconds.
+def measureTime(rtfContent):
+
+	best = None
+
+	for i in range(REPEATS):
+		gc.collect()
+		start = time.perf_counter()
+		parse(rtfContent)
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+
+	return best
+
+###############################################################################
+
+# Returns peak traced memory, in bytes.
+def measureMemory(rtfContent):
+
+	gc.collect()
+	tracemalloc.start()
+
+	try:
+		dom = parse(rtfContent)
+		unused, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+
+	del dom
+	return peak
+
+###############################################################################
+
+# Returns the number of lines of Python executed while parsing, which unlike
+# runtime is the same every time. The document is parsed once beforehand, so
+# that work only done the first time around (like filling the header cache)
+# isn't counted.
+def countSteps(rtfContent):
+
+	parse(rtfContent)
+	steps = 0
+
+	def trace(frame, event, arg):
+		nonlocal steps
+		if 'line' == event:
+			steps += 1
+		return trace
+
+	sys.settrace(trace)
+
+	try:
+		parse(rtfContent)
+	finally:
+		sys.settrace(None)
+
+	return steps
+
+###############################################################################
+
+# Fits values measured at sizes to c * growth(n) * n^k using least squares
+# on a log-log scale and returns k. By default, growth is n log n.
+def excessExponent(sizes, values, growth = lambda n: n * math.log(n)):
+
+	xs = [math.log(n) for n in sizes]
+	ys = [math.log(value / growth(n)) for n, value in zip(sizes, values)]
+
+	xMean = sum(xs) / len(xs)
+	yMean = sum(ys) / len(ys)
+
+	return sum((x - xMean) * (y - yMean) for x, y in zip(xs, ys)) / sum((x - xMean) ** 2 for x in xs)
+
+###############################################################################
+
+# Returns the number of steps (see countSteps) it takes to parse a feature's
+# document at STEPS doubling sizes, starting at smallest, along with how far
+# above linear they grow (see excessExponent.)
+def measureSteps(makeDocument, smallest):
+
+	sizes = [smallest * 2 ** step for step in range(STEPS)]
+	steps = [countSteps(makeDocument(n)) for n in sizes]
+
+	return steps, excessExponent(sizes, steps, lambda n: n)
+
+###############################################################################
+
+def main():
+
+	names = sys.argv[1:]
+	failures = []
+
+	for name, makeDocument, smallest, smallestSteps in FEATURES:
+
+		if names and name not in names:
+			continue
+
+		sizes = [smallest * 2 ** step for step in range(STEPS)]
+		times = []
+		peaks = []
+
+		for n in sizes:
+			rtfContent = makeDocument(n)
+			times.append(measureTime(rtfContent))
+			peaks.append(measureMemory(rtfContent))
+
+		timeExponent = excessExponent(sizes, times)
+		memoryExponent = excessExponent(sizes, peaks)
+		steps, stepExponent = measureSteps(makeDocument, smallestSteps)
+
+		status = 'ok'
+		if timeExponent > TIME_TOLERANCE:
+			failures.append('%s: runtime grows faster than n log n (excess exponent %.2f)' % (name, timeExponent))
+			status = 'FAIL'
+		if memoryExponent > MEMORY_TOLERANCE:
+			failures.append('%s: memory grows faster than n log n (excess exponent %.2f)' % (name, memoryExponent))
+			status = 'FAIL'
+		if stepExponent > STEP_TOLERANCE:
+			failures.append('%s: steps grow faster than n (excess exponent %.2f)' % (name, stepExponent))
+			status = 'FAIL'
+
+		print('%-14s n=%d..%d  time %.3fs..%.3fs (%+.2f)  peak %.2f..%.2f MB (%+.2f)  steps %d..%d (%+.2f)  %s' % (
+			name, sizes[0], sizes[-1], times[0], times[-1], timeExponent, peaks[0] / 1e6, peaks[-1] / 1e6, memoryExponent,
+			steps[0], steps[-1], stepExponent, status
+		))
+
+	if failures:
+		print('')
+		for failure in failures:
+			print('FAILED: ' + failure)
+		return 1
+
+	return 0
+
+###############################################################################
+
+if '__main__' == __name__:
+	sys.exit(main())
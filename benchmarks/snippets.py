@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+# Measures throughput, in snippets per second, when parsing lots of small RTF
+# fragments, comparing a new RTFDOM per snippet against a single reused
+# instance (RTFDOM.parseMany) and a pool shared by worker threads.
+#
+# Usage: python -m pyrtfdom.benchmarks.snippets [snippets] [workers]
+
+import sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyrtfdom.dom import RTFDOM
+from pyrtfdom.batch import RTFDOMPool
+
+# A typical ~200 byte note
+SNIPPET = '{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Arial;}}\\pard Call the customer back about the {\\b renewal} quote, and {\\i remember} to mention the discount.\\par}'
+
+###############################################################################
+
+def report(name, count, elapsed):
+
+	print('%-24s %10.1f snippets/s' % (name, count / elapsed))
+
+###############################################################################
+
+def main():
+
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+	snippets = [SNIPPET] * count
+
+	start = time.perf_counter()
+	for snippet in snippets:
+		dom = RTFDOM()
+		dom.openString(snippet)
+		dom.parse()
+	report('new RTFDOM per snippet', count, time.perf_counter() - start)
+
+	start = time.perf_counter()
+	for rootNode in RTFDOM().parseMany(snippets):
+		pass
+	report('RTFDOM.parseMany', count, time.perf_counter() - start)
+
+	pool = RTFDOMPool()
+	chunkSize = max(count // (workers * 4), 1)
+	chunks = [snippets[i:i + chunkSize] for i in range(0, count, chunkSize)]
+
+	start = time.perf_counter()
+	with ThreadPoolExecutor(max_workers = workers) as executor:
+		for result in executor.map(pool.parseMany, chunks):
+			pass
+	report('pool, %d workers' % workers, count, time.perf_counter() - start)
+
+###############################################################################
+
+if '__main__' == __name__:
+	main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# Measures how parseBatch() scales with the number of worker threads. On a
+# regular CPython build, expect little or no speedup because of the GIL. On a
+# free-threaded build (python3.13t and later), throughput should grow with the
+# number of workers up to the number of available cores.
+#
+# Usage: python -m pyrtfdom.benchmarks.threads [documents] [paragraphs]
+
+import os, sys, time
+
+from pyrtfdom.batch import parseBatch
+
+###############################################################################
+
+# Generates a synthetic RTF document with the given number of paragraphs.
+def makeDocument(paragraphs):
+
+	body = ''
+	for i in range(paragraphs):
+		body += 'Paragraph ' + str(i) + ' with {\\b bold}, {\\i italic} and plain text.\\par\n'
+
+	return '{\\rtf1\\ansi{\\colortbl;\\red255\\green0\\blue0;}\n' + body + '}'
+
+###############################################################################
+
+def main():
+
+	documentCount = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+	paragraphs = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+	documents = [makeDocument(paragraphs)] * documentCount
+
+	if hasattr(sys, '_is_gil_enabled'):
+		gil = 'enabled' if sys._is_gil_enabled() else 'disabled'
+	else:
+		gil = 'enabled'
+
+	print('Python ' + sys.version.split()[0] + ', GIL ' + gil + ', ' + str(os.cpu_count()) + ' CPUs')
+	print('%d documents of %d paragraphs each' % (documentCount, paragraphs))
+
+	baseline = None
+	workers = 1
+	while workers <= max(os.cpu_count() or 1, 1):
+
+		start = time.perf_counter()
+		parseBatch(documents, workers)
+		elapsed = time.perf_counter() - start
+
+		if baseline is None:
+			baseline = elapsed
+
+		print('%3d workers: %8.1f documents/s, speedup %.2fx' % (workers, documentCount / elapsed, baseline / elapsed))
+		workers *= 2
+
+###############################################################################
+
+if '__main__' == __name__:
+	main()
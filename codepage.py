@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Mapping between RTF's character sets and code pages and Python's codecs.
+# Text in an RTF document is written in the code page given by \ansicpg (or
+# \ansi, \mac, \pc and \pca), unless the current font declares a different
+# one with \fcharset or \cpg. Bytes written as \'xx are decoded accordingly.
+
+import codecs, functools
+
+# Code page assumed when the document doesn't declare one
+DEFAULT_CODEPAGE = 1252
+
+# Code pages implied by the \ansi, \mac, \pc and \pca control words
+CHARACTER_SET_CODEPAGES = {
+	'\\ansi': 1252,
+	'\\mac':  10000,
+	'\\pc':   437,
+	'\\pca':  850
+}
+
+# Code pages for each \fcharsetN. Charsets 0 (ANSI) and 1 (default) don't have
+# one of their own and use the document's code page instead. Symbol fonts
+# (charset 2) map bytes directly to characters.
+FONT_CHARSET_CODEPAGES = {
+	2:   'symbol',
+	77:  10000,
+	78:  10001,
+	79:  10003,
+	80:  10008,
+	81:  10002,
+	83:  10005,
+	84:  10004,
+	85:  10006,
+	86:  10081,
+	87:  10021,
+	88:  10029,
+	89:  10007,
+	128: 932,
+	129: 949,
+	130: 1361,
+	134: 936,
+	136: 950,
+	161: 1253,
+	162: 1254,
+	163: 1258,
+	177: 1255,
+	178: 1256,
+	186: 1257,
+	204: 1251,
+	222: 874,
+	238: 1250,
+	254: 437,
+	255: 850
+}
+
+# Python codec names for code pages that aren't simply 'cpN'
+CODEPAGE_CODECS = {
+	'symbol': 'latin-1',
+	10000:    'mac_roman',
+	10001:    'shift_jis',
+	10002:    'big5',
+	10003:    'euc_kr',
+	10004:    'mac_arabic',
+	10006:    'mac_greek',
+	10007:    'mac_cyrillic',
+	10008:    'gb2312',
+	10029:    'mac_latin2',
+	10079:    'mac_iceland',
+	10081:    'mac_turkish',
+	1361:     'johab',
+	65001:    'utf-8'
+}
+
+###############################################################################
+
+# Returns the code page for a font's \fcharsetN, or None if the font uses the
+# document's code page.
+def charsetCodepage(charset):
+
+	return FONT_CHARSET_CODEPAGES.get(charset)
+
+###############################################################################
+
+# Returns an incremental decoder class for the given code page. Looking up a
+# codec is relatively expensive, so the result is cached. Code pages Python
+# doesn't know about fall back to Latin-1, which at least preserves the bytes.
+@functools.lru_cache(maxsize = None)
+def getDecoder(codepage):
+
+	codecName = CODEPAGE_CODECS.get(codepage, 'cp' + str(codepage))
+
+	try:
+		return codecs.getincrementaldecoder(codecName)
+	except LookupError:
+		return codecs.getincrementaldecoder('latin-1')
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Colors parsed out of the color table are represented as single packed
+# integers rather than dicts. They're immutable, cheap to copy along with the
+# state, and comparing two of them is just an integer comparison. The layout
+# (from most to least significant byte) is tint, shade, red, green, blue.
+
+DEFAULT_TINT  = 255
+DEFAULT_SHADE = 255
+
+# Packs a color's components, each of which should be between 0 and 255,
+# into a single integer.
+def packColor(red, green, blue, tint = DEFAULT_TINT, shade = DEFAULT_SHADE):
+
+	return (
+		(tint  & 0xFF) << 32 |
+		(shade & 0xFF) << 24 |
+		(red   & 0xFF) << 16 |
+		(green & 0xFF) << 8  |
+		(blue  & 0xFF)
+	)
+
+###############################################################################
+
+# Unpacks a color returned by packColor into a dict with the keys 'red',
+# 'green', 'blue', 'tint' and 'shade'.
+def unpackColor(color):
+
+	return {
+		'red':   (color >> 16) & 0xFF,
+		'green': (color >> 8)  & 0xFF,
+		'blue':  color         & 0xFF,
+		'tint':  (color >> 32) & 0xFF,
+		'shade': (color >> 24) & 0xFF
+	}
+
+###############################################################################
+
+# Returns a packed color's red, green and blue components as a hex string of
+# the form '#rrggbb'.
+def colorToHex(color):
+
+	return '#%06x' % (color & 0xFFFFFF)
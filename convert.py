@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+# Converts DOM trees to plain text, HTML and JSON. Each format can be written
+# one paragraph at a time (see RTFDOM.parseStreaming), so converting a file
+# never needs more than a single paragraph's tree in memory.
+
+import base64, html, json, os, time
+
+from pyrtfdom.dom import RTFDOM
+
+# Formats we can convert to, and the file extension used for each
+FORMAT_EXTENSIONS = {
+	'text': '.txt',
+	'html': '.html',
+	'json': '.json'
+}
+
+# HTML tags for each formatting element
+HTML_TAGS = {
+	'bold':          'b',
+	'italic':        'i',
+	'underline':     'u',
+	'strikethrough': 's',
+	'footnote':      'small'
+}
+
+# CSS equivalents of paragraph alignments (left is the default)
+CSS_ALIGNMENTS = {
+	'right':       'right',
+	'center':      'center',
+	'justified':   'justify',
+	'distributed': 'justify'
+}
+
+# MIME types of the images browsers can display
+IMAGE_TYPES = {
+	'png':  'image/png',
+	'jpeg': 'image/jpeg'
+}
+
+###############################################################################
+
+# Returns the text of a node and everything inside of it. Page breaks become
+# form feeds.
+def toText(node):
+
+	if 'text' == node.nodeType:
+		return node.value
+
+	elif 'pagebreak' == node.nodeType:
+		return '\f'
+
+	elif node.children:
+		return ''.join(toText(child) for child in node.children)
+
+	return ''
+
+###############################################################################
+
+# Returns the HTML for a node and everything inside of it.
+def toHTML(node):
+
+	nodeType = node.nodeType
+
+	if 'text' == nodeType:
+		return html.escape(node.value).replace('\n', '<br>')
+
+	elif 'pagebreak' == nodeType:
+		return '<hr class="pagebreak">'
+
+	elif 'img' == nodeType:
+		mimeType = IMAGE_TYPES.get(node.attributeSet.get('source'))
+		if mimeType is None:
+			return ''
+		return '<img src="data:' + mimeType + ';base64,' + base64.b64encode(node.value).decode('ascii') + '">'
+
+	content = ''.join(toHTML(child) for child in node.children) if node.children else ''
+
+	if 'para' == nodeType:
+		alignment = CSS_ALIGNMENTS.get(node.attributeSet.get('alignment'))
+		if alignment:
+			return '<p style="text-align: ' + alignment + '">' + content + '</p>\n'
+		return '<p>' + content + '</p>\n'
+
+	elif 'hyperlink' == nodeType:
+		return '<a href="' + html.escape(node.attributeSet.get('href', '')) + '">' + content + '</a>'
+
+	elif nodeType in HTML_TAGS:
+		tag = HTML_TAGS[nodeType]
+		return '<' + tag + '>' + content + '</' + tag + '>'
+
+	return content
+
+###############################################################################
+
+# Returns a node and everything inside of it as a structure that can be
+# serialized as JSON. Binary values (images) are base64 encoded.
+def toJSON(node):
+
+	value = node.value
+	if isinstance(value, (bytes, bytearray, memoryview)):
+		value = base64.b64encode(value).decode('ascii')
+
+	result = {'type': node.nodeType}
+
+	if node.attributeSet:
+		result['attributes'] = dict(node.attributeSet)
+
+	if value:
+		result['value'] = value
+
+	if node.children:
+		result['children'] = [toJSON(child) for child in node.children]
+
+	return result
+
+###############################################################################
+
+# Parses an RTF file and writes it to outputFilename in the given format, one
+# paragraph at a time. dom is the RTFDOM to parse with (a new one is created
+# if it's None.)
+def convertFile(inputFilename, outputFilename, outputFormat, dom = None):
+
+	if outputFormat not in FORMAT_EXTENSIONS:
+		raise ValueError('Unsupported output format ' + outputFormat)
+
+	if dom is None:
+		dom = RTFDOM()
+
+	outputFile = open(outputFilename, 'w', encoding = 'utf-8')
+
+	try:
+		if 'text' == outputFormat:
+			dom.openFile(inputFilename)
+			dom.parseStreaming(lambda para: outputFile.write(toText(para) + '\n'))
+
+		elif 'html' == outputFormat:
+			outputFile.write('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"></head>\n<body>\n')
+			dom.openFile(inputFilename)
+			dom.parseStreaming(lambda para: outputFile.write(toHTML(para)))
+			outputFile.write('</body>\n</html>\n')
+
+		else:
+			separator = ['']
+			def onParagraph(para):
+				outputFile.write(separator[0] + json.dumps(toJSON(para), default = str))
+				separator[0] = ',\n'
+
+			outputFile.write('{"type": "rtf", "children": [\n')
+			dom.openFile(inputFilename)
+			dom.parseStreaming(onParagraph)
+			outputFile.write('\n]}\n')
+
+	finally:
+		outputFile.close()
+
+###############################################################################
+
+# Each worker process's RTFDOM instance (see convertWorker)
+_workerDOM = None
+
+# Worker process entry point for the command line converter. Converts a file
+# and returns (inputFilename, elapsed seconds, error message or None.)
+def convertWorker(inputFilename, outputFilename, outputFormat):
+
+	global _workerDOM
+
+	if _workerDOM is None:
+		_workerDOM = RTFDOM()
+
+	start = time.perf_counter()
+
+	try:
+		convertFile(inputFilename, outputFilename, outputFormat, _workerDOM)
+		error = None
+	except Exception as e:
+		error = type(e).__name__ + ': ' + str(e)
+
+		# Don't reuse a DOM that might have been left in a bad state, and
+		# don't leave a partially written output file behind
+		_workerDOM = None
+		if os.path.exists(outputFilename):
+			os.remove(outputFilename)
+
+	return inputFilename, time.perf_counter() - start, error
@@ -0,0 +1,494 @@
+# -*- coding: utf-8 -*-
+
+# A full-text inverted index over a corpus of RTF files, stored on disk. For
+# every term, the index records each place it occurs as (document id,
+# paragraph number, offset of the term within the paragraph's text).
+# Paragraphs are numbered the same way RTFDOM and RTFIndex number them.
+#
+# Text is streamed straight out of the parser, without building a DOM, and
+# broken into terms. Worker processes each take a share of the files and
+# write their postings as sorted run files, which are then merged into a new
+# segment of the index. Adding more files later creates another segment, and
+# searches look at every segment. compact() merges all segments back into
+# one. Only one process should add to (or compact) an index at a time.
+#
+# Example:
+#
+#   index = CorpusIndex('/var/index/archive')
+#   index.add(glob.glob('/archive/**/*.rtf', recursive = True), processes = 8)
+#   for docId, paragraph, offset in index.search('invoice'):
+#       print(index.documentName(docId), paragraph, offset)
+
+import heapq, itertools, json, os, re
+from concurrent.futures import ProcessPoolExecutor
+
+from pyrtfdom.parse import RTFParser
+
+# Bump this whenever the format of the index's files changes
+CORPUS_INDEX_VERSION = 1
+
+# Default number of postings a worker keeps in memory before writing them
+# out as a sorted run
+DEFAULT_RUN_SIZE = 1000000
+
+# Default number of files handed to a worker process at a time
+DEFAULT_BATCH_SIZE = 64
+
+# What counts as a term. Terms are case folded.
+TERM = re.compile(r'\w+')
+
+# The calling process's parser, created the first time it's needed (see
+# _indexBatch)
+_workerParser = None
+
+###############################################################################
+
+# Returns a parser suitable for passing to extractParagraphs. It can be reused
+# for any number of files.
+def createParser():
+
+	ignore = lambda *args: None
+
+	return RTFParser({'callbacks': {
+		'onOpenParagraph':   ignore,
+		'onAppendParagraph': ignore,
+		'onStateChange':     ignore,
+		'onField':           ignore
+	}})
+
+###############################################################################
+
+# Returns the text of each paragraph in an RTF file, in order, as a list. The
+# text of fields (hyperlinks, etc.) is included.
+def extractParagraphs(parser, filename):
+
+	# The fragments of text appended to each paragraph so far
+	paragraphs = []
+
+	def onOpenParagraph(parser):
+		paragraphs.append([])
+
+	def onAppendParagraph(parser, text):
+		paragraphs[-1].append(text)
+
+	def onField(parser, fldInst, fldRslt):
+		paragraphs[-1].append(fldRslt)
+
+	parser._setCallback('onOpenParagraph', onOpenParagraph)
+	parser._setCallback('onAppendParagraph', onAppendParagraph)
+	parser._setCallback('onField', onField)
+
+	parser.openFile(filename)
+	parser.parse()
+
+	return [''.join(fragments) for fragments in paragraphs]
+
+###############################################################################
+
+# Splits text into (term, offset) pairs.
+def tokenize(text):
+
+	for match in TERM.finditer(text):
+		yield match.group().casefold(), match.start()
+
+###############################################################################
+
+# Writes postings, sorted, to a new run file in directory and returns its
+# filename.
+def _writeRun(directory, postings, runId):
+
+	postings.sort()
+
+	filename = os.path.join(directory, 'run-' + runId + '.tmp')
+	runFile = open(filename, 'w', encoding = 'utf-8')
+	for term, docId, paragraph, offset in postings:
+		runFile.write('%s\t%d\t%d\t%d\n' % (term, docId, paragraph, offset))
+	runFile.close()
+
+	return filename
+
+###############################################################################
+
+# Worker process entry point. Extracts the postings of each (docId, filename)
+# pair in documents and writes them out as one or more sorted run files.
+# Returns (runFilenames, failures), where failures is a list of [filename,
+# error message] for the files that couldn't be parsed.
+def _indexBatch(directory, batchId, documents, runSize):
+
+	global _workerParser
+
+	if _workerParser is None:
+		_workerParser = createParser()
+
+	runs = []
+	failures = []
+	postings = []
+
+	for docId, filename in documents:
+
+		try:
+			paragraphs = extractParagraphs(_workerParser, filename)
+		except Exception as e:
+			failures.append([filename, type(e).__name__ + ': ' + str(e)])
+			continue
+
+		for paragraph in range(len(paragraphs)):
+			for term, offset in tokenize(paragraphs[paragraph]):
+				postings.append((term, docId, paragraph, offset))
+
+		if len(postings) >= runSize:
+			runs.append(_writeRun(directory, postings, batchId + '-' + str(len(runs))))
+			postings = []
+
+	if postings:
+		runs.append(_writeRun(directory, postings, batchId + '-' + str(len(runs))))
+
+	return runs, failures
+
+###############################################################################
+
+# Reads a run file, yielding (term, docId, paragraph, offset) in order.
+def _readRun(filename):
+
+	runFile = open(filename, 'r', encoding = 'utf-8')
+
+	try:
+		for line in runFile:
+			term, docId, paragraph, offset = line.rstrip('\n').split('\t')
+			yield term, int(docId), int(paragraph), int(offset)
+	finally:
+		runFile.close()
+
+###############################################################################
+
+class CorpusIndex(object):
+
+	# Opens the index stored in directory, creating it if it doesn't exist.
+	def __init__(self, directory):
+
+		self.__directory = directory
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		manifestFilename = self.__path('manifest.json')
+
+		if os.path.exists(manifestFilename):
+			manifestFile = open(manifestFilename, 'r')
+			self.__manifest = json.load(manifestFile)
+			manifestFile.close()
+			if CORPUS_INDEX_VERSION != self.__manifest['version']:
+				raise ValueError('Unsupported corpus index version ' + str(self.__manifest['version']))
+		else:
+			self.__manifest = {
+				'version':     CORPUS_INDEX_VERSION,
+				'documents':   0,
+				'segments':    [],
+				'nextSegment': 0
+			}
+
+		# Filenames of the indexed documents, by document id. Only loaded
+		# when we need them.
+		self.__documents = None
+
+		# Each segment's lexicon, mapping terms to [offset, length] of their
+		# postings in the segment's postings file. Loaded on demand.
+		self.__lexicons = {}
+
+	###########################################################################
+
+	def __path(self, filename):
+
+		return os.path.join(self.__directory, filename)
+
+	###########################################################################
+
+	# Writes a file by writing a temporary file first and then renaming it,
+	# so that readers never see it half written.
+	def __writeAtomically(self, filename, writeFunc):
+
+		tmpFilename = self.__path(filename + '.tmp')
+		tmpFile = open(tmpFilename, 'w', encoding = 'utf-8', newline = '')
+		writeFunc(tmpFile)
+		tmpFile.close()
+		os.replace(tmpFilename, self.__path(filename))
+
+	###########################################################################
+
+	# Replaces the manifest, both on disk and in memory. The one in memory is
+	# only replaced once the new one's been saved.
+	def __saveManifest(self, manifest):
+
+		self.__writeAtomically('manifest.json', lambda f: json.dump(manifest, f))
+		self.__manifest = manifest
+
+	###########################################################################
+
+	# Number of documents in the index.
+	@property
+	def documentCount(self):
+
+		return self.__manifest['documents']
+
+	###########################################################################
+
+	# Number of segments the index is currently split into.
+	@property
+	def segmentCount(self):
+
+		return len(self.__manifest['segments'])
+
+	###########################################################################
+
+	# Returns the filenames of the indexed documents, by document id, loading
+	# them if necessary. There's one filename per line, and since a filename
+	# can contain anything but a newline (including characters splitlines()
+	# would split on, like \x85 and \u2028), lines are split on newlines
+	# only. Filenames past the number of documents in the manifest were left
+	# behind by an add() that didn't finish, and are ignored.
+	def __documentNames(self):
+
+		if self.__documents is None:
+			self.__documents = []
+			if os.path.exists(self.__path('documents.txt')):
+				documentsFile = open(self.__path('documents.txt'), 'r', encoding = 'utf-8', newline = '')
+				self.__documents = documentsFile.read().split('\n')[:-1][:self.__manifest['documents']]
+				documentsFile.close()
+
+		return self.__documents
+
+	###########################################################################
+
+	# Returns the filename of the document with the given id.
+	def documentName(self, docId):
+
+		return self.__documentNames()[docId]
+
+	###########################################################################
+
+	# Adds RTF files to the index as a new segment, using a pool of processes
+	# worker processes (by default, one per CPU.) Each worker is handed
+	# batchSize files at a time and keeps at most runSize postings in memory.
+	# Files that can't be parsed still get a document id, but have no
+	# postings. Returns a list of [filename, error message] for each of them.
+	def add(self, filenames, processes = None, batchSize = DEFAULT_BATCH_SIZE, runSize = DEFAULT_RUN_SIZE):
+
+		filenames = list(filenames)
+		if not filenames:
+			return []
+
+		firstDocId = self.__manifest['documents']
+		documents = list(zip(range(firstDocId, firstDocId + len(filenames)), filenames))
+		segment = 'seg-' + str(self.__manifest['nextSegment'])
+
+		runs = []
+		failures = []
+
+		try:
+			with ProcessPoolExecutor(max_workers = processes) as executor:
+
+				futures = []
+				for i in range(0, len(documents), batchSize):
+					batchId = segment + '-' + str(i // batchSize)
+					futures.append(executor.submit(_indexBatch, self.__directory, batchId, documents[i:i + batchSize], runSize))
+
+				for future in futures:
+					batchRuns, batchFailures = future.result()
+					runs.extend(batchRuns)
+					failures.extend(batchFailures)
+
+			self.__writeSegment(segment, heapq.merge(*[_readRun(run) for run in runs]))
+
+			# The document list is rewritten rather than appended to, so that
+			# it never has more names in it than the manifest says it does
+			# (other than ones that will be ignored, if we don't get as far
+			# as saving the manifest.) Nothing's added to the index until the
+			# manifest is saved.
+			documentNames = self.__documentNames() + filenames
+			self.__writeAtomically('documents.txt', lambda f: f.write(''.join(name + '\n' for name in documentNames)))
+
+			self.__saveManifest(dict(
+				self.__manifest,
+				documents = self.__manifest['documents'] + len(filenames),
+				segments = self.__manifest['segments'] + [segment],
+				nextSegment = self.__manifest['nextSegment'] + 1
+			))
+			self.__documents = documentNames
+
+		except BaseException:
+			self.__removeSegment(segment)
+			raise
+
+		finally:
+			for run in runs:
+				if os.path.exists(run):
+					os.remove(run)
+
+		return failures
+
+	###########################################################################
+
+	# Writes a segment from a stream of (term, docId, paragraph, offset)
+	# postings sorted by term. For each term, the postings file gets a single
+	# line of space separated docId,paragraph,offset triples, and the lexicon
+	# gets the term along with where that line is and how many postings it
+	# has.
+	def __writeSegment(self, segment, postings):
+
+		postingsFile = open(self.__path(segment + '.postings'), 'wb')
+		lexiconFile = open(self.__path(segment + '.lexicon.tmp'), 'w', encoding = 'utf-8')
+
+		offset = 0
+		for term, termPostings in itertools.groupby(postings, key = lambda posting: posting[0]):
+
+			triples = [str(docId) + ',' + str(paragraph) + ',' + str(termOffset) for unused, docId, paragraph, termOffset in termPostings]
+			line = (' '.join(triples) + '\n').encode('utf-8')
+			postingsFile.write(line)
+
+			lexiconFile.write('%s\t%d\t%d\t%d\n' % (term, offset, len(line), len(triples)))
+			offset += len(line)
+
+		postingsFile.close()
+		lexiconFile.close()
+
+		# The lexicon is written last, so a segment only exists once it's
+		# complete
+		os.replace(self.__path(segment + '.lexicon.tmp'), self.__path(segment + '.lexicon'))
+
+	###########################################################################
+
+	# Removes whatever files a segment that didn't make it into the manifest
+	# left behind.
+	def __removeSegment(self, segment):
+
+		for filename in (segment + '.postings', segment + '.lexicon', segment + '.lexicon.tmp'):
+			if os.path.exists(self.__path(filename)):
+				os.remove(self.__path(filename))
+
+	###########################################################################
+
+	# Returns a segment's lexicon, loading it if necessary.
+	def __lexicon(self, segment):
+
+		if segment not in self.__lexicons:
+			lexicon = {}
+			lexiconFile = open(self.__path(segment + '.lexicon'), 'r', encoding = 'utf-8')
+			for line in lexiconFile:
+				term, offset, length, count = line.rstrip('\n').split('\t')
+				lexicon[term] = (int(offset), int(length), int(count))
+			lexiconFile.close()
+			self.__lexicons[segment] = lexicon
+
+		return self.__lexicons[segment]
+
+	###########################################################################
+
+	# Yields a segment's postings for a term as (docId, paragraph, offset).
+	def __segmentPostings(self, segment, term):
+
+		entry = self.__lexicon(segment).get(term)
+		if entry is None:
+			return
+
+		postingsFile = open(self.__path(segment + '.postings'), 'rb')
+		postingsFile.seek(entry[0])
+		line = postingsFile.read(entry[1]).decode('utf-8')
+		postingsFile.close()
+
+		for triple in line.split():
+			docId, paragraph, offset = triple.split(',')
+			yield int(docId), int(paragraph), int(offset)
+
+	###########################################################################
+
+	# Yields every (term, docId, paragraph, offset) posting in a segment,
+	# sorted by term.
+	def __segmentStream(self, segment):
+
+		postingsFile = open(self.__path(segment + '.postings'), 'rb')
+		lexiconFile = open(self.__path(segment + '.lexicon'), 'r', encoding = 'utf-8')
+
+		try:
+			for lexiconLine, postingsLine in zip(lexiconFile, postingsFile):
+				term = lexiconLine.split('\t', 1)[0]
+				for triple in postingsLine.decode('utf-8').split():
+					docId, paragraph, offset = triple.split(',')
+					yield term, int(docId), int(paragraph), int(offset)
+
+		finally:
+			postingsFile.close()
+			lexiconFile.close()
+
+	###########################################################################
+
+	# Returns every occurrence of a term as a list of (docId, paragraph,
+	# offset), sorted by document id. The term is case folded, just like the
+	# indexed text.
+	def search(self, term):
+
+		term = term.casefold()
+
+		# Segments are created in order of document id, so their results
+		# don't need to be merged
+		results = []
+		for segment in self.__manifest['segments']:
+			results.extend(self.__segmentPostings(segment, term))
+
+		return results
+
+	###########################################################################
+
+	# Returns the ids of the documents that contain all of the given terms,
+	# in ascending order.
+	def searchAll(self, terms):
+
+		docIds = None
+
+		for term in terms:
+			termDocIds = set(docId for docId, paragraph, offset in self.search(term))
+			docIds = termDocIds if docIds is None else docIds & termDocIds
+			if not docIds:
+				return []
+
+		return sorted(docIds) if docIds else []
+
+	###########################################################################
+
+	# Returns the number of times a term occurs in the corpus, without
+	# reading its postings.
+	def termCount(self, term):
+
+		term = term.casefold()
+
+		count = 0
+		for segment in self.__manifest['segments']:
+			entry = self.__lexicon(segment).get(term)
+			if entry is not None:
+				count += entry[2]
+
+		return count
+
+	###########################################################################
+
+	# Merges all of the index's segments into one, which makes searches
+	# faster after lots of incremental additions.
+	def compact(self):
+
+		segments = self.__manifest['segments']
+		if len(segments) < 2:
+			return
+
+		segment = 'seg-' + str(self.__manifest['nextSegment'])
+
+		try:
+			self.__writeSegment(segment, heapq.merge(*[self.__segmentStream(oldSegment) for oldSegment in segments]))
+			self.__saveManifest(dict(self.__manifest, segments = [segment], nextSegment = self.__manifest['nextSegment'] + 1))
+
+		except BaseException:
+			self.__removeSegment(segment)
+			raise
+
+		for oldSegment in segments:
+			os.remove(self.__path(oldSegment + '.postings'))
+			os.remove(self.__path(oldSegment + '.lexicon'))
+			self.__lexicons.pop(oldSegment, None)
@@ -1,12 +1,26 @@
 # -*- coding: utf-8 -*-
 
-import copy
+import copy, json, os, queue, threading
+from concurrent.futures import ProcessPoolExecutor
 
 from pyrtfdom import elements
 from pyrtfdom.parse import RTFParser
+from pyrtfdom.index import RTFIndex
+from pyrtfdom.normalize import normalize, countNodes
+from pyrtfdom.limits import resolveLimits, NodeLimitError
+from pyrtfdom.asyncparse import runParser, ParseYielder, ParseCancelledError, DEFAULT_YIELD_INTERVAL
+from pyrtfdom.parallel import findChunks, chunkSource, relativeChunk
+from pyrtfdom.flat import FlatTree
 
 class RTFDOM(object):
 
+	# parseParallel never splits a document into chunks smaller than this
+	# many characters, since handing a chunk to a worker process and sending
+	# back its tree costs more than parsing a small one saves.
+	PARALLEL_MIN_CHUNK_SIZE = 1024 * 1024
+
+	###########################################################################
+
 	# Read-only property that returns the current node.
 	@property
 	def curNode(self):
@@ -23,11 +37,12 @@ class RTFDOM(object):
 
 	###########################################################################
 
-	# Utility function that parses an RTF snippet and returns its DOM tree.
+	# Utility function that parses an RTF snippet and returns its DOM tree,
+	# subject to the given resource limits (see limits.py.)
 	@staticmethod
-	def parseSubRTF(rtfString):
+	def parseSubRTF(rtfString, limits = None):
 
-		subTree = RTFDOM()
+		subTree = RTFDOM(limits = limits)
 		subTree.openString(rtfString)
 		subTree.parse()
 
@@ -35,25 +50,95 @@ class RTFDOM(object):
 
 	###########################################################################
 
-	# Finds the attribute DOM element closest to the current node, then calculates
-	# and returns its distance from the root RTF node. If an element for the
-	# given attribute doesn't exist in the chain from current to root node, -1
-	# will be returned.
-	def __distanceFromRoot(self, attribute):
+	# Returns the innermost open container node (the current paragraph or the
+	# innermost formatting element inside of it.) New text, format, image and
+	# page break nodes are always appended here.
+	def __curContainer(self):
+
+		return self.__openNodes[-1]
+
+	###########################################################################
+
+	# Closes every open container above (and including) the one found at the
+	# given index of the open node stack. The paragraph itself, at index 0, is
+	# never closed this way.
+	def __closeOpenNodes(self, index):
+
+		del self.__openNodes[max(index, 1):]
+
+	###########################################################################
+
+	# Returns the index in the open node stack of the formatting element that
+	# corresponds to the given attribute, or -1 if no such element is open. The
+	# stack never holds more than one element per formatting attribute, so this
+	# doesn't depend on the depth of the tree.
+	def __openNodeIndex(self, attribute):
+
+		for i in reversed(range(1, len(self.__openNodes))):
+			if attribute == self.__openNodes[i].nodeType:
+				return i
+
+		return -1
+
+	###########################################################################
+
+	# Returns the index of the given node in the open node stack, or -1 if it
+	# isn't open.
+	def __openStackIndex(self, node):
+
+		for i in reversed(range(len(self.__openNodes))):
+			if node is self.__openNodes[i]:
+				return i
+
+		return -1
+
+	###########################################################################
+
+	# Joins the buffered text of the current node once we're done appending to
+	# it.
+	def __finalizeCurNode(self):
+
+		if self.__curNode is not None and 'text' == self.__curNode.nodeType:
+			self.__curNode.finalize()
+
+	###########################################################################
+
+	# Counts newly created nodes against the maxNodes limit.
+	def __countNodes(self, count = 1):
+
+		self.__nodeCount += count
+
+		if self.__maxNodes is not None and self.__nodeCount > self.__maxNodes:
+			raise NodeLimitError(self.__maxNodes)
+
+	###########################################################################
 
-		distance = 0
-		node = self.__curNode
+	# Normalizes the current paragraph (see normalize.py) once we've finished
+	# building it, if we were asked to.
+	def __normalizeParagraph(self):
 
-		# First, locate the attribute's node
-		while node.nodeType != attribute:
-			node = node.parent
+		if self.__normalize and self.__openNodes:
 
-		# Next, calculate its distance from the root
-		while node != self.__rootNode:
-			distance = distance + 1
-			node = node.parent
+			self.__finalizeCurNode()
+			counts = normalize(self.__openNodes[0])
 
-		return distance
+			self.__nodeCounts['before'] += counts['before']
+			self.__nodeCounts['after'] += counts['after']
+
+	###########################################################################
+
+	# Detaches the current paragraph from the root node and passes it to the
+	# paragraph consumer. Used when streaming paragraphs.
+	def __releaseParagraph(self):
+
+		para = self.__openNodes[0]
+
+		self.__finalizeCurNode()
+		self.__rootNode.removeChild(para)
+		self.__openNodes = []
+		self.__curNode = self.__rootNode
+
+		self.__onParagraph(para)
 
 	###########################################################################
 
@@ -62,7 +147,7 @@ class RTFDOM(object):
 
 		# Utility function for the below callbacks that sets up a series of nodes
 		# corresponding to the specified format.
-		def __setCharacterFormatNodes(RTFParser, curParNode, state):
+		def __setCharacterFormatNodes(RTFParser, state):
 
 			for attribute in state:
 
@@ -74,41 +159,44 @@ class RTFDOM(object):
 					pass
 
 				elif type(state[attribute]) == bool:
-					if state[attribute]:
+					if state[attribute] and -1 == self.__openNodeIndex(attribute):
 						node = elements.DOMElement.getElement(attribute)
-						self.__curNode.appendChild(node)
-						self.__curNode = node
+						self.__countNodes()
+						self.__curContainer().appendChild(node)
+						self.__openNodes.append(node)
 
 				# TODO: are there any non-boolean and non-color attributes, and
 				# if so, how do we handle them?
 				else:
 					pass
+
 		#####
 
 		# Inserts a page break into the current paragraph node.
 		def onPageBreak(RTFParser):
 
-			# First, walk up to the current paragraph node
-			while 'para' != self.__curNode.nodeType:
-				self.__curNode = self.__curNode.parent
+			# First, close any formatting elements so that we're back at the
+			# current paragraph node
+			self.__closeOpenNodes(1)
+			parNode = self.__curContainer()
 
 			# Second, create and append the page break node
 			node = elements.PageBreakElement()
-			self.__curNode.appendChild(node)
+			self.__countNodes()
+			parNode.appendChild(node)
 
 			# Any paragraph formatting attributes should be set on the new
-			# paragraph node.
-			parAttributes = RTFParser.fullStateAttributes['paragraph']
-			for parAttribute in parAttributes.keys():
-				self.__curNode.attributes[parAttribute] = parAttributes[parAttribute]
+			# paragraph node. Node attributes are immutable copies (see
+			# elements.AttributeSet), so we can read the parser's state
+			# directly instead of making a deep copy of it first.
+			stateAttributes = RTFParser._fullStateCache
+			parNode.attributes.update(stateAttributes['paragraph'])
 
 			# Finally, restore the current formatting state in the same paragraph
 			# and append to it a new text node. Create a new text node to append
 			# any text that might be in the same paragraph.
-			__setCharacterFormatNodes(RTFParser, self.__curNode, RTFParser.fullStateAttributes['character'])
-			textNode = elements.TextElement()
-			self.__curNode.appendChild(textNode)
-			self.__curNode = textNode
+			__setCharacterFormatNodes(RTFParser, stateAttributes['character'])
+			self.initTextElement(self.__curContainer())
 
 		#####
 
@@ -118,30 +206,39 @@ class RTFDOM(object):
 
 			# Create the paragraph node
 			para = elements.ParaElement()
+			self.__countNodes()
 			self.__rootNode.appendChild(para)
-			self.__curNode = para
+			self.__openNodes = [para]
 
 			# Any paragraph formatting attributes should be set on the new
-			# paragraph node.
-			parAttributes = RTFParser.fullStateAttributes['paragraph']
-			for parAttribute in parAttributes.keys():
-				para.attributes[parAttribute] = parAttributes[parAttribute]
+			# paragraph node (see onPageBreak.)
+			stateAttributes = RTFParser._fullStateCache
+			para.attributes = stateAttributes['paragraph']
 
 			# Any character formatting attributes that are turned on in the current state
 			# should be represented by their corresponding DOM elements
-			__setCharacterFormatNodes(RTFParser, para, RTFParser.fullStateAttributes['character'])
+			__setCharacterFormatNodes(RTFParser, stateAttributes['character'])
 
 			# Create a text node where we'll append text for the paragraph
-			textNode = elements.TextElement()
-			self.__curNode.appendChild(textNode)
-			self.__curNode = textNode
+			self.initTextElement(self.__curContainer())
+
+		#####
+
+		# Once a paragraph's finished, it can be normalized. When we're
+		# streaming paragraphs, we also hand it over to the consumer.
+		def onCloseParagraph(RTFParser):
+
+			self.__normalizeParagraph()
+
+			if self.__onParagraph:
+				self.__releaseParagraph()
 
 		#####
 
 		# Append text to the current paragraph.
 		def onAppendParagraph(RTFParser, text):
 
-			self.__curNode.value += text
+			self.__curNode.appendText(text)
 
 		#####
 
@@ -149,9 +246,10 @@ class RTFDOM(object):
 		# elements such as bold, italic, etc.
 		def onStateChange(RTFParser, oldState, newState):
 
-			# Keeps track of which attributes have been turned off and their DOM
-			# element's distance from the root node.
-			turnedOff = {}
+			# Index in the open node stack of the outermost formatting element
+			# that was turned off, and whether or not anything was turned on.
+			cutoff = -1
+			turnedOn = False
 
 			for attribute in newState['character']:
 
@@ -171,18 +269,13 @@ class RTFDOM(object):
 
 						# we're turning the attribute on
 						if newState['character'][attribute]:
-
-							# elements[attribute] means the element type that
-							# corresponds to the attribute
-							node = elements.DOMElement.getElement(attribute)
-							textNode = elements.TextElement()
-							node.appendChild(textNode)
-							self.__curNode.parent.appendChild(node)
-							self.__curNode = textNode
+							turnedOn = True
 
 						# we're turning the attribute off
 						else:
-							turnedOff[attribute] = self.__distanceFromRoot(attribute)
+							index = self.__openNodeIndex(attribute)
+							if index > 0 and (cutoff < 0 or index < cutoff):
+								cutoff = index
 
 					# TODO: Not sure if I'll need to handle non-boolean character
 					# formatting attributes yet. I'm placing this here so that if
@@ -199,38 +292,21 @@ class RTFDOM(object):
 				if attribute not in oldState['paragraph'].keys() or (
 					newState['paragraph'][attribute] != oldState['paragraph'][attribute]
 				):
+					self.__openNodes[0].attributes[attribute] = newState['paragraph'][attribute]
 
-					parNode = self.__curNode
-					while 'para' != parNode.nodeType:
-						parNode = parNode.parent
-
-					parNode.attributes[attribute] = newState['paragraph'][attribute]
-
-			# If we turned off one or more formatting attributes, find the DOM
-			# element closest to the root RTF node that got turned off and
-			# create a new chain of DOM elements for all the other attributes
-			# that are on in the current state.
-			if len(turnedOff):
-
-				# Move up beyond the DOM element we need to terminate
-				cutoffNodeType = min(turnedOff, key=turnedOff.get)
+			# If we turned off one or more formatting attributes, close the
+			# open DOM element closest to the paragraph that got turned off
+			# (along with everything inside of it), then create a new chain of
+			# DOM elements for all the other attributes that are on in the
+			# current state. Attributes that were turned on are opened inside
+			# whatever is still open.
+			if cutoff > 0 or turnedOn:
 
-				while self.__curNode.nodeType != cutoffNodeType:
-					self.__curNode = self.__curNode.parent
+				if cutoff > 0:
+					self.__closeOpenNodes(cutoff)
 
-				self.__curNode = self.__curNode.parent
-
-				# Now, start a new series of DOM elements that will represent the current state
-				for attribute in newState:
-					if type(newState[attribute]) == bool:
-						if newState[attribute]:
-							node = elements.DOMElement.getElement(attribute)
-							self.__curNode.appendChild(node)
-							self.__curNode = node
-
-				textNode = elements.TextElement()
-				self.__curNode.appendChild(textNode)
-				self.__curNode = textNode
+				__setCharacterFormatNodes(RTFParser, newState['character'])
+				self.initTextElement(self.__curContainer())
 
 		#####
 
@@ -257,29 +333,25 @@ class RTFDOM(object):
 
 		def onImage(RTFParser, attributes, image):
 
-			# First, walk up to the first non-text node
-			while 'text' == self.__curNode.nodeType:
-				self.__curNode = self.__curNode.parent
-
-			# Second, create and append the image node
+			# First, create the image node
 			node = elements.ImageElement()
 			node.value = image
-			for attribute in attributes.keys():
-				node.attributes[attribute] = attributes[attribute]
+			node.attributes = attributes
+			self.__countNodes()
 
-			self.__curNode.appendChild(node)
+			# Second, append it to the innermost open element
+			self.__curContainer().appendChild(node)
 
 			# Finally, create a new text node to append any text that might be
 			# in the same paragraph.
-			textNode = elements.TextElement()
-			self.__curNode.appendChild(textNode)
-			self.__curNode = textNode
+			self.initTextElement(self.__curContainer())
 
 		#####
 
 		self.__parserCallbacks = {
 			'onPageBreak': onPageBreak,
 			'onOpenParagraph': onOpenParagraph,
+			'onCloseParagraph': onCloseParagraph,
 			'onAppendParagraph': onAppendParagraph,
 			'onStateChange': onStateChange,
 			'onField': onField,
@@ -305,12 +377,10 @@ class RTFDOM(object):
 
 			hyperNode = elements.HyperlinkElement()
 			hyperNode.attributes['href'] = fldPara[1:len(fldPara) - 1]
+			dom.__countNodes()
 			curParNode.appendChild(hyperNode)
 
-			textNode = elements.TextElement()
-			hyperNode.appendChild(textNode)
-			dom.__curNode = textNode
-
+			dom.initTextElement(hyperNode)
 			dom.insertFldrslt(fldrslt)
 
 		#####
@@ -324,50 +394,101 @@ class RTFDOM(object):
 
 	###########################################################################
 
-	def __init__(self):
-
-		self.reset()
+	# If normalize is True, each paragraph is normalized (see normalize.py)
+	# as soon as it's been built. limits is a dict of resource limits for
+	# parsing untrusted documents (see limits.py), and when one of them is
+	# exceeded, parsing stops with a ParseLimitError. maxNodes counts every
+	# node created for the document, including those handed over by
+	# parseStreaming and those of paragraphs loaded by parseLazy.
+	def __init__(self, normalize = False, limits = None):
 
 		# Will reference the RTF Parser with custom callbacks
 		self.parser = None
 
+		self.__normalize = normalize
+
+		self.__limits = resolveLimits(limits)
+		self.__maxNodes = self.__limits['maxNodes']
+
+		# When set, paragraphs are passed to this function as soon as they're
+		# finished instead of being kept in the tree (see parseStreaming.)
+		self.__onParagraph = None
+
+		self.reset()
+
 		self.__initParserCallbacks()
 		self.__initFieldDrivers()
 
 		self.parser = RTFParser({
-			'callbacks': self.__parserCallbacks
+			'callbacks': self.__parserCallbacks,
+			'limits': self.__limits
 		})
 
 	###########################################################################
 
 	# Resets the DOM parser to an initialized state. Allows us to parse another
-	# document.
+	# document. Registered field drivers are kept.
 	def reset(self):
 
 		# The head and current position in the DOM, respectively
 		self.__rootNode = None
 		self.__curNode = None
 
+		# Stack of currently open container nodes, starting with the current
+		# paragraph and followed by any formatting elements nested inside of it.
+		# Keeping track of these lets us open and close formatting elements
+		# without having to walk the tree.
+		self.__openNodes = []
+
+		# Index of the document whose paragraphs are loaded on demand (see
+		# parseLazy), or None if the tree was built eagerly
+		self.__lazyIndex = None
+
+		# Number of nodes in the paragraphs we've normalized as we built them,
+		# before and after normalizing
+		self.__nodeCounts = {'before': 0, 'after': 0}
+
+		# Number of nodes created for the current document, which is checked
+		# against the maxNodes limit
+		self.__nodeCount = 0
+
+		if self.parser:
+			self.parser.reset()
+
 	###########################################################################
 
 	# Removes the current node and sets the new current node to its parent.
 	# This shouldn't be used very often, but is useful for implementing custom
-	# field types.
+	# field types. If the parent is open, anything opened inside of it is
+	# closed. Otherwise, the open node stack is left alone.
 	def removeCurNode(self):
 
 		curParNode = self.__curNode.parent
 		curParNode.removeChild(self.__curNode)
 		self.__curNode = curParNode
 
+		index = self.__openStackIndex(curParNode)
+		if index >= 0:
+			self.__closeOpenNodes(index + 1)
+
 	###########################################################################
 
 	# Inserts a new empty text element into the specified parent element and
-	# sets it as the new current element.
+	# sets it as the new current element. If the parent isn't already the
+	# innermost open element, it becomes so: anything opened inside of it is
+	# closed if it's already open, and it's opened otherwise.
 	def initTextElement(self, parent):
 
-		# Append a new text element after the contents of fldrslt so we can
-		# continue appending text to the current paragraph.
+		index = self.__openStackIndex(parent)
+		if index < 0:
+			self.__openNodes.append(parent)
+		else:
+			del self.__openNodes[index + 1:]
+
+		self.__finalizeCurNode()
+
 		textNode = elements.TextElement()
+		self.__countNodes()
 		parent.appendChild(textNode)
 		self.__curNode = textNode
 
@@ -379,18 +500,19 @@ class RTFDOM(object):
 	# reason.
 	def insertFldrslt(self, rtfString):
 
-		curParNode = self.__curNode.parent
+		curParNode = self.__curContainer()
 
 		# If the previous text element was empty, it's unnecessary and can be
 		# removed to simplify the tree.
-		if 0 == len(self.__curNode.value):
+		if 'text' == self.__curNode.nodeType and 0 == len(self.__curNode.value):
 			curParNode.removeChild(self.__curNode)
 			self.__curNode = curParNode
 
-		subDOM = RTFDOM.parseSubRTF('{' + rtfString + '}')
+		subDOM = RTFDOM.parseSubRTF('{' + rtfString + '}', self.__limits)
 		paraNode = subDOM.children[0]
 
 		for child in paraNode.children:
+			self.__countNodes(countNodes(child))
 			curParNode.appendChild(child)
 
 		# Append a new text element after the contents of fldrslt so we can
@@ -449,9 +571,465 @@ class RTFDOM(object):
 	# Parse the RTF file and populate the DOM.
 	def parse(self):
 
+		self.__nodeCount = 0
 		self.__rootNode = elements.RTFElement()
 		self.__curNode = self.__rootNode
+		self.__openNodes = []
 		self.parser.parse()
+		self.__finalizeCurNode()
+		self.__normalizeParagraph()
+
+	###########################################################################
+
+	# Generator version of parse() that hands control back to the caller
+	# after every tokens tokens (see RTFParser.parseSteps.) The tree is only
+	# complete once the generator's been exhausted.
+	def parseSteps(self, tokens = RTFParser.DEFAULT_YIELD_EVERY):
+
+		self.__nodeCount = 0
+		self.__rootNode = elements.RTFElement()
+		self.__curNode = self.__rootNode
+		self.__openNodes = []
+		yield from self.parser.parseSteps(tokens)
+		self.__finalizeCurNode()
+		self.__normalizeParagraph()
+
+	###########################################################################
+
+	# Normalizes the whole tree (see normalize.py) and returns the number of
+	# nodes in it before and after, as {'before': ..., 'after': ...}.
+	# Paragraphs that haven't been loaded yet (see parseLazy) are left as
+	# they are.
+	def normalize(self):
+
+		self.__finalizeCurNode()
+		return normalize(self.__rootNode)
+
+	###########################################################################
+
+	# Number of nodes in the paragraphs that were normalized while the tree
+	# was being built (when the DOM was created with normalize = True), before
+	# and after normalizing, as {'before': ..., 'after': ...}. The count
+	# covers everything parsed since the document was opened.
+	@property
+	def nodeCounts(self):
+
+		return dict(self.__nodeCounts)
+
+	###########################################################################
+
+	# Parses count paragraphs, starting with the given (zero-based) paragraph,
+	# using an RTFIndex of the currently open document to skip straight to
+	# them.
+	def parseParagraphs(self, index, first, count = 1):
+
+		checkpoint, endOffset = index.paragraphRange(first, count)
+		self.__nodeCount = 0
+		self.__parseRange(index.header, checkpoint, endOffset)
+
+	###########################################################################
+
+	# Parses the document lazily. Instead of building the whole tree, we only
+	# index the paragraph boundaries (or use the given RTFIndex of the
+	# document, which is even faster if it was saved by an earlier run) and
+	# give the root node one LazyParaElement per paragraph. Each paragraph
+	# parses its own part of the document the first time its children, value
+	# or attributes are accessed, and costs next to nothing until then. The
+	# document has to stay open for as long as paragraphs are being loaded,
+	# and loading isn't thread safe.
+	def parseLazy(self, index = None):
+
+		if index is None:
+			index = RTFIndex.build(self.parser._getSource())
+
+		self.__lazyIndex = index
+		self.__rootNode = elements.RTFElement()
+		self.__curNode = self.__rootNode
+		self.__openNodes = []
+
+		self.__nodeCount = 0
+		self.__countNodes(index.paragraphCount)
+
+		for paragraph in range(index.paragraphCount):
+			self.__rootNode.appendChild(elements.LazyParaElement(self.__loadParagraph, paragraph))
+
+	###########################################################################
+
+	# Parses a single paragraph for a LazyParaElement and returns it, leaving
+	# the rest of the tree alone.
+	def __loadParagraph(self, paragraph):
+
+		if self.__lazyIndex is None:
+			raise Exception('Paragraph can no longer be loaded because its document was closed.')
+
+		rootNode = self.__rootNode
+		curNode = self.__curNode
+		openNodes = self.__openNodes
+
+		try:
+			checkpoint, endOffset = self.__lazyIndex.paragraphRange(paragraph)
+			self.__parseRange(self.__lazyIndex.header, checkpoint, endOffset)
+			paraNode = self.__rootNode.children[0]
+
+		finally:
+			self.__rootNode = rootNode
+			self.__curNode = curNode
+			self.__openNodes = openNodes
+
+		return paraNode
+
+	###########################################################################
+
+	# Parses count pages, starting with the given (zero-based) page, using an
+	# RTFIndex of the currently open document to skip straight to them. The
+	# first paragraph of the result begins at the top of the first page.
+	def parsePages(self, index, first, count = 1):
+
+		checkpoint, endOffset = index.pageRange(first, count)
+		self.__nodeCount = 0
+		self.__parseRange(index.header, checkpoint, endOffset)
+
+	###########################################################################
+
+	# Updates the tree after the characters between start and end in the
+	# currently parsed document have been replaced with replacement. The DOM
+	# must contain the tree of a full parse of the document, and index must
+	# be an RTFIndex of it; both are updated to match the edited document.
+	# Only the paragraphs touched by the edit are parsed again and spliced
+	# into the existing tree, unless the edit touches the header (stylesheet,
+	# color table, etc.) or changes the state of everything that follows it,
+	# in which case we fall back to parsing the whole document again. Returns
+	# True if the tree was updated incrementally and False if it had to be
+	# rebuilt from scratch.
+	def applyEdit(self, index, start, end, replacement):
+
+		oldSource = self.parser._content
+		newSource = oldSource[:start] + replacement + oldSource[end:]
+		delta = len(replacement) - (end - start)
+
+		editRange = index.editRange(start, end)
+
+		if (
+			editRange is None or
+			'\\fonttbl' in replacement or
+			'\\colortbl' in replacement or
+			'\\stylesheet' in replacement or
+			self.__rootNode is None or
+			index.paragraphCount != self.__rootNode.childCount()
+		):
+			self.__reparseAll(index, newSource)
+			return False
+
+		first, resync = editRange
+		checkpoint, unused = index.paragraphRange(first)
+		endOffset = index.paragraphs[resync][3] + delta if resync is not None else None
+
+		checkpoints = []
+		def onCheckpoint(parser, checkpointType):
+			checkpoints.append([checkpointType, parser._getCheckpoint()])
+
+		oldRootNode = self.__rootNode
+		oldCurNode = self.__curNode
+		oldOpenNodes = self.__openNodes
+
+		self.parser.openString(newSource)
+		self.parser._setCallback('onCheckpoint', onCheckpoint)
+		try:
+			self.__parseRange(index.header, checkpoint, endOffset)
+		finally:
+			self.parser._setCallback('onCheckpoint', None)
+
+		# If the parser's state by the time it reaches the next paragraph
+		# boundary isn't what it was before the edit, everything after the
+		# edit could be affected. The order in which attributes appear in the
+		# state determines the order in which formatting elements are nested,
+		# so that has to match too (hence comparing the JSON representations
+		# instead of the states themselves.) We also have to make sure we
+		# stopped exactly where the \par starts, and not in the middle of a
+		# token that swallowed it.
+		if resync is not None and (
+			endOffset != self.parser._curPos or
+			json.dumps(self.parser._getStates()) != json.dumps(index.paragraphStates(resync))
+		):
+			self.__reparseAll(index, newSource)
+			return False
+
+		newParagraphs = list(self.__rootNode.children)
+		lastParagraph = resync + 1 if resync is not None else oldRootNode.childCount()
+		oldRootNode.replaceChildren(first, lastParagraph, newParagraphs)
+
+		# Paragraphs that haven't been loaded yet know themselves only by
+		# their number, which changes if the edit added or removed any
+		if len(newParagraphs) != lastParagraph - first:
+			for paragraph in range(first + len(newParagraphs), oldRootNode.childCount()):
+				node = oldRootNode.children[paragraph]
+				if isinstance(node, elements.LazyParaElement):
+					node.paragraph = paragraph
+
+		self.__rootNode = oldRootNode
+		if resync is not None:
+			self.__curNode = oldCurNode
+			self.__openNodes = oldOpenNodes
+
+		index.applyEdit(first, resync, delta, checkpoints)
+		return True
+
+	###########################################################################
+
+	# Parses an entire (edited) document again and rebuilds its index.
+	def __reparseAll(self, index, rtfContent):
+
+		lazy = self.__lazyIndex is not None
+
+		self.openString(rtfContent)
+		index.rebuild(rtfContent)
+
+		if lazy:
+			self.parseLazy(index)
+		else:
+			self.parse()
+
+	###########################################################################
+
+	# Populates the DOM with everything between the checkpoint (or the start
+	# of the document if it's None) and endOffset. header is the document's
+	# header (see RTFParser._getHeader), which is only needed when resuming
+	# from a checkpoint.
+	def __parseRange(self, header, checkpoint, endOffset):
+
+		self.__rootNode = elements.RTFElement()
+		self.__curNode = self.__rootNode
+		self.__openNodes = []
+
+		if checkpoint is None:
+			self.parser.parse(endOffset)
+		else:
+			self.parser.resume(header, checkpoint, endOffset)
+
+		self.__finalizeCurNode()
+		self.__normalizeParagraph()
+
+	###########################################################################
+
+	# Parses the RTF, passing each paragraph to onParagraph as soon as it's
+	# finished. Each paragraph is detached from the root node before it's
+	# handed over, so only the paragraph currently being parsed is kept in
+	# memory, no matter how long the document is. The paragraphs themselves
+	# are ordinary ParaElement subtrees.
+	def parseStreaming(self, onParagraph):
+
+		self.__onParagraph = onParagraph
+
+		try:
+			self.parse()
+
+			# The last paragraph doesn't have to end with \par
+			if self.__openNodes:
+				self.__releaseParagraph()
+
+		finally:
+			self.__onParagraph = None
+
+	###########################################################################
+
+	# Parses the RTF into a FlatTree (see flat.py) instead of a tree of
+	# DOMElements. The document is added to tree as a new root, or to a new
+	# FlatTree if tree is None, and its root node is returned. Paragraphs are
+	# copied into the tree as soon as they're finished (see parseStreaming),
+	# so there's never more than one paragraph's worth of DOMElements in
+	# memory, and many documents can be collected in a single tree.
+	def parseFlat(self, tree = None):
+
+		if tree is None:
+			tree = FlatTree()
+
+		root = tree.append(elements.RTFElement())
+		self.parseStreaming(lambda para: tree.append(para, root))
+
+		return root
+
+	###########################################################################
+
+	# Parses the document on several cores at once (see parallel.py) using a
+	# pool of processes worker processes (one per CPU if it's None.) The
+	# document is split into chunkCount chunks, four per process by default,
+	# so that the work stays evenly spread out. The tree is the same as the
+	# one parse() would build. If onParagraph is set, paragraphs are passed
+	# to it in order instead of being kept in the tree, like parseStreaming
+	# does. Documents too small to be worth splitting are parsed the usual
+	# way. Resource limits (see limits.py) apply to each chunk on its own,
+	# except for maxNodes, which applies to the whole document. Images
+	# stored in binary form (see \binN) end up with a copy of their data
+	# instead of a memoryview of the document.
+	def parseParallel(self, processes = None, chunkCount = None, onParagraph = None):
+
+		if processes is None:
+			processes = os.cpu_count() or 1
+
+		if chunkCount is None:
+			chunkCount = processes * 4
+
+		if processes > 1 and chunkCount > 1 and len(self.parser._content or '') >= 2 * self.PARALLEL_MIN_CHUNK_SIZE:
+			chunks = findChunks(self.parser, chunkCount, self.PARALLEL_MIN_CHUNK_SIZE)
+		else:
+			chunks = []
+
+		if len(chunks) < 2:
+			if onParagraph:
+				self.parseStreaming(onParagraph)
+			else:
+				self.parse()
+			return
+
+		header = self.parser._getHeader()
+
+		self.__nodeCount = 0
+		self.__rootNode = elements.RTFElement()
+		self.__curNode = self.__rootNode
+		self.__openNodes = []
+
+		with ProcessPoolExecutor(max_workers = processes) as executor:
+
+			futures = [
+				executor.submit(
+					_parseChunkWorker,
+					chunkSource(self.parser, chunk),
+					relativeChunk(chunk),
+					header,
+					self.__normalize,
+					self.__limits
+				) for chunk in chunks
+			]
+
+			try:
+				for future in futures:
+
+					rootNode, curNode, openNodes, nodeCounts, nodeCount = future.result()
+
+					self.__countNodes(nodeCount)
+					self.__nodeCounts['before'] += nodeCounts['before']
+					self.__nodeCounts['after'] += nodeCounts['after']
+
+					paragraphs = list(rootNode.children)
+					rootNode.replaceChildren(0, len(paragraphs), [])
+
+					if onParagraph:
+						for para in paragraphs:
+							onParagraph(para)
+					else:
+						childCount = self.__rootNode.childCount()
+						self.__rootNode.replaceChildren(childCount, childCount, paragraphs)
+
+			# Don't bother parsing the rest if something went wrong
+			finally:
+				for future in futures:
+					future.cancel()
+
+		if not onParagraph:
+			self.__curNode = curNode
+			self.__openNodes = openNodes
+
+	###########################################################################
+
+	# Parses a chunk of a document for parseParallel. rtfContent is the
+	# chunk's part of the document, chunk is its checkpoint and endOffset
+	# relative to that (see parallel.relativeChunk) and header is the
+	# document's header. Returns the root node, current node and open node
+	# stack, the normalized node counts (see nodeCounts) and the number of
+	# nodes created. Binary image data is copied out of the document, since
+	# memoryviews can't be sent back to the parent process.
+	def _parseChunk(self, rtfContent, chunk, header):
+
+		checkpoint, endOffset = chunk
+
+		self.openString(rtfContent)
+		self.__parseRange(header, checkpoint, endOffset)
+
+		if '\\bin' in self.parser._content:
+			nodes = [self.__rootNode]
+			while nodes:
+				node = nodes.pop()
+				if isinstance(node.value, memoryview):
+					node.value = bytes(node.value)
+				if node.children:
+					nodes.extend(node.children)
+
+		return self.__rootNode, self.__curNode, self.__openNodes, self.__nodeCounts, self.__nodeCount
+
+	###########################################################################
+
+	# Generator version of parseStreaming(). The parser runs in a separate
+	# thread and yields each paragraph as soon as it's finished. At most
+	# maxQueued paragraphs are parsed ahead of the consumer. If the consumer
+	# stops early, the parser is stopped too.
+	def iterParagraphs(self, maxQueued = 16):
+
+		paragraphs = queue.Queue(maxQueued)
+		stop = threading.Event()
+		done = object()
+
+		def put(item):
+			while True:
+				if stop.is_set():
+					raise ParseCancelledError()
+				try:
+					paragraphs.put(item, timeout = 0.1)
+					return
+				except queue.Full:
+					pass
+
+		def run():
+			try:
+				self.parseStreaming(put)
+				result = done
+			except ParseCancelledError:
+				return
+			except BaseException as e:
+				result = e
+			try:
+				put(result)
+			except ParseCancelledError:
+				pass
+
+		thread = threading.Thread(target = run, daemon = True)
+		thread.start()
+
+		try:
+			while True:
+				item = paragraphs.get()
+				if item is done:
+					break
+				elif isinstance(item, BaseException):
+					raise item
+				yield item
+
+		finally:
+			stop.set()
+			thread.join()
+
+	###########################################################################
+
+	# Parses each RTF string in turn, reusing this instance (and its parser,
+	# callbacks and field drivers) for all of them, and yields the root node of
+	# each document's tree. This is much faster than creating a new RTFDOM for
+	# every string when parsing lots of small snippets.
+	def parseMany(self, rtfStrings):
+
+		for rtfString in rtfStrings:
+			self.openString(rtfString)
+			self.parse()
+			yield self.__rootNode
+
+	###########################################################################
+
+	# Asynchronous version of parse(). The parser runs in the event loop's
+	# thread, yielding to it every yieldEvery tokens (at most once every
+	# yieldInterval seconds), or in executor if one is given (see
+	# asyncparse.runParser.) Cancelling the awaiting task, or exceeding
+	# timeout seconds, stops the parser at its next yield point.
+	async def parseAsync(self, executor = None, timeout = None, yieldEvery = RTFParser.DEFAULT_YIELD_EVERY, yieldInterval = DEFAULT_YIELD_INTERVAL):
+
+		await runParser(self.parser, self.parseSteps(yieldEvery), executor, timeout, ParseYielder(yieldInterval))
 
 	###########################################################################
 
@@ -467,7 +1045,7 @@ class RTFDOM(object):
 			nodeAttributes = nodeAttributes[0:len(nodeAttributes) - 2]
 		nodeAttributes += '}'
 
-		if isinstance(curNode.value, (bytes, bytearray)):
+		if isinstance(curNode.value, (bytes, bytearray, memoryview)):
 			nodeValue = '<Binary Data>'
 		else:
 			nodeValue = curNode.value
@@ -482,3 +1060,12 @@ class RTFDOM(object):
 			for child in curNode.children:
 				self.printTree(child, indent + '\t')
 
+
+###############################################################################
+
+# Worker process entry point for RTFDOM.parseParallel. Parses a single chunk
+# of a document and returns whatever RTFDOM._parseChunk does.
+def _parseChunkWorker(source, chunk, header, normalize, limits):
+
+	dom = RTFDOM(normalize, limits)
+	return dom._parseChunk(source, chunk, header)
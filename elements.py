@@ -1,5 +1,221 @@
 # -*- coding: utf-8 -*-
 
+import copy, threading, weakref
+from collections.abc import Mapping
+
+# An immutable set of node attributes. Attribute sets are interned, so that
+# no matter how many nodes have the same attributes (most paragraphs in a
+# document share one of a handful of combinations, and formatting and text
+# nodes usually have none at all), there's only one copy of them in memory.
+# Nodes never modify their attribute set. Instead, they replace it with a
+# different one (see NodeAttributes.)
+class AttributeSet(Mapping):
+
+	__slots__ = ('__items', '__hash', '__weakref__')
+
+	# Every attribute set currently in use, keyed by its items
+	__interned = weakref.WeakValueDictionary()
+	__internLock = threading.Lock()
+
+	def __init__(self, attributes):
+
+		self.__items = dict(attributes)
+		self.__hash = None
+
+	###########################################################################
+
+	# Returns the shared attribute set with the given attributes (which can be
+	# any mapping), creating it if it doesn't exist yet. Attributes whose
+	# values can't be hashed can't be shared, so they get a set of their own.
+	# The order attributes were given in doesn't matter, but their types do
+	# (True and 1 are equal, but a set with one shouldn't turn into a set
+	# with the other.)
+	@staticmethod
+	def intern(attributes):
+
+		if isinstance(attributes, AttributeSet):
+			return attributes
+
+		attributeSet = AttributeSet(attributes)
+
+		try:
+			key = frozenset((name, type(value), value) for name, value in attributeSet.__items.items())
+		except TypeError:
+			return attributeSet
+
+		with AttributeSet.__internLock:
+			return AttributeSet.__interned.setdefault(key, attributeSet)
+
+	###########################################################################
+
+	# Returns the attribute set with the given attributes added or replaced.
+	def update(self, attributes):
+
+		if not attributes:
+			return self
+
+		items = dict(self.__items)
+		items.update(attributes)
+		return AttributeSet.intern(items)
+
+	###########################################################################
+
+	# Returns the attribute set without the given attribute.
+	def remove(self, name):
+
+		items = dict(self.__items)
+		del items[name]
+		return AttributeSet.intern(items)
+
+	###########################################################################
+
+	def __getitem__(self, name):
+
+		return self.__items[name]
+
+	def __iter__(self):
+
+		return iter(self.__items)
+
+	def __len__(self):
+
+		return len(self.__items)
+
+	def __contains__(self, name):
+
+		return name in self.__items
+
+	def __eq__(self, other):
+
+		return self is other or Mapping.__eq__(self, other)
+
+	# Equal sets have to hash the same no matter what order their attributes
+	# are in
+	def __hash__(self):
+
+		if self.__hash is None:
+			self.__hash = hash(frozenset(self.__items.items()))
+		return self.__hash
+
+	def __repr__(self):
+
+		return 'AttributeSet(' + repr(self.__items) + ')'
+
+	###########################################################################
+
+	# Attribute sets are immutable, so copies can share them, and unpickled
+	# ones rejoin the shared pool.
+	def __copy__(self):
+
+		return self
+
+	def __deepcopy__(self, memo):
+
+		return self
+
+	def __reduce__(self):
+
+		return (AttributeSet.intern, (self.__items,))
+
+# Attribute set shared by every node without attributes
+EMPTY_ATTRIBUTES = AttributeSet.intern({})
+
+###############################################################################
+###############################################################################
+
+# What a node's attributes property returns: a regular dict with a copy of
+# the node's attributes, so that it can be serialized, compared, etc. like
+# any other. Changing it gives the node a different attribute set, leaving
+# every other node that shared the old one alone (copy-on-write), and
+# refreshes the dict to match. Nodes only keep the shared set, so the dict is
+# created each time a node's attributes are read.
+class NodeAttributes(dict):
+
+	__slots__ = ('__node',)
+
+	def __init__(self, node):
+
+		super().__init__(node.attributeSet)
+		self.__node = node
+
+	###########################################################################
+
+	# Gives the node a new attribute set and makes the dict match it.
+	def __replace(self, attributeSet):
+
+		self.__node.attributes = attributeSet
+
+		dict.clear(self)
+		dict.update(self, attributeSet)
+
+	###########################################################################
+
+	def __setitem__(self, name, value):
+
+		self.__replace(self.__node.attributeSet.update({name: value}))
+
+	def __delitem__(self, name):
+
+		self.__replace(self.__node.attributeSet.remove(name))
+
+	def __ior__(self, attributes):
+
+		self.update(attributes)
+		return self
+
+	###########################################################################
+
+	# Sets several attributes at once, replacing the node's attribute set only
+	# once.
+	def update(self, *args, **kwargs):
+
+		self.__replace(self.__node.attributeSet.update(dict(*args, **kwargs)))
+
+	def setdefault(self, name, default = None):
+
+		if name not in self:
+			self[name] = default
+
+		return self[name]
+
+	def pop(self, name, *default):
+
+		if name not in self:
+			if default:
+				return default[0]
+			raise KeyError(name)
+
+		value = self[name]
+		del self[name]
+
+		return value
+
+	def popitem(self):
+
+		if not self:
+			raise KeyError('popitem(): dictionary is empty')
+
+		name = next(reversed(self))
+		return name, self.pop(name)
+
+	def clear(self):
+
+		self.__replace(EMPTY_ATTRIBUTES)
+
+	###########################################################################
+
+	# Copies (and pickles) are plain dicts that aren't tied to the node.
+	def copy(self):
+
+		return dict(self)
+
+	def __reduce__(self):
+
+		return (dict, (dict(self),))
+
+###############################################################################
+###############################################################################
+
 class DOMElement(object):
 
 	def __init__(self, nodeType):
@@ -8,9 +224,10 @@ class DOMElement(object):
 		self._nodeType = nodeType
 		self._children = []
 
-		# The node's value and attributes
+		# The node's value and attributes. Attributes are kept in a shared,
+		# immutable AttributeSet.
 		self.value = ''
-		self.attributes = {}
+		self._attributeSet = EMPTY_ATTRIBUTES
 
 	###########################################################################
 
@@ -22,6 +239,30 @@ class DOMElement(object):
 
 	###########################################################################
 
+	# The node's attributes. These can be read and changed like a dict, but
+	# are stored in a shared AttributeSet. Assigning any mapping replaces them.
+	@property
+	def attributes(self):
+
+		return NodeAttributes(self)
+
+	@attributes.setter
+	def attributes(self, attributes):
+
+		self._attributeSet = AttributeSet.intern(attributes)
+
+	###########################################################################
+
+	# Read-only access to the node's AttributeSet, which is faster than going
+	# through attributes when all we want to do is read them or compare them
+	# with another node's.
+	@property
+	def attributeSet(self):
+
+		return self._attributeSet
+
+	###########################################################################
+
 	# Read-only direct access to node's children.
 	@property
 	def children(self):
@@ -67,6 +308,22 @@ class DOMElement(object):
 
 	###########################################################################
 
+	# Replaces the children from index start up to (but not including) index
+	# end with the given nodes.
+	def replaceChildren(self, start, end, newChildren):
+
+		if list is type(self._children):
+			for child in self._children[start:end]:
+				child.parent = None
+			for child in newChildren:
+				child.parent = self
+			self._children[start:end] = newChildren
+
+		else:
+			raise Exception('Children not allowed for node type ' + self.nodeType)
+
+	###########################################################################
+
 	# Returns the number of child nodes.
 	def childCount(self):
 
@@ -77,6 +334,13 @@ class DOMElement(object):
 
 	###########################################################################
 
+	# Appends a string to the node's value.
+	def appendText(self, text):
+
+		self.value += text
+
+	###########################################################################
+
 	# Return a new DOM element of the specified type.
 	@staticmethod
 	def getElement(elemType):
@@ -148,11 +412,49 @@ class TextElement(DOMElement):
 
 	def __init__(self):
 
+		# Text is appended one fragment at a time during parsing, often a
+		# single character at a time. Rather than building a new string for
+		# every fragment, we collect them here and only join them when the
+		# value is actually read (or when the node is finalized.)
+		self.__fragments = []
+
 		super().__init__('text')
 
 		# Children aren't allowed in a text node
 		self._children = False
 
+	###########################################################################
+
+	# The node's text. Reading it always returns a plain string.
+	@property
+	def value(self):
+
+		self.finalize()
+		return self.__fragments[0] if self.__fragments else ''
+
+	@value.setter
+	def value(self, v):
+
+		self.__fragments = [v] if v else []
+
+	###########################################################################
+
+	# Appends a string to the node's text without rebuilding it.
+	def appendText(self, text):
+
+		if text:
+			self.__fragments.append(text)
+
+	###########################################################################
+
+	# Joins any buffered fragments into a single string. This is called
+	# automatically when the value is read, and by the DOM builder once it's
+	# finished appending text to the node.
+	def finalize(self):
+
+		if len(self.__fragments) > 1:
+			self.__fragments = [''.join(self.__fragments)]
+
 ###############################################################################
 ###############################################################################
 
@@ -179,6 +481,129 @@ class ParaElement(DOMElement):
 ###############################################################################
 ###############################################################################
 
+# A paragraph that hasn't been parsed yet (see RTFDOM.parseLazy.) All it
+# knows is its number within the document. The first time its children,
+# value or attributes are touched, loader is called with that number and
+# should return a fully parsed ParaElement, whose contents are then moved
+# into this node. After that, it behaves exactly like a regular paragraph.
+class LazyParaElement(ParaElement):
+
+	def __init__(self, loader, paragraph):
+
+		# Nothing to load while the base class sets up the (empty) defaults
+		self.__loader = None
+		self.__paragraph = paragraph
+
+		super().__init__()
+
+		self.__loader = loader
+
+	###########################################################################
+
+	# True once the paragraph has been parsed.
+	@property
+	def loaded(self):
+
+		return self.__loader is None
+
+	###########################################################################
+
+	# The paragraph's number within the document. This changes if paragraphs
+	# before it are added or removed by RTFDOM.applyEdit.
+	@property
+	def paragraph(self):
+
+		return self.__paragraph
+
+	@paragraph.setter
+	def paragraph(self, paragraph):
+
+		self.__paragraph = paragraph
+
+	###########################################################################
+
+	# Parses the paragraph if we haven't already.
+	def __load(self):
+
+		if self.__loader is not None:
+
+			loader = self.__loader
+			self.__loader = None
+			node = loader(self.__paragraph)
+
+			self.__children = []
+			for child in node.children:
+				self.__children.append(child)
+				child.parent = self
+
+			self.__value = node.value
+			self.__attributeSet = node.attributeSet
+
+	###########################################################################
+
+	# Copies of an unloaded paragraph share its loader, so they can still be
+	# loaded later on (see RTFDOM.getTreeNodes.)
+	def __deepcopy__(self, memo):
+
+		result = self.__class__.__new__(self.__class__)
+		memo[id(self)] = result
+
+		for key, value in self.__dict__.items():
+			if '_LazyParaElement__loader' == key:
+				result.__dict__[key] = value
+			else:
+				result.__dict__[key] = copy.deepcopy(value, memo)
+
+		return result
+
+	###########################################################################
+
+	# Everything in DOMElement goes through self._children, so loading on
+	# access here covers children, appendChild, childCount, etc.
+	@property
+	def _children(self):
+
+		self.__load()
+		return self.__children
+
+	@_children.setter
+	def _children(self, children):
+
+		self.__load()
+		self.__children = children
+
+	###########################################################################
+
+	@property
+	def value(self):
+
+		self.__load()
+		return self.__value
+
+	@value.setter
+	def value(self, v):
+
+		self.__load()
+		self.__value = v
+
+	###########################################################################
+
+	# DOMElement's attributes and attributeSet both go through here
+	@property
+	def _attributeSet(self):
+
+		self.__load()
+		return self.__attributeSet
+
+	@_attributeSet.setter
+	def _attributeSet(self, attributeSet):
+
+		self.__load()
+		self.__attributeSet = attributeSet
+
+###############################################################################
+###############################################################################
+
 # Bold
 class BoldElement(DOMElement):
 
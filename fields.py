@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+# Pulls the fields (hyperlinks, page references, etc.) out of an RTF document
+# without parsing it. The document is scanned for {\field groups, and only
+# their \fldinst and \fldrslt groups get looked at. This is much faster than
+# building an RTFDOM, so it's a good fit for jobs like auditing the links in a
+# large number of documents.
+#
+# Example:
+#
+#   for fieldType, arguments, result, offset in extractFields(rtfContent):
+#       if 'HYPERLINK' == fieldType:
+#           print(arguments[0], result)
+
+import re
+
+from pyrtfdom.codepage import DEFAULT_CODEPAGE, CHARACTER_SET_CODEPAGES, getDecoder
+from pyrtfdom.parsestate.state import findGroupDelimiters
+
+# Start of a field group
+FIELD_START = re.compile(r'\{\\field(?![a-zA-Z])')
+
+# Start of a field's instruction or result group, including the control
+# word's delimiting space, if any
+FIELD_PART = re.compile(r'\{(?:\\\*)?\s*\\(fldinst|fldrslt)(?![a-zA-Z]) ?')
+
+# The document's code page and character set
+CODEPAGE_WORD = re.compile(r'\\ansicpg(\d+)')
+CHARACTER_SET_WORD = re.compile(r'\\(?:ansi|mac|pca|pc)(?![a-zA-Z])')
+
+# The tokens that make up the text of an instruction or result: \'xx bytes,
+# control words (with their parameter and delimiting space), control symbols,
+# braces and runs of plain text. Literal newlines are ignored, just like they
+# are by the parser.
+TEXT_TOKEN = re.compile(r"\\'([0-9a-fA-F]{2})|\\([a-zA-Z]+)(-?\d+)? ?|\\(.)|([{}])|([^\\{}\r\n]+)|[\r\n]+", re.DOTALL)
+
+# Field arguments are either quoted strings or runs of non-whitespace
+ARGUMENT = re.compile(r'"([^"]*)"?|(\S+)')
+
+# Control words and symbols that stand for text
+CONTROL_TEXT = {
+	'\\':        '\\',
+	'{':         '{',
+	'}':         '}',
+	'~':         '\N{NO-BREAK SPACE}',
+	'_':         '\N{NON-BREAKING HYPHEN}',
+	'emspace':   '\N{EM SPACE}',
+	'enspace':   '\N{EN SPACE}',
+	'endash':    '\N{EN DASH}',
+	'emdash':    '\N{EM DASH}',
+	'lquote':    '\N{LEFT SINGLE QUOTATION MARK}',
+	'rquote':    '\N{RIGHT SINGLE QUOTATION MARK}',
+	'ldblquote': '\N{LEFT DOUBLE QUOTATION MARK}',
+	'rdblquote': '\N{RIGHT DOUBLE QUOTATION MARK}',
+	'line':      '\n',
+	'tab':       '\t',
+	'bullet':    '\N{BULLET}'
+}
+
+###############################################################################
+
+# Returns the offset just past the end of the group whose opening brace is at
+# start, or -1 if the group never ends.
+def _findGroupEnd(content, start):
+
+	depth = 0
+
+	for match in findGroupDelimiters(content, start, len(content)):
+
+		delimiter = match.group()
+
+		if '{' == delimiter:
+			depth += 1
+
+		elif '}' == delimiter:
+			depth -= 1
+			if 0 == depth:
+				return match.end()
+
+	return -1
+
+###############################################################################
+
+# Returns the code page the document's text is written in.
+def _documentCodepage(content):
+
+	# Both of these appear at the very beginning of the document
+	header = content[:1024]
+
+	match = CODEPAGE_WORD.search(header)
+	if match:
+		return int(match.group(1))
+
+	match = CHARACTER_SET_WORD.search(header)
+	if match:
+		return CHARACTER_SET_CODEPAGES[match.group()]
+
+	return DEFAULT_CODEPAGE
+
+###############################################################################
+
+# Returns the text between start and end, which should be part of a single
+# group. Formatting is ignored, as are destinations marked with \* and
+# embedded pictures. Text is decoded using the given code page, which, unlike
+# when parsing, doesn't take fonts into account.
+def _extractText(content, start, end, codepage):
+
+	text = []
+	pendingBytes = bytearray()
+
+	# \ucN values of the enclosing groups, and how many more fallback
+	# characters to skip after the last \uN
+	ucStack = []
+	uc = 1
+	skip = 0
+
+	pos = start
+
+	while pos < end:
+
+		match = TEXT_TOKEN.match(content, pos, end)
+		pos = match.end()
+
+		hexByte, word, param, symbol, brace, plain = match.groups()
+
+		if hexByte is None and pendingBytes:
+			text.append(getDecoder(codepage)('replace').decode(bytes(pendingBytes), True))
+			pendingBytes = bytearray()
+
+		if hexByte is not None:
+			if skip:
+				skip -= 1
+			else:
+				pendingBytes.append(int(hexByte, 16))
+
+		elif plain is not None:
+			if skip:
+				dropped = min(skip, len(plain))
+				plain = plain[dropped:]
+				skip -= dropped
+			text.append(plain)
+
+		elif brace is not None:
+
+			skip = 0
+
+			if '{' == brace:
+
+				# Skip over destinations we don't understand, and pictures
+				if content.startswith('\\*', pos) or content.startswith('\\pict', pos):
+					groupEnd = _findGroupEnd(content, pos - 1)
+					pos = end if groupEnd < 0 or groupEnd > end else groupEnd
+
+				else:
+					ucStack.append(uc)
+
+			elif ucStack:
+				uc = ucStack.pop()
+
+		elif word is not None:
+
+			# A control word counts as one of the fallback characters that
+			# follow a \uN
+			if skip:
+				skip -= 1
+
+			elif 'u' == word and param is not None:
+				codePoint = int(param)
+				text.append(chr(codePoint + 65536 if codePoint < 0 else codePoint))
+				skip = uc
+
+			elif 'uc' == word and param is not None:
+				uc = int(param)
+
+			elif 'bin' == word and param is not None:
+				pos = min(pos + int(param), end)
+
+			elif word in CONTROL_TEXT:
+				text.append(CONTROL_TEXT[word])
+
+		elif symbol is not None:
+			if skip:
+				skip -= 1
+			elif symbol in CONTROL_TEXT:
+				text.append(CONTROL_TEXT[symbol])
+
+	if pendingBytes:
+		text.append(getDecoder(codepage)('replace').decode(bytes(pendingBytes), True))
+
+	return ''.join(text)
+
+###############################################################################
+
+# Splits a field's instruction into the field type and its arguments. Quoted
+# arguments are unquoted, and switches (\o, \l, etc.) are kept as arguments of
+# their own.
+def parseInstruction(instruction):
+
+	arguments = [
+		match.group(1) if match.group(1) is not None else match.group(2)
+		for match in ARGUMENT.finditer(instruction)
+	]
+
+	if not arguments:
+		return '', []
+
+	return arguments[0], arguments[1:]
+
+###############################################################################
+
+# Yields (field type, arguments, result text, offset) for every field in an
+# RTF document, in order. The field type is the first word of the field's
+# instruction (HYPERLINK, PAGEREF, etc.), arguments is a list of the rest (see
+# parseInstruction), and offset is where the field's group starts in the
+# document. rtfContent can be a string or a bytes-like object, just like
+# RTFParser.openString accepts, and offsets are indexes into it either way.
+# Fields nested inside other fields are yielded after the field containing
+# them.
+def extractFields(rtfContent):
+
+	if isinstance(rtfContent, (bytes, bytearray, memoryview)):
+		content = str(rtfContent, 'latin-1')
+	else:
+		content = rtfContent
+
+	codepage = _documentCodepage(content)
+
+	for fieldMatch in FIELD_START.finditer(content):
+
+		offset = fieldMatch.start()
+
+		# An escaped brace followed by the text "\field" isn't a field
+		backslashes = 0
+		while offset - backslashes > 0 and '\\' == content[offset - backslashes - 1]:
+			backslashes += 1
+		if backslashes % 2:
+			continue
+
+		fieldEnd = _findGroupEnd(content, offset)
+		if fieldEnd < 0:
+			fieldEnd = len(content)
+
+		instruction = ''
+		result = ''
+
+		# Look for \fldinst and \fldrslt among the field group's immediate
+		# children
+		depth = 0
+		for match in findGroupDelimiters(content, offset, fieldEnd):
+
+			delimiter = match.group()
+
+			if '{' == delimiter:
+
+				depth += 1
+
+				if 2 == depth:
+					partMatch = FIELD_PART.match(content, match.start(), fieldEnd)
+					if partMatch:
+						partEnd = _findGroupEnd(content, match.start())
+						if partEnd < 0:
+							partEnd = fieldEnd
+						text = _extractText(content, partMatch.end(), partEnd - 1, codepage)
+						if 'fldinst' == partMatch.group(1):
+							instruction += text
+						else:
+							result += text
+
+			elif '}' == delimiter:
+				depth -= 1
+
+		fieldType, arguments = parseInstruction(instruction)
+		yield fieldType, arguments, result, offset
+
+###############################################################################
+
+# Same as extractFields, but reads the document from a file.
+def extractFieldsFromFile(filename):
+
+	rtfFile = open(filename, 'rb')
+	rtfContent = rtfFile.read()
+	rtfFile.close()
+
+	return extractFields(rtfContent)
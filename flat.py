@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+# A compact, read-only tree representation for analyzing large numbers of
+# documents, where an object per node (see elements.py) takes up far too much
+# memory. Instead, a FlatTree stores every node as one entry in each of a set
+# of parallel columns (see the array module):
+#
+#   nodeType     Index of the node's type in NODE_TYPES
+#   parent       Index of the node's parent, or -1 if it's a root
+#   firstChild   Index of the node's first child, or -1 if it has none
+#   nextSibling  Index of the node's next sibling, or -1 if it's the last
+#   textOffset   Where the node's value starts in the text buffer
+#   textLength   Length of the node's value in the text buffer, in bytes
+#   attributes   Index of the node's AttributeSet in attributeSets
+#
+# Node values are stored one after another in a single shared text buffer,
+# text as UTF-8 and images as raw bytes. Since attribute sets are interned,
+# nodes with the same attributes share an entry in attributeSets. A tree can
+# hold any number of documents, each with a root node of its own.
+#
+# Nodes are read through FlatNode proxies, which have the same read-only API
+# as DOMElement (nodeType, value, attributes, attributeSet, children, parent
+# and childCount), so code that walks a DOM tree can walk a FlatTree too. The
+# proxies are created on demand and hold nothing but a node's index.
+#
+# The columns and text buffer can be handed to NumPy (or anything else that
+# supports the buffer protocol) without copying them (see columns and
+# toNumpy.) A tree can't grow while any of them are exported.
+
+import array
+
+# Node types, in the order of their codes in the nodeType column
+NODE_TYPES = (
+	'rtf',
+	'para',
+	'text',
+	'img',
+	'pagebreak',
+	'hyperlink',
+	'footnote',
+	'bold',
+	'italic',
+	'underline',
+	'strikethrough'
+)
+
+# Node types that can't have children (see DOMElement.children)
+LEAF_TYPES = frozenset(['text', 'img', 'pagebreak'])
+
+# Node types whose values are bytes instead of strings
+BINARY_TYPES = frozenset(['img'])
+
+# Columns and their array typecodes. Node indices and text offsets get 64
+# bits, so that a single tree can hold as many documents as fit in memory.
+COLUMNS = (
+	('nodeType',    'B'),
+	('parent',      'q'),
+	('firstChild',  'q'),
+	('nextSibling', 'q'),
+	('textOffset',  'q'),
+	('textLength',  'q'),
+	('attributes',  'i')
+)
+
+###############################################################################
+
+class FlatTree(object):
+
+	def __init__(self):
+
+		for name, typecode in COLUMNS:
+			setattr(self, '_' + name, array.array(typecode))
+
+		self.__text = bytearray()
+		self.__typeCodes = {nodeType: code for code, nodeType in enumerate(NODE_TYPES)}
+
+		# Every attribute set used by the tree, along with the index of each,
+		# keyed by id (the list keeps them alive, so ids can't be reused.)
+		self.__attributeSets = []
+		self.__attributeIndices = {}
+
+		# Last child of every node, so that appending a child doesn't have to
+		# walk its siblings. Only needed while the tree's being built, so it
+		# isn't one of the exported columns.
+		self.__lastChild = array.array('q')
+
+		# First and last root nodes
+		self.__firstRoot = -1
+		self.__lastRoot = -1
+
+	###########################################################################
+
+	# Returns a new FlatTree with a copy of the DOM tree rooted at node.
+	@staticmethod
+	def fromElement(node):
+
+		tree = FlatTree()
+		tree.append(node)
+
+		return tree
+
+	###########################################################################
+
+	# Number of nodes in the tree.
+	def __len__(self):
+
+		return len(self._nodeType)
+
+	###########################################################################
+
+	# Attribute sets are looked up by id, which changes when a tree is
+	# unpickled, so the lookup is rebuilt.
+	def __setstate__(self, state):
+
+		self.__dict__.update(state)
+		self.__attributeIndices = {id(attributeSet): index for index, attributeSet in enumerate(self.__attributeSets)}
+
+	###########################################################################
+
+	# Every attribute set used by the tree, in the order of their indices in
+	# the attributes column.
+	@property
+	def attributeSets(self):
+
+		return self.__attributeSets
+
+	###########################################################################
+
+	# Root nodes of the documents in the tree, in the order they were added.
+	@property
+	def roots(self):
+
+		roots = []
+
+		index = self.__firstRoot
+		while index >= 0:
+			roots.append(FlatNode(self, index))
+			index = self._nextSibling[index]
+
+		return roots
+
+	###########################################################################
+
+	# Returns the node with the given index.
+	def node(self, index):
+
+		if index < 0 or index >= len(self._nodeType):
+			raise IndexError('Node index out of range')
+
+		return FlatNode(self, index)
+
+	###########################################################################
+
+	# Returns the index of an attribute set, adding it if it's new.
+	def __attributeIndex(self, attributeSet):
+
+		index = self.__attributeIndices.get(id(attributeSet))
+
+		if index is None:
+			index = len(self.__attributeSets)
+			self.__attributeSets.append(attributeSet)
+			self.__attributeIndices[id(attributeSet)] = index
+
+		return index
+
+	###########################################################################
+
+	# Adds a single node as the last child of parent (or as a new root if
+	# parent is -1) and returns its index.
+	def __appendNode(self, node, parent):
+
+		nodeType = node.nodeType
+		if nodeType not in self.__typeCodes:
+			raise Exception(nodeType + ' is an unsupported Element type.')
+
+		value = node.value
+		if isinstance(value, str):
+			value = value.encode('utf-8')
+
+		index = len(self._nodeType)
+
+		self._nodeType.append(self.__typeCodes[nodeType])
+		self._parent.append(parent)
+		self._firstChild.append(-1)
+		self._nextSibling.append(-1)
+		self._textOffset.append(len(self.__text))
+		self._textLength.append(len(value))
+		self._attributes.append(self.__attributeIndex(node.attributeSet))
+		self.__lastChild.append(-1)
+
+		self.__text += value
+
+		if parent < 0:
+			previous = self.__lastRoot
+			self.__lastRoot = index
+			if self.__firstRoot < 0:
+				self.__firstRoot = index
+		else:
+			previous = self.__lastChild[parent]
+			self.__lastChild[parent] = index
+			if previous < 0:
+				self._firstChild[parent] = index
+
+		if previous >= 0:
+			self._nextSibling[previous] = index
+
+		return index
+
+	###########################################################################
+
+	# Copies the DOM tree rooted at node into the tree, as the last child of
+	# parent (a FlatNode or node index), or as a new root if parent is None,
+	# and returns the copy's root. The DOM tree isn't needed afterwards, so a
+	# document can be added one paragraph at a time (see RTFDOM.parseFlat.)
+	def append(self, node, parent = None):
+
+		if isinstance(parent, FlatNode):
+			if parent.tree is not self:
+				raise ValueError('Parent must belong to the same FlatTree.')
+			parent = parent.index
+
+		elif parent is None:
+			parent = -1
+
+		if parent >= 0 and NODE_TYPES[self._nodeType[parent]] in LEAF_TYPES:
+			raise Exception('Children not allowed for node type ' + NODE_TYPES[self._nodeType[parent]])
+
+		root = None
+
+		# Nodes are added in document order (each node before its children,
+		# and its children before its next sibling), so every subtree's nodes
+		# have consecutive indices.
+		nodes = [(node, parent)]
+		while nodes:
+			node, parent = nodes.pop()
+			index = self.__appendNode(node, parent)
+			if root is None:
+				root = index
+			if node.children:
+				nodes.extend((child, index) for child in reversed(node.children))
+
+		return FlatNode(self, root)
+
+	###########################################################################
+
+	# Returns the value of the node with the given index.
+	def _value(self, index):
+
+		offset = self._textOffset[index]
+		value = self.__text[offset:offset + self._textLength[index]]
+
+		if NODE_TYPES[self._nodeType[index]] in BINARY_TYPES:
+			return bytes(value)
+
+		return value.decode('utf-8')
+
+	###########################################################################
+
+	# Returns a dict of memoryviews of every column (see COLUMNS) and of the
+	# text buffer (as 'text'), without copying any of them.
+	def columns(self):
+
+		views = {name: memoryview(getattr(self, '_' + name)) for name, typecode in COLUMNS}
+		views['text'] = memoryview(self.__text)
+
+		return views
+
+	###########################################################################
+
+	# Returns a dict of NumPy arrays sharing memory with the columns and text
+	# buffer (see columns.) Requires NumPy, which is otherwise optional.
+	def toNumpy(self):
+
+		import numpy
+
+		return {name: numpy.asarray(view) for name, view in self.columns().items()}
+
+###############################################################################
+###############################################################################
+
+# A single node in a FlatTree, with the same read-only API as DOMElement.
+# Proxies are cheap to create and compare equal if they refer to the same
+# node, so there's no need to hold on to them.
+class FlatNode(object):
+
+	__slots__ = ('__tree', '__index')
+
+	def __init__(self, tree, index):
+
+		self.__tree = tree
+		self.__index = index
+
+	###########################################################################
+
+	# The FlatTree the node belongs to
+	@property
+	def tree(self):
+
+		return self.__tree
+
+	###########################################################################
+
+	# The node's index in its tree's columns
+	@property
+	def index(self):
+
+		return self.__index
+
+	###########################################################################
+
+	@property
+	def nodeType(self):
+
+		return NODE_TYPES[self.__tree._nodeType[self.__index]]
+
+	###########################################################################
+
+	@property
+	def value(self):
+
+		return self.__tree._value(self.__index)
+
+	###########################################################################
+
+	# The node's attributes, as a read-only AttributeSet
+	@property
+	def attributes(self):
+
+		return self.attributeSet
+
+	@property
+	def attributeSet(self):
+
+		return self.__tree.attributeSets[self.__tree._attributes[self.__index]]
+
+	###########################################################################
+
+	# A list of the node's children, or False if the node's type can't have
+	# any (like DOMElement.children.)
+	@property
+	def children(self):
+
+		if self.nodeType in LEAF_TYPES:
+			return False
+
+		tree = self.__tree
+		children = []
+
+		index = tree._firstChild[self.__index]
+		while index >= 0:
+			children.append(FlatNode(tree, index))
+			index = tree._nextSibling[index]
+
+		return children
+
+	###########################################################################
+
+	@property
+	def parent(self):
+
+		parent = self.__tree._parent[self.__index]
+		return FlatNode(self.__tree, parent) if parent >= 0 else None
+
+	###########################################################################
+
+	# Returns the number of child nodes.
+	def childCount(self):
+
+		tree = self.__tree
+		count = 0
+
+		index = tree._firstChild[self.__index]
+		while index >= 0:
+			count += 1
+			index = tree._nextSibling[index]
+
+		return count
+
+	###########################################################################
+
+	def __eq__(self, other):
+
+		return isinstance(other, FlatNode) and self.__tree is other.__tree and self.__index == other.__index
+
+	def __hash__(self):
+
+		return hash((id(self.__tree), self.__index))
+
+	def __repr__(self):
+
+		return 'FlatNode(' + self.nodeType + ', ' + str(self.__index) + ')'
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+# Documents generated from the same template tend to share byte-for-byte
+# identical font tables, color tables and stylesheets. Rather than parsing them again for
+# every document, the parser looks each one up in a bounded, process-wide LRU
+# cache keyed by the group's contents (plus anything else the result depends
+# on) and replays the cached result on a hit. Groups are identified by their
+# length and a hash of their contents (see contentKey), so that the cache
+# doesn't keep large tables alive. Cached results are shared between parsers
+# and threads, so they must never be modified, and anything mutable in them
+# has to be copied on its way into and out of the cache.
+
+import collections, hashlib, threading
+
+# Maximum number of header groups kept in the default cache
+DEFAULT_MAX_SIZE = 256
+
+###############################################################################
+
+# Returns what identifies a header group's contents in a cache key: its
+# length and a digest of its contents.
+def contentKey(groupContent):
+
+	return len(groupContent), hashlib.sha256(groupContent.encode('utf-8', 'surrogatepass')).digest()
+
+###############################################################################
+
+class HeaderCache(object):
+
+	def __init__(self, maxSize = DEFAULT_MAX_SIZE):
+
+		self.__maxSize = maxSize
+		self.__entries = collections.OrderedDict()
+		self.__lock = threading.Lock()
+
+		self.__hits = 0
+		self.__misses = 0
+
+	###########################################################################
+
+	# Returns the cached result for the given key, or None if there isn't one.
+	def get(self, key):
+
+		with self.__lock:
+
+			result = self.__entries.get(key)
+
+			if result is None:
+				self.__misses += 1
+			else:
+				self.__hits += 1
+				self.__entries.move_to_end(key)
+
+			return result
+
+	###########################################################################
+
+	# Caches a result, evicting the least recently used one if the cache is
+	# full.
+	def put(self, key, result):
+
+		with self.__lock:
+
+			self.__entries[key] = result
+			self.__entries.move_to_end(key)
+
+			while len(self.__entries) > self.__maxSize:
+				self.__entries.popitem(last = False)
+
+	###########################################################################
+
+	# Empties the cache and resets its statistics.
+	def clear(self):
+
+		with self.__lock:
+			self.__entries.clear()
+			self.__hits = 0
+			self.__misses = 0
+
+	###########################################################################
+
+	# Returns a dict with the cache's hit and miss counts, hit rate, current
+	# size and maximum size.
+	def stats(self):
+
+		with self.__lock:
+
+			lookups = self.__hits + self.__misses
+
+			return {
+				'hits':    self.__hits,
+				'misses':  self.__misses,
+				'hitRate': self.__hits / lookups if lookups else 0.0,
+				'size':    len(self.__entries),
+				'maxSize': self.__maxSize
+			}
+
+###############################################################################
+
+# The cache used by every parser that isn't given one of its own
+defaultHeaderCache = HeaderCache()
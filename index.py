@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+
+# An index of paragraph and page boundaries in an RTF document. For each
+# boundary, the index records the offset into the document along with a
+# snapshot of the parser's state stack, so that parsing can later be resumed
+# from that point without having to parse everything that comes before it.
+# The stylesheet, color table and default formatting attributes are only
+# stored once, and identical state stacks are shared between checkpoints.
+#
+# Example:
+#
+#   index = RTFIndex.forFile('huge.rtf')
+#   dom = RTFDOM()
+#   dom.openFile('huge.rtf')
+#   dom.parsePages(index, 411)
+
+import json, os
+
+from pyrtfdom.parse import RTFParser
+
+# Bump this whenever the format of saved indexes changes
+INDEX_VERSION = 3
+
+###############################################################################
+
+# Returns the index of the first of a sorted list of checkpoint entries whose
+# field'th element is at least value. Same as bisect.bisect_left with a key,
+# which isn't available before Python 3.10.
+def _bisectEntries(entries, field, value):
+
+	low = 0
+	high = len(entries)
+
+	while low < high:
+		middle = (low + high) // 2
+		if entries[middle][field] < value:
+			low = middle + 1
+		else:
+			high = middle
+
+	return low
+
+###############################################################################
+
+class RTFIndex(object):
+
+	def __init__(self):
+
+		# Size and modification time of the indexed file, if the index was
+		# built from one. Used to detect stale indexes.
+		self.size = None
+		self.mtime = None
+
+		# Stylesheet, color table and default attributes (see
+		# RTFParser._getHeader)
+		self.header = None
+
+		# Unique state stacks referenced by the checkpoints below
+		self.states = []
+
+		# Maps the JSON representation of each state stack in self.states to
+		# its index. Only built when we need it (see __makeEntry.)
+		self.__stateIds = None
+
+		# Checkpoints recorded after each \par and each \page, respectively.
+		# Each one is a list of the form [offset, prevToken, stateIndex,
+		# tokenOffset], where tokenOffset is where the \par or \page itself
+		# starts.
+		self.paragraphs = []
+		self.pages = []
+
+	###########################################################################
+
+	# Number of paragraphs in the document.
+	@property
+	def paragraphCount(self):
+
+		return len(self.paragraphs) + 1
+
+	###########################################################################
+
+	# Number of pages in the document.
+	@property
+	def pageCount(self):
+
+		return len(self.pages) + 1
+
+	###########################################################################
+
+	# Returns the name of the file an RTF file's index is saved to.
+	@staticmethod
+	def indexFilename(filename):
+
+		return filename + '.idx'
+
+	###########################################################################
+
+	# Builds an index of an RTF string (or bytes-like object, see
+	# RTFParser.openString.)
+	@staticmethod
+	def build(rtfContent):
+
+		index = RTFIndex()
+
+		def onCheckpoint(parser, checkpointType):
+			index.addCheckpoint(checkpointType, parser._getCheckpoint())
+
+		def ignore(*args):
+			pass
+
+		parser = RTFParser({'callbacks': {
+			'onOpenParagraph':   ignore,
+			'onAppendParagraph': ignore,
+			'onStateChange':     ignore,
+			'onField':           ignore,
+			'onCheckpoint':      onCheckpoint
+		}})
+
+		parser.openString(rtfContent)
+		parser.parse()
+		index.header = parser._getHeader()
+
+		return index
+
+	###########################################################################
+
+	# Builds an index of an RTF file.
+	@staticmethod
+	def buildFromFile(filename):
+
+		# Read the file the same way RTFParser.openFile does, so that offsets
+		# in the index match
+		rtfFile = open(filename, 'rb')
+		index = RTFIndex.build(rtfFile.read())
+		rtfFile.close()
+
+		fileStat = os.stat(filename)
+		index.size = fileStat.st_size
+		index.mtime = fileStat.st_mtime
+
+		return index
+
+	###########################################################################
+
+	# Returns the index saved next to an RTF file if it exists and is up to
+	# date. Otherwise, builds a new index and saves it next to the file.
+	@staticmethod
+	def forFile(filename):
+
+		indexFilename = RTFIndex.indexFilename(filename)
+
+		if os.path.exists(indexFilename):
+			try:
+				index = RTFIndex.load(indexFilename)
+				if not index.isStale(filename):
+					return index
+			except (ValueError, KeyError):
+				pass
+
+		index = RTFIndex.buildFromFile(filename)
+		index.save(indexFilename)
+
+		return index
+
+	###########################################################################
+
+	# Returns True if the RTF file has changed since it was indexed.
+	def isStale(self, filename):
+
+		fileStat = os.stat(filename)
+		return self.size != fileStat.st_size or self.mtime != fileStat.st_mtime
+
+	###########################################################################
+
+	# Saves the index to a file.
+	def save(self, filename):
+
+		# JSON only allows string keys, so the stylesheet's integer style
+		# indexes and the font table's font indexes are saved as lists of
+		# [index, value] pairs.
+		header = dict(self.header)
+		header['stylesheet'] = {
+			styleType: [[styleIndex, style] for styleIndex, style in styles.items()]
+			for styleType, styles in self.header['stylesheet'].items()
+		}
+		header['fonttable'] = [[fontIndex, font] for fontIndex, font in self.header['fonttable'].items()]
+
+		indexFile = open(filename, 'w')
+		json.dump({
+			'version':    INDEX_VERSION,
+			'size':       self.size,
+			'mtime':      self.mtime,
+			'header':     header,
+			'states':     self.states,
+			'paragraphs': self.paragraphs,
+			'pages':      self.pages
+		}, indexFile)
+		indexFile.close()
+
+	###########################################################################
+
+	# Loads an index previously saved with save().
+	@staticmethod
+	def load(filename):
+
+		indexFile = open(filename, 'r')
+		data = json.load(indexFile)
+		indexFile.close()
+
+		if INDEX_VERSION != data['version']:
+			raise ValueError('Unsupported RTF index version ' + str(data['version']))
+
+		index = RTFIndex()
+		index.size = data['size']
+		index.mtime = data['mtime']
+		index.states = data['states']
+		index.paragraphs = data['paragraphs']
+		index.pages = data['pages']
+
+		index.header = data['header']
+		index.header['stylesheet'] = {
+			styleType: {styleIndex: style for styleIndex, style in styles}
+			for styleType, styles in data['header']['stylesheet'].items()
+		}
+		index.header['fonttable'] = {fontIndex: tuple(font) for fontIndex, font in data['header']['fonttable']}
+
+		return index
+
+	###########################################################################
+
+	# Converts a checkpoint returned by RTFParser._getCheckpoint into an entry
+	# for self.paragraphs or self.pages, sharing its state stack with any
+	# identical one that's already in the index.
+	def __makeEntry(self, checkpoint):
+
+		if self.__stateIds is None:
+			self.__stateIds = {}
+			for i in range(len(self.states)):
+				self.__stateIds[json.dumps(self.states[i], sort_keys = True)] = i
+
+		key = json.dumps(checkpoint['states'], sort_keys = True)
+		if key not in self.__stateIds:
+			self.__stateIds[key] = len(self.states)
+			self.states.append(checkpoint['states'])
+
+		tokenOffset = checkpoint['offset'] - len(checkpoint['prevToken'][1])
+		return [checkpoint['offset'], checkpoint['prevToken'], self.__stateIds[key], tokenOffset]
+
+	###########################################################################
+
+	# Adds a checkpoint of the given type ('paragraph' or 'page') to the end
+	# of the index.
+	def addCheckpoint(self, checkpointType, checkpoint):
+
+		entry = self.__makeEntry(checkpoint)
+
+		if 'paragraph' == checkpointType:
+			self.paragraphs.append(entry)
+		else:
+			self.pages.append(entry)
+
+	###########################################################################
+
+	# Figures out how much of the document has to be parsed again after the
+	# characters between start and end have been replaced. Returns None if
+	# the edit touches the first paragraph (which includes the header), in
+	# which case the whole document has to be parsed again. Otherwise,
+	# returns [first, resync], where first is the first paragraph affected by
+	# the edit and resync is the index of the first paragraph checkpoint whose
+	# \par comes entirely after the edit (or None if there isn't one.) An
+	# edit that starts right after a \par is considered to affect the
+	# paragraph before it, since it could change how the \par is tokenized.
+	def editRange(self, start, end):
+
+		first = _bisectEntries(self.paragraphs, 0, start)
+		if 0 == first:
+			return None
+
+		resync = _bisectEntries(self.paragraphs, 3, end)
+		if resync >= len(self.paragraphs):
+			resync = None
+
+		return [first, resync]
+
+	###########################################################################
+
+	# Returns the state stack recorded by a paragraph checkpoint.
+	def paragraphStates(self, checkpointIndex):
+
+		return self.states[self.paragraphs[checkpointIndex][2]]
+
+	###########################################################################
+
+	# Updates the index after the region of the document between the
+	# checkpoint of paragraph first and the \par of checkpoint resync (or the
+	# end of the document if resync is None) was parsed again. delta is the
+	# change in the document's length, and checkpoints is a list of
+	# [checkpointType, checkpoint] recorded while parsing the region again.
+	def applyEdit(self, first, resync, delta, checkpoints):
+
+		regionStart = self.paragraphs[first - 1][0]
+		regionEnd = self.paragraphs[resync][3] if resync is not None else float('inf')
+
+		def update(entries, newEntries):
+			updated = []
+			for entry in entries:
+				if entry[0] <= regionStart:
+					updated.append(entry)
+			updated.extend(newEntries)
+			for entry in entries:
+				if entry[3] >= regionEnd:
+					updated.append([entry[0] + delta, entry[1], entry[2], entry[3] + delta])
+			return updated
+
+		newParagraphs = []
+		newPages = []
+		for checkpointType, checkpoint in checkpoints:
+			if 'paragraph' == checkpointType:
+				newParagraphs.append(self.__makeEntry(checkpoint))
+			else:
+				newPages.append(self.__makeEntry(checkpoint))
+
+		self.paragraphs = update(self.paragraphs, newParagraphs)
+		self.pages = update(self.pages, newPages)
+
+		# The index no longer matches whatever file it was built from
+		self.size = None
+		self.mtime = None
+
+	###########################################################################
+
+	# Replaces the contents of this index with a fresh index of rtfContent.
+	def rebuild(self, rtfContent):
+
+		index = RTFIndex.build(rtfContent)
+
+		self.size = None
+		self.mtime = None
+		self.header = index.header
+		self.states = index.states
+		self.paragraphs = index.paragraphs
+		self.pages = index.pages
+		self.__stateIds = None
+
+	###########################################################################
+
+	# Converts an entry in self.paragraphs or self.pages into a checkpoint
+	# that can be passed to RTFParser.resume.
+	def __checkpoint(self, entry):
+
+		return {
+			'offset':    entry[0],
+			'prevToken': entry[1],
+			'states':    self.states[entry[2]]
+		}
+
+	###########################################################################
+
+	# Returns [checkpoint, endOffset] for parsing count paragraphs starting at
+	# the given (zero-based) paragraph. checkpoint is None if parsing has to
+	# start at the beginning of the document, and endOffset is None if it has
+	# to continue to the end.
+	def paragraphRange(self, first, count = 1):
+
+		return self.__range(self.paragraphs, first, count)
+
+	###########################################################################
+
+	# Same as paragraphRange, but for pages.
+	def pageRange(self, first, count = 1):
+
+		return self.__range(self.pages, first, count)
+
+	###########################################################################
+
+	def __range(self, entries, first, count):
+
+		if first < 0 or first > len(entries):
+			raise IndexError('Index out of range')
+
+		checkpoint = self.__checkpoint(entries[first - 1]) if first > 0 else None
+
+		# Stop just before the \par or \page that ends the range
+		last = first + count - 1
+		endOffset = entries[last][3] if last < len(entries) else None
+
+		return [checkpoint, endOffset]
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# Resource limits for parsing documents that can't be trusted (uploads, email
+# attachments, etc.) Without them, a small file can make the parser use
+# unbounded amounts of memory or time: a hundred thousand nested braces, an
+# enormous \pict, a field nested inside of itself over and over, and so on.
+#
+# Limits are passed as a dict to RTFParser (the 'limits' option) or RTFDOM
+# (the limits argument.) Any limit that's missing or None is unlimited:
+#
+#   maxDepth       Levels of curly braces that can be open at once
+#   maxTextLength  Characters of text the document can produce, including
+#                  field results
+#   maxImageBytes  Bytes of image data in the whole document
+#   maxNodes       DOM nodes created for the document (RTFDOM only)
+#   maxFieldDepth  Fields that can be nested inside of each other
+#   timeLimit      Seconds a single parse can take
+#
+# When a limit is exceeded, the parse stops right away with one of the
+# exceptions below. Checking the limits costs almost nothing, since each is
+# only checked where the resource it guards is used (and the time limit only
+# every yieldEvery tokens.)
+
+# Names of all the limits, with their default (unlimited) values
+NO_LIMITS = {
+	'maxDepth':      None,
+	'maxTextLength': None,
+	'maxImageBytes': None,
+	'maxNodes':      None,
+	'maxFieldDepth': None,
+	'timeLimit':     None
+}
+
+# Limits that are generous enough for any reasonable document, but keep a
+# hostile one from using more than a few hundred MB or more than half a minute.
+UNTRUSTED_LIMITS = {
+	'maxDepth':      1000,
+	'maxTextLength': 50 * 1000 * 1000,
+	'maxImageBytes': 100 * 1000 * 1000,
+	'maxNodes':      1000 * 1000,
+	'maxFieldDepth': 16,
+	'timeLimit':     30
+}
+
+###############################################################################
+
+# Returns a complete set of limits, with anything not given in limits left
+# unlimited.
+def resolveLimits(limits):
+
+	resolved = dict(NO_LIMITS)
+
+	if limits:
+		for name, value in limits.items():
+			if name not in NO_LIMITS:
+				raise ValueError('Unknown parse limit ' + name)
+			resolved[name] = value
+
+	return resolved
+
+###############################################################################
+
+# Base class of the exceptions raised when a document exceeds one of its
+# limits. limit is the name of the limit that was exceeded and value is what
+# it was set to.
+class ParseLimitError(Exception):
+
+	def __init__(self, limit, value, message):
+
+		super().__init__(message + ' (' + limit + ' = ' + str(value) + ')')
+
+		self.limit = limit
+		self.value = value
+		self.message = message
+
+	###########################################################################
+
+	# Exceptions are pickled along with the arguments they were created with,
+	# which have to match __init__'s (for example, when an exception raised
+	# in a worker process is passed back to the parent.)
+	def __reduce__(self):
+
+		if ParseLimitError is type(self):
+			return (ParseLimitError, (self.limit, self.value, self.message))
+
+		return (type(self), (self.value,))
+
+###############################################################################
+
+class NestingLimitError(ParseLimitError):
+
+	def __init__(self, value):
+
+		super().__init__('maxDepth', value, 'Too many nested groups')
+
+class TextLimitError(ParseLimitError):
+
+	def __init__(self, value):
+
+		super().__init__('maxTextLength', value, 'Document contains too much text')
+
+class ImageLimitError(ParseLimitError):
+
+	def __init__(self, value):
+
+		super().__init__('maxImageBytes', value, 'Document contains too much image data')
+
+class NodeLimitError(ParseLimitError):
+
+	def __init__(self, value):
+
+		super().__init__('maxNodes', value, 'Document produces too many nodes')
+
+class FieldDepthLimitError(ParseLimitError):
+
+	def __init__(self, value):
+
+		super().__init__('maxFieldDepth', value, 'Too many nested fields')
+
+class TimeLimitError(ParseLimitError):
+
+	def __init__(self, value):
+
+		super().__init__('timeLimit', value, 'Parsing took too long')
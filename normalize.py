@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# Simplifies a DOM tree without changing what it represents. As the tree is
+# built, formatting elements are closed and reopened every time the parser's
+# state changes, and an empty text node is left behind after every image,
+# page break and field, so trees built from real world documents (especially
+# Word's) tend to have lots of redundant nodes. Normalizing a tree:
+#
+#   * Removes empty text nodes, along with formatting elements that end up
+#     with nothing inside of them
+#   * Merges adjacent text nodes
+#   * Merges adjacent formatting elements of the same type, along with
+#     whatever becomes adjacent inside of them as a result
+#
+# Each node is visited once, so this takes time proportional to the size of
+# the tree.
+
+from pyrtfdom import elements
+
+# Formatting elements that can be merged with an identical sibling
+MERGEABLE_TYPES = frozenset(['bold', 'italic', 'underline', 'strikethrough'])
+
+###############################################################################
+
+# Paragraphs that haven't been loaded yet are left alone, since looking
+# inside of them would load them (see RTFDOM.parseLazy.)
+def _isUnloaded(node):
+
+	return isinstance(node, elements.LazyParaElement) and not node.loaded
+
+###############################################################################
+
+# Returns the number of nodes in a tree, including its root.
+def countNodes(node):
+
+	count = 0
+	nodes = [node]
+
+	while nodes:
+		node = nodes.pop()
+		count += 1
+		if not _isUnloaded(node) and node.children:
+			nodes.extend(node.children)
+
+	return count
+
+###############################################################################
+
+def _canMerge(node, nextNode):
+
+	if node.nodeType != nextNode.nodeType:
+		return False
+
+	elif 'text' == node.nodeType:
+		return True
+
+	return node.nodeType in MERGEABLE_TYPES and node.attributeSet == nextNode.attributeSet
+
+###############################################################################
+
+# Moves the contents of nextNode to the end of node. Both should already be
+# normalized, so the only place anything else could need merging is where
+# their children meet.
+def _merge(node, nextNode):
+
+	if 'text' == node.nodeType:
+		node.appendText(nextNode.value)
+
+	else:
+		children = list(nextNode.children)
+		nextNode.replaceChildren(0, len(children), [])
+
+		if children and node.children and _canMerge(node.children[-1], children[0]):
+			_merge(node.children[-1], children.pop(0))
+
+		for child in children:
+			node.appendChild(child)
+
+	nextNode.parent = None
+
+###############################################################################
+
+def _normalizeChildren(node):
+
+	if _isUnloaded(node) or list is not type(node.children):
+		return
+
+	children = []
+
+	for child in node.children:
+
+		_normalizeChildren(child)
+
+		if 'text' == child.nodeType and not child.value:
+			continue
+
+		elif child.nodeType in MERGEABLE_TYPES and not child.children:
+			continue
+
+		elif children and _canMerge(children[-1], child):
+			_merge(children[-1], child)
+
+		else:
+			children.append(child)
+
+	node.replaceChildren(0, len(node.children), children)
+
+###############################################################################
+
+# Normalizes the tree rooted at node in place. Returns the number of nodes in
+# the tree before and after, as {'before': ..., 'after': ...}.
+def normalize(node):
+
+	before = countNodes(node)
+	_normalizeChildren(node)
+
+	return {'before': before, 'after': countNodes(node)}
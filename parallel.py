@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# Support for parsing a single large document on several cores at once (see
+# RTFDOM.parseParallel.) It works in three steps:
+#
+#   1. A prescan runs the parser over the document with every callback
+#      switched off, skipping over every group that doesn't contain a
+#      paragraph break (see RTFParser._setSkipGroups), and records a
+#      checkpoint (see RTFParser._getCheckpoint) at the first paragraph
+#      boundary in the main body past each chunk's target size. The header
+#      (stylesheet, color table, etc.) comes from the same pass.
+#   2. Each chunk is parsed in a separate process, resuming from its
+#      checkpoint with the header and the formatting state recorded there,
+#      and stopping just before the \par that starts the next chunk.
+#   3. The paragraphs of each chunk are put back together, in order.
+#
+# Since every chunk starts from exactly the state the parser would have been
+# in had it parsed everything before it, the result is the same as parsing
+# the whole document in one go.
+#
+# The prescan runs before any of the chunks can start, so it limits how much
+# faster this can be. How long it takes depends on how much of the document
+# is inside of groups that can be skipped. For documents with lots of
+# formatting, fields and images, it takes a tenth to a fifth of the time it
+# takes to build a tree (so no more than five to ten times faster overall),
+# but for one that's mostly plain text at the top level, it can take more
+# than half as long, in which case this is less than twice as fast.
+
+# Callbacks that are switched off while prescanning. onYield is left alone,
+# so that the prescan can still be cancelled or run out of time.
+PRESCAN_CALLBACKS = [
+	'onOpenParagraph',
+	'onAppendParagraph',
+	'onCloseParagraph',
+	'onStateChange',
+	'onPageBreak',
+	'onField',
+	'onImage',
+	'onCheckpoint'
+]
+
+###############################################################################
+
+# Runs the parser over the document it has open and splits the document into
+# at most chunkCount chunks of roughly equal size, each at least minChunkSize
+# characters long (except for the last.) Returns a list of chunks of the
+# form [checkpoint, start, endOffset], where checkpoint is None for the first
+# chunk (which has to be parsed from the beginning), start is where the
+# chunk starts and endOffset is where the next one does (or None for the
+# last.) The parser's callbacks are restored once we're done, and the header
+# it parsed is left in place for RTFParser._getHeader.
+def findChunks(parser, chunkCount, minChunkSize):
+
+	length = len(parser._content) if parser._content else 0
+	chunkSize = max(minChunkSize, length // max(chunkCount, 1) + 1)
+
+	chunks = [[None, 0, None]]
+
+	def onCheckpoint(parser, checkpointType):
+		if 'paragraph' == checkpointType and parser._curPos - chunks[-1][1] >= chunkSize and length - parser._curPos >= minChunkSize:
+			checkpoint = parser._getCheckpoint()
+			chunks[-1][2] = checkpoint['offset'] - len(checkpoint['prevToken'][1])
+			chunks.append([checkpoint, checkpoint['offset'], None])
+
+	callbacks = {name: parser._getCallback(name) for name in PRESCAN_CALLBACKS}
+
+	try:
+		for name in PRESCAN_CALLBACKS:
+			parser._setCallback(name, None)
+		parser._setCallback('onCheckpoint', onCheckpoint)
+		parser._setSkipGroups(True)
+
+		parser.parse()
+
+	finally:
+		parser._setSkipGroups(False)
+		for name, callback in callbacks.items():
+			parser._setCallback(name, callback)
+
+	return chunks
+
+###############################################################################
+
+# Returns the part of the document the parser has open that a worker process
+# needs to parse a chunk, as it was passed to RTFParser.openString (bytes or a
+# string.) One character past the end of the chunk is included, since the
+# tokenizer looks ahead one character to find the end of a control word.
+# Chunks are always sent this way, even if the document was read from a file,
+# since the file could have changed since then.
+def chunkSource(parser, chunk):
+
+	unused, start, endOffset = chunk
+	end = endOffset + 1 if endOffset is not None else None
+
+	source = parser._getSource()[start:end]
+	if isinstance(source, memoryview):
+		source = bytes(source)
+
+	return source
+
+###############################################################################
+
+# Returns a chunk's checkpoint and endOffset relative to where the chunk
+# starts, which is where the part of the document returned by chunkSource
+# starts too.
+def relativeChunk(chunk):
+
+	checkpoint, start, endOffset = chunk
+
+	if checkpoint is not None:
+		checkpoint = dict(checkpoint, offset = checkpoint['offset'] - start)
+
+	if endOffset is not None:
+		endOffset -= start
+
+	return checkpoint, endOffset
@@ -4,20 +4,37 @@
 # primarily to extract formatted text, but could easily be extended and turned
 # into a general parser in the future.
 
-import copy
-
+import copy, time
+
+from .codepage import DEFAULT_CODEPAGE, getDecoder
+from .headercache import defaultHeaderCache
+from .limits import (
+	resolveLimits, NestingLimitError, TextLimitError, ImageLimitError,
+	FieldDepthLimitError, TimeLimitError
+)
 from .parsestate.main import MainState
 from .tokentype import TokenType
 
 ###############################################################################
 
+# Each RTFParser instance keeps all of its mutable state (including default
+# formatting attributes, which a document's stylesheet can change) to itself,
+# and resets it whenever a new document is opened. Separate instances can
+# therefore be used concurrently from different threads. A single instance,
+# however, is not reentrant and must only be used by one thread at a time.
 class RTFParser(object):
 
+	# By default, the onYield callback (if there is one) is called once every
+	# this many tokens.
+	DEFAULT_YIELD_EVERY = 1000
+
 	# Formatting attributes and their default values. Values with booleans
 	# should be set to either True (for on) or False (for off.) If an attribute
 	# doesn't exist in the current state, it means we must retrieve its value
-	# from the first state up the stack where it's defined.
-	__formattingAttributes = {
+	# from the first state up the stack where it's defined. This is only a
+	# template. Every document gets its own copy in reset(), since parsing the
+	# stylesheet can change the defaults.
+	__defaultFormattingAttributes = {
 
 		# TODO
 		'document': {},
@@ -33,8 +50,9 @@ class RTFParser(object):
 
 		# Character formatting properties
 		# An fColor or bColor of False indicates \c0, the "auto" color. If a
-		# different color is defined, this will be set to a dict with the
-		# following properties: 'red', 'green', 'blue', 'shade' and 'tint'.
+		# different color is defined, this will be set to an integer with the
+		# color's red, green, blue, shade and tint packed into it (see
+		# color.unpackColor.)
 		'character': {
 			'italic':        False,
 			'bold':          False,
@@ -82,12 +100,72 @@ class RTFParser(object):
 			'section':   {},
 			'table':     {},
 			'paragraph': {},
-			'character': {},
-			'private':   {}
+			'character': {}
 		}
 
 	###########################################################################
 
+	# Resets the private state channel to an empty state.
+	def __resetPrivateState(self):
+
+		self.__privateState = {}
+		self.__privateLocal = None
+		self.__privateStack = []
+
+	###########################################################################
+
+	# Rebuilds the private state channel from a list containing the values set
+	# at each level of curly braces, as recorded by __snapshotStates.
+	def __restorePrivateState(self, levels):
+
+		self.__resetPrivateState()
+
+		for i in range(len(levels)):
+
+			if i > 0:
+				self.__privateStack.append((self.__privateState, self.__privateLocal))
+				self.__privateLocal = None
+
+			for name, value in levels[i].items():
+				self._setPrivate(name, value)
+
+	###########################################################################
+
+	# Returns the value of a private state variable, including values set at
+	# lower levels of curly braces, or default if it isn't set.
+	def _getPrivate(self, name, default = None):
+
+		return self.__privateState.get(name, default)
+
+	###########################################################################
+
+	# Returns the value of a private state variable only if it was set at the
+	# current level of curly braces. Otherwise, returns default.
+	def _getLocalPrivate(self, name, default = None):
+
+		if self.__privateLocal is None:
+			return default
+
+		return self.__privateLocal.get(name, default)
+
+	###########################################################################
+
+	# Sets a private state variable at the current level of curly braces. It
+	# stays visible to nested groups and disappears once the current group
+	# closes.
+	def _setPrivate(self, name, value):
+
+		# Each level shares its parent's values until the first time it sets
+		# one of its own, so entering a group doesn't copy anything
+		if self.__privateLocal is None:
+			self.__privateLocal = {}
+			self.__privateState = dict(self.__privateState)
+
+		self.__privateLocal[name] = value
+		self.__privateState[name] = value
+
+	###########################################################################
+
 	# Content
 	def __init__(self, options):
 
@@ -109,26 +187,148 @@ class RTFParser(object):
 
 		self.__options = options
 
+		# How often (in tokens) we should call the onYield callback
+		if 'yieldEvery' in options and options['yieldEvery']:
+			self.__yieldEvery = int(options['yieldEvery'])
+		else:
+			self.__yieldEvery = self.DEFAULT_YIELD_EVERY
+
+		self._yieldCountdown = self.__yieldEvery
+
+		# Parsed font tables, color tables and stylesheets are shared between documents
+		# through this cache. Passing None for the headerCache option turns
+		# caching off.
+		if 'headerCache' in options:
+			self.__headerCache = options['headerCache']
+		else:
+			self.__headerCache = defaultHeaderCache
+
+		# Resource limits for untrusted documents (see limits.py.) Each parse
+		# (or resume) gets the full amount of everything.
+		self.__limits = resolveLimits(options.get('limits'))
+		self.__startLimits()
+
+		# Whether groups that can't change anything outside of themselves are
+		# skipped over instead of parsed (see _setSkipGroups)
+		self.__skipGroups = False
+
+	###########################################################################
+
+	# Resets the resources the current parse has left under its limits.
+	# Unlimited resources are tracked as None.
+	def __startLimits(self):
+
+		self.__maxDepth = self.__limits['maxDepth']
+		self.__textRemaining = self.__limits['maxTextLength']
+		self.__imageBytesRemaining = self.__limits['maxImageBytes']
+
+		if self.__limits['timeLimit'] is not None:
+			self.__deadline = time.monotonic() + self.__limits['timeLimit']
+		else:
+			self.__deadline = None
+
+	###########################################################################
+
+	# Returns the limits the parser was created with (see limits.py.)
+	@property
+	def limits(self):
+
+		return dict(self.__limits)
+
+	###########################################################################
+
+	# Counts length characters of text against the maxTextLength limit. Text
+	# that goes through _appendToCurrentParagraph is counted there, unless
+	# it's passed in as already counted; this is for text a parse state
+	# collects for itself, like a field's result.
+	def _countText(self, length):
+
+		if self.__textRemaining is not None:
+			self.__textRemaining -= length
+			if self.__textRemaining < 0:
+				raise TextLimitError(self.__limits['maxTextLength'])
+
+	###########################################################################
+
+	# Returns how many more bytes of image data the document can contain, or
+	# None if it's unlimited.
+	def _getImageBytesRemaining(self):
+
+		return self.__imageBytesRemaining
+
+	###########################################################################
+
+	# Counts count bytes of image data against the maxImageBytes limit.
+	def _countImageBytes(self, count):
+
+		if self.__imageBytesRemaining is not None:
+			self.__imageBytesRemaining -= count
+			if self.__imageBytesRemaining < 0:
+				raise ImageLimitError(self.__limits['maxImageBytes'])
+
+	###########################################################################
+
+	# Called when a field starts, to keep track of how deeply fields are
+	# nested inside of each other.
+	def _enterField(self):
+
+		depth = self._getPrivate('fieldDepth', 0) + 1
+
+		if self.__limits['maxFieldDepth'] is not None and depth > self.__limits['maxFieldDepth']:
+			raise FieldDepthLimitError(self.__limits['maxFieldDepth'])
+
+		self._setPrivate('fieldDepth', depth)
+
+	###########################################################################
+
+	# Returns the full state at a level of curly braces, given the values set
+	# at that level and the full state of the level below it (None if there
+	# isn't one.) Values set at that level come first, followed by the ones
+	# it inherits.
+	@staticmethod
+	def __mergeState(state, parentState):
+
+		# Copy each namespace, so that filling in inherited attributes below
+		# doesn't write them into the state itself
+		fullState = {namespace: attributes.copy() for namespace, attributes in state.items()}
+
+		if parentState:
+			for namespace in parentState.keys():
+				if namespace not in fullState:
+					fullState[namespace] = {}
+				for attribute in parentState[namespace].keys():
+					if attribute not in fullState[namespace]:
+						fullState[namespace][attribute] = parentState[namespace][attribute]
+
+		return fullState
+
 	###########################################################################
 
-	# Crawls up the state stack to fill in any attributes in the current state
-	# that are inherited from a previous state, then caches the result in
-	# self._fullStateCache.
+	# Fills in any attributes in the current state that are inherited from a
+	# previous state, then caches the result in self._fullStateCache. The full
+	# state of every level below the current one is kept in
+	# self.__fullStateStack, so this only depends on the number of attributes
+	# and not on how deeply nested the current group is.
 	def __cacheFullState(self):
 
-		state = self._curState.copy()
+		parentState = self.__fullStateStack[-1] if self.__fullStateStack else None
 
-		if len(self.__stateStack):
-			for i in reversed(range(len(self.__stateStack))):
-				for namespace in self.__stateStack[i].keys():
-					if (namespace not in state):
-						state[namespace] = {}
-					for attribute in self.__stateStack[i][namespace].keys():
-						if attribute not in state[namespace]:
-							state[namespace][attribute] = self.__stateStack[i][namespace][attribute]
+		self._fullStateCache = self.__mergeState(self._curState, parentState)
+		return self._fullStateCache
+
+	###########################################################################
 
-		self._fullStateCache = state
-		return state
+	# Recomputes the full state of every level of curly braces. Needed
+	# whenever a level other than the current one changes.
+	def __rebuildFullStateStack(self):
+
+		self.__fullStateStack = []
+
+		for state in self.__stateStack:
+			parentState = self.__fullStateStack[-1] if self.__fullStateStack else None
+			self.__fullStateStack.append(self.__mergeState(state, parentState))
+
+		self.__cacheFullState()
 
 	###########################################################################
 
@@ -148,7 +348,7 @@ class RTFParser(object):
 		if uglyStateFix and len(self.__stateStack):
 			for attribute in attributes['attributes'].keys():
 				self.__stateStack[0][attributeType][attribute] = attributes['attributes'][attribute]
-			self.__cacheFullState()
+			self.__rebuildFullStateStack()
 
 	###########################################################################
 
@@ -163,20 +363,78 @@ class RTFParser(object):
 
 	###########################################################################
 
+	# Sets or replaces a callback after the parser has been created. Passing
+	# None for the callback removes it.
+	def _setCallback(self, callbackName, callback):
+
+		if callback is None:
+			self.__options['callbacks'].pop(callbackName, None)
+		else:
+			self.__options['callbacks'][callbackName] = callback
+
+	###########################################################################
+
+	# When skip is True, groups in the main body of the document that don't
+	# contain a paragraph or page break are skipped over without parsing them
+	# (except for header groups, like the font table.) Formatting set inside
+	# of a group ends with it, so the state after each paragraph or page
+	# break, and the checkpoints recorded there, are the same as they'd be if
+	# everything was parsed. This is much faster when all the caller needs is
+	# those checkpoints (see parallel.findChunks.)
+	def _setSkipGroups(self, skip):
+
+		self.__skipGroups = skip
+
+	def _getSkipGroups(self):
+
+		return self.__skipGroups
+
+	###########################################################################
+
+	# Called by the tokenizer every time self.__yieldEvery tokens have been
+	# read. This gives long running parses a chance to hand control back to
+	# the client (for example, to let an event loop run or to check whether
+	# the parse should be cancelled.) The onYield callback is free to raise an
+	# exception, which will abort the parse. This is also where we check
+	# whether the parse has run out of time.
+	def _yield(self):
+
+		self._yieldCountdown = self.__yieldEvery
+
+		if self.__deadline is not None and time.monotonic() > self.__deadline:
+			raise TimeLimitError(self.__limits['timeLimit'])
+
+		callback = self._getCallback('onYield')
+		if callback:
+			callback(self)
+
+	###########################################################################
+
 	# Pushes the current state onto the state stack and sets up a new clean
 	# state.
 	def _pushStateStack(self):
 
 		self.__stateStack.append(self._curState)
+		if self.__maxDepth is not None and len(self.__stateStack) > self.__maxDepth:
+			raise NestingLimitError(self.__maxDepth)
+
 		self._curState = self.__createState()
 
+		# The new level doesn't set anything yet, so its full state is the
+		# same as the one it's nested in
+		self.__fullStateStack.append(self._fullStateCache)
+
+		self.__privateStack.append((self.__privateState, self.__privateLocal))
+		self.__privateLocal = None
+
 	###########################################################################
 
 	# Pops the last state from the stack and restores self._curState.
 	def _popStateStack(self):
 
 		self._curState = self.__stateStack.pop()
-		self.__cacheFullState() # Update the full state cache
+		self.__privateState, self.__privateLocal = self.__privateStack.pop()
+		self._fullStateCache = self.__fullStateStack.pop()
 		return self._curState
 
 	###########################################################################
@@ -199,8 +457,13 @@ class RTFParser(object):
 
 	###########################################################################
 
-	# Appends the specified string to the current paragraph.
-	def _appendToCurrentParagraph(self, string):
+	# Appends the specified string to the current paragraph. If counted is
+	# True, it's already been counted against the maxTextLength limit (see
+	# _countText.)
+	def _appendToCurrentParagraph(self, string, counted = False):
+
+		if not counted:
+			self._countText(len(string))
 
 		callback = self._getCallback('onAppendParagraph')
 		if callback:
@@ -220,8 +483,11 @@ class RTFParser(object):
 	# Reset the current state's formatting attributes to their default values.
 	def _resetStateFormattingAttributes(self, doCallback = True):
 
-		formerStateAttributes = self._fullState
-		formerStateAttributes.pop('private', None) # Only return publicly accessible attributes
+		# Copying the state is expensive, so only do it if someone's going to
+		# see it
+		callback = self._getCallback('onStateChange') if doCallback else None
+		if callback:
+			formerStateAttributes = self._fullState
 
 		for attributeType in self.__formattingAttributes.keys():
 			for attribute in self.__formattingAttributes[attributeType].keys():
@@ -231,47 +497,46 @@ class RTFParser(object):
 		self.__cacheFullState()
 
 		# Pass in both the previous and current state attributes
-		newStateAttributes = self._fullState
-		newStateAttributes.pop('private', None)
-
-		if doCallback:
-			callback = self._getCallback('onStateChange')
-			if callback:
-				callback(self, formerStateAttributes, newStateAttributes)
+		if callback:
+			callback(self, formerStateAttributes, self._fullState)
 
 	###########################################################################
 
-	# Sets either a public attribute or a private state value. Values set in a
-	# publicly accessible namespace trigger the onStateChange event. Boolean
+	# Sets a public attribute and triggers the onStateChange event. Boolean
 	# attribute values like italic, bold, etc. should be set to True or False.
-	# Not doing so will result in wonky behavior.
+	# Not doing so will result in wonky behavior. Private state values belong
+	# in the private state channel (see _setPrivate), which is much cheaper,
+	# but setting them here with the 'private' namespace still works.
 	def _setStateValue(self, namespace, attribute, value):
 
-		oldStateAttributes = self._fullState
-		oldStateAttributes.pop('private', None)
+		if 'private' == namespace:
+			self._setPrivate(attribute, value)
+			return
+
+		# Copying the state is expensive, so only do it if someone's going to
+		# see it
+		callback = self._getCallback('onStateChange') if namespace in self.__formattingAttributes else None
+		if callback:
+			oldStateAttributes = self._fullState
 
 		self._curState[namespace][attribute] = value
 
 		# Update the full state cache now that the attribute has changed
 		self.__cacheFullState()
 
-		newStateAttributes = self._fullState
-		newStateAttributes.pop('private', None)
-
-		# If we're not setting a private state variable, call the onStateChange
-		# callback
-		if namespace in self.__formattingAttributes.keys():
-			callback = self._getCallback('onStateChange')
-			if callback:
-				callback(self, oldStateAttributes, newStateAttributes)
+		if callback:
+			callback(self, oldStateAttributes, self._fullState)
 
 	###########################################################################
 
 	# Reset to a default state where all the formatting attributes are turned off.
 	def _initState(self):
 
+		self.__stateStack = []
+		self.__fullStateStack = []
 		self._curState = self.__createState()
 		self._fullStateCache = self._curState.copy()
+		self.__resetPrivateState()
 		self._resetStateFormattingAttributes(False)
 
 	###########################################################################
@@ -307,6 +572,71 @@ class RTFParser(object):
 
 	###########################################################################
 
+	# Returns the color table as a tuple.
+	def _getColorTable(self):
+
+		return tuple(self.__colortable)
+
+	###########################################################################
+
+	# Returns the cache used to share parsed font tables, color tables and
+	# stylesheets between documents, or None if caching is turned off.
+	def _getHeaderCache(self):
+
+		return self.__headerCache
+
+	###########################################################################
+
+	# Inserts a font into the font table.
+	def _insertFont(self, fontIndex, name, charset, codepage):
+
+		self.__fonttable[int(fontIndex)] = (name, charset, codepage)
+
+	###########################################################################
+
+	# Returns the font table as a tuple of (index, font) pairs.
+	def _getFontTable(self):
+
+		return tuple(self.__fonttable.items())
+
+	###########################################################################
+
+	# Returns the font with the specified index as a tuple of the form (name,
+	# charset, codepage) if it exists and None if it doesn't.
+	def _getFont(self, fontIndex):
+
+		return self.__fonttable.get(int(fontIndex))
+
+	###########################################################################
+
+	# Sets the font used wherever no \fN is in effect.
+	def _setDefaultFont(self, fontIndex):
+
+		self.__defaultFont = int(fontIndex)
+
+	###########################################################################
+
+	# Sets the document's code page.
+	def _setCodepage(self, codepage):
+
+		self.__codepage = codepage
+
+	###########################################################################
+
+	# Returns the code page \'xx bytes should be decoded with at the current
+	# position: the current font's if it has one, and the document's
+	# otherwise.
+	def _getCodepage(self):
+
+		font = self.__fonttable.get(self.__privateState.get('font', self.__defaultFont))
+
+		if font is not None and font[2] is not None:
+			return font[2]
+
+		return self.__codepage
+
+	###########################################################################
+
 	# Returns the color from the color table at the specified index if it exists
 	# and None if it doesn't.
 	def _getColor(self, index):
@@ -318,17 +648,71 @@ class RTFParser(object):
 
 	###########################################################################
 
+	# Clears everything parsed out of the document's header (stylesheet, color
+	# table, etc.) Done before every parse, so that whatever was left over
+	# from an earlier parse or resume doesn't leak into it.
+	def __resetHeader(self):
+
+		# This document's default formatting attributes. The defaults are one
+		# level deep and only contain immutable values, so a shallow copy of
+		# each namespace is enough (and a lot cheaper than copy.deepcopy when
+		# we're parsing lots of small documents.)
+		self.__formattingAttributes = {
+			attributeType: dict(attributes)
+			for attributeType, attributes in self.__defaultFormattingAttributes.items()
+		}
+
+		# Styles parsed out of the RTF's stylesheet
+		self.__stylesheet = {
+			'section':   {},
+			'table':     {},
+			'paragraph': {},
+			'character': {}
+		}
+
+		# Defined in \colortbl
+		self.__colortable = []
+
+		# Defined in \fonttbl. Maps each font's index to a tuple of the form
+		# (name, charset, codepage), where codepage is None if the font uses
+		# the document's code page.
+		self.__fonttable = {}
+
+		# The font set by \deffN, used wherever no \fN is in effect
+		self.__defaultFont = None
+
+		# Code page used to decode \'xx bytes, as set by \ansicpgN
+		self.__codepage = DEFAULT_CODEPAGE
+
+	###########################################################################
+
 	# Resets the parser to an initialized state so we can parse another document.
 	def reset(self):
 
 		# A string containing the content of an RTF file
 		self._content = False
 
+		# The bytes self._content was decoded from, if it was loaded from a
+		# file or a bytes-like object (as a memoryview)
+		self.__rawContent = None
+
 		# Our current index into self._content
 		self._curPos = 0
 
-		# Formatting states at various levels of curly braces
+		# Parsing stops when we reach this index into self._content
+		self._endPos = 0
+
+		# Formatting states at various levels of curly braces, and the full
+		# state (see _fullStateCache) at each of them
 		self.__stateStack = []
+		self.__fullStateStack = []
+
+		# Internal flags used by the parse states (whether we're inside a
+		# field, a picture, the stylesheet, etc.) are kept apart from the
+		# formatting state, in a channel that follows the same levels of curly
+		# braces but is never copied or reported to the client. Reads and
+		# writes are O(1). See _getPrivate and _setPrivate.
+		self.__resetPrivateState()
 
 		# Values that were set in the current formatting state. To see the full
 		# state, view the contents of self._fullStateCache (make sure to call 
@@ -340,6 +724,7 @@ class RTFParser(object):
 		# whenever the state actually changes, then cache the result as long as
 		# the state stays the same so we can refer back to it frequently without
 		# slowing things down. I discovered the need for this after profiling.
+		# Cached full states are never modified, only replaced.
 		self._fullStateCache = False
 
 		# Stores the current token during parsing
@@ -348,43 +733,127 @@ class RTFParser(object):
 		# Records the previously retrieved token during parsing
 		self._prevToken = False
 
-		# Styles parsed out of the RTF's stylesheet
-		self.__stylesheet = {
-			'section':   {},
-			'table':     {},
-			'paragraph': {},
-			'character': {}
-		}
+		# Stack of the parse states we're in (see _enterState), each paired
+		# with the function to call when it's finished (or None)
+		self.__parseStates = []
 
-		# Defined in \colortbl
-		self.__colortable = []
+		# Everything parsed out of the document's header
+		self.__resetHeader()
 
 	###########################################################################
 
-	# Parse an RTF file.
+	# Parse an RTF file. The file is read as raw bytes (see openString.)
 	def openFile(self, filename):
 
-		self.reset()
-		rtfFile = open(filename, 'r')
-		self._content = rtfFile.read()
+		rtfFile = open(filename, 'rb')
+		rtfContent = rtfFile.read()
 		rtfFile.close()
 
+		self.openString(rtfContent)
+
 	###########################################################################
 
-	# Parse an RTF from an already loaded string.
+	# Parse an RTF from an already loaded string. rtfContent can also be a
+	# bytes-like object, in which case each byte is mapped to the character
+	# with the same value (Latin-1) so that offsets into self._content are
+	# also offsets into the original bytes. That way, \binN data can be handed
+	# out as slices of the original bytes without copying them. RTF is a 7-bit
+	# format, so this doesn't change the meaning of any control words, and
+	# literal text with bytes above 127 in it is decoded as it's parsed (see
+	# _decodeLiteralText.)
 	def openString(self, rtfContent):
 
 		self.reset()
-		self._content = rtfContent
+
+		if isinstance(rtfContent, (bytes, bytearray, memoryview)):
+			self.__rawContent = memoryview(rtfContent)
+			self._content = str(rtfContent, 'latin-1')
+		else:
+			self._content = rtfContent
+
+		self._endPos = len(self._content)
+
+	###########################################################################
+
+	# Returns the document as it was passed to openString (or read by
+	# openFile): the original bytes as a memoryview if it was loaded from
+	# bytes, and the string otherwise.
+	def _getSource(self):
+
+		if self.__rawContent is not None:
+			return self.__rawContent
+
+		return self._content
+
+	###########################################################################
+
+	# Returns the binary data between the given offsets into the document as
+	# a memoryview. If the document was loaded from bytes, this is a slice of
+	# them and nothing is copied.
+	def _getBinary(self, start, end):
+
+		if self.__rawContent is not None:
+			return self.__rawContent[start:end]
+
+		return memoryview(self._content[start:end].encode('latin-1', 'replace'))
+
+	###########################################################################
+
+	# Decodes literal text taken from a document that was loaded from bytes,
+	# in which any characters above 127 are still raw bytes (see openString.)
+	# Writers that don't escape them as \'xx usually write UTF-8, and text in
+	# a legacy code page is almost never valid UTF-8, so it's decoded as UTF-8
+	# if it can be, and with the current code page otherwise. Text from a
+	# document that was loaded as a string has already been decoded and is
+	# returned as it is.
+	def _decodeLiteralText(self, text):
+
+		if self.__rawContent is None or text.isascii():
+			return text
+
+		data = text.encode('latin-1')
+
+		try:
+			return data.decode('utf-8')
+		except UnicodeDecodeError:
+			return getDecoder(self._getCodepage())('replace').decode(data, True)
+
+	###########################################################################
+
+	# Enter the default parser state and begin parsing the document. If
+	# endOffset is set, parsing stops as soon as we reach that index into the
+	# document.
+	def parse(self, endOffset = None):
+
+		self.__startParse(endOffset)
+		self.__run()
+
+	###########################################################################
+
+	# Generator version of parse() that hands control back to the caller
+	# after every tokens tokens, yielding our current index into the
+	# document. Parsing picks up where it left off with the next iteration,
+	# so a parse can be spread out over time (between the iterations of an
+	# event loop, for example) without threads.
+	def parseSteps(self, tokens = DEFAULT_YIELD_EVERY, endOffset = None):
+
+		self.__startParse(endOffset)
+
+		while not self.__run(tokens):
+			yield self._curPos
 
 	###########################################################################
 
-	# Enter the default parser state and begin parsing the document.
-	def parse(self):
+	# Sets everything up for parsing the document from the beginning.
+	def __startParse(self, endOffset):
 
 		# Initialize markers representing our current place in the document
 		self._curToken = False
 		self._prevToken = False
+		self._curPos = 0
+		self.__setEndOffset(endOffset)
+		self.__resetHeader()
+		self.__startLimits()
 
 		# Start with a default state where all the formatting attributes are
 		# turned off.
@@ -394,8 +863,209 @@ class RTFParser(object):
 		self._openParagraph()
 
 		# Begin parsing
+		self.__startStates()
+
+	###########################################################################
+
+	# Resumes parsing from a checkpoint previously returned by _getCheckpoint,
+	# using the header (stylesheet, color table and default attributes)
+	# returned by _getHeader at the end of an earlier parse of the same
+	# document. A new paragraph is opened before parsing continues. If
+	# endOffset is set, parsing stops as soon as we reach that index into the
+	# document.
+	def resume(self, header, checkpoint, endOffset = None):
+
+		self.__formattingAttributes = copy.deepcopy(header['formattingAttributes'])
+		self.__stylesheet = copy.deepcopy(header['stylesheet'])
+		self.__colortable = copy.deepcopy(header['colortable'])
+		self.__fonttable = {int(fontIndex): tuple(font) for fontIndex, font in header['fonttable'].items()}
+		self.__defaultFont = header['defaultFont']
+		self.__codepage = header['codepage']
+
+		states = copy.deepcopy(checkpoint['states'])
+		privateLevels = [state.pop('private', {}) for state in states]
+		self._curState = states.pop()
+		self.__stateStack = states
+		self.__restorePrivateState(privateLevels)
+		self.__rebuildFullStateStack()
+
+		self._curToken = False
+		self._prevToken = [TokenType(checkpoint['prevToken'][0]), checkpoint['prevToken'][1]]
+		self._curPos = checkpoint['offset']
+		self.__setEndOffset(endOffset)
+		self.__startLimits()
+
+		self._openParagraph()
+
+		self.__startStates()
+		self.__run()
+
+	###########################################################################
+
+	# Starts off the state stack with the main body of the document and reads
+	# the first token.
+	def __startStates(self):
+
 		mainState = MainState(self)
-		mainState.parse()
+		self.__parseStates = [(mainState, None)]
+
+		if self._content:
+			self._curToken = mainState._getNextToken()
+		else:
+			self.__parseStates = []
+
+	###########################################################################
+
+	# Enters a new parse state, which handles every token from the next one
+	# on until it's finished. Then, onExit (if it isn't None) is called and
+	# the state we were in before takes over again. Parse states call this
+	# from their handlers instead of running the new state themselves, so the
+	# call stack doesn't grow with the structure of the document.
+	def _enterState(self, state, onExit = None):
+
+		self.__parseStates.append((state, onExit))
+
+	###########################################################################
+
+	# The parser's main loop. Each token is handed to the appropriate handler
+	# of the state at the top of the state stack, and when a handler returns
+	# False, its state is finished and removed from the stack. Runs of
+	# ordinary characters come as a single token and are handled all at once
+	# (see ParseState._parseCharacters.) If maxTokens is set, we stop after
+	# that many tokens, and the next call picks up where we left off. Returns
+	# True once the whole document (or everything up to endOffset) has been
+	# parsed.
+	def __run(self, maxTokens = None):
+
+		states = self.__parseStates
+
+		while states:
+
+			if maxTokens is not None:
+				if maxTokens <= 0:
+					return False
+				maxTokens -= 1
+
+			tokenType = self._curToken[0]
+
+			if TokenType.EOF == tokenType:
+				break
+
+			state = states[-1][0]
+			depth = len(states)
+
+			if TokenType.CHARACTER == tokenType:
+				finished = not state._parseCharacters(self._curToken[1])
+
+			elif TokenType.OPEN_BRACE == tokenType:
+				finished = not state._parseOpenBrace()
+
+			# A close brace without an open brace to match (some writers leave
+			# one after the end of the document) is ignored
+			elif TokenType.CLOSE_BRACE == tokenType:
+				finished = bool(self.__stateStack) and not state._parseCloseBrace()
+
+			# We're executing a control word. Execute this before appending
+			# tokens to any special destination or group that might contain
+			# control words.
+			elif TokenType.CONTROL_WORDORSYM == tokenType:
+				word, param = state._splitControlWord(self._curToken)
+				finished = not state._parseControl(word, param)
+
+			# Raw binary data (see \binN)
+			else:
+				finished = not state._parseBinary(self._curToken[1])
+
+			if finished:
+				unused, onExit = states.pop()
+				if onExit:
+					onExit()
+				if not states:
+					break
+
+			# A state that was just entered sees the token that came before
+			# the one that entered it as the previous token, since that's
+			# usually what tells it what kind of group it's in
+			if len(states) <= depth:
+				self._prevToken = self._curToken
+
+			self._curToken = state._getNextToken()
+
+		self.__parseStates = []
+		return True
+
+	###########################################################################
+
+	# Sets the index into the document where parsing should stop. None means
+	# the end of the document.
+	def __setEndOffset(self, endOffset):
+
+		if self._content:
+			if endOffset is None:
+				self._endPos = len(self._content)
+			else:
+				self._endPos = min(endOffset, len(self._content))
+
+	###########################################################################
+
+	# Returns a compact snapshot of the parser's position and state stack,
+	# from which parsing can later be resumed (see resume.) This is only
+	# meaningful when called from the onCheckpoint callback.
+	def _getCheckpoint(self):
+
+		return {
+			'offset':    self._curPos,
+			'prevToken': [self._curToken[0].value, self._curToken[1]],
+			'states':    copy.deepcopy(self.__snapshotStates())
+		}
+
+	###########################################################################
+
+	# Returns the current state stack (including the current state) in the
+	# form recorded by checkpoints, with the private state values set at each
+	# level stored under that level's 'private' key. Only the top level dicts
+	# are new, so don't change anything!
+	def _getStates(self):
+
+		return self.__snapshotStates()
+
+	###########################################################################
+
+	def __snapshotStates(self):
+
+		privateLevels = [local for state, local in self.__privateStack] + [self.__privateLocal]
+
+		return [
+			dict(state, private = dict(local) if local else {})
+			for state, local in zip(self.__stateStack + [self._curState], privateLevels)
+		]
+
+	###########################################################################
+
+	# Returns a copy of everything parsed out of the document's header that's
+	# needed to resume parsing from a checkpoint.
+	def _getHeader(self):
+
+		return {
+			'formattingAttributes': copy.deepcopy(self.__formattingAttributes),
+			'stylesheet':           copy.deepcopy(self.__stylesheet),
+			'colortable':           copy.deepcopy(self.__colortable),
+			'fonttable':            dict(self.__fonttable),
+			'defaultFont':          self.__defaultFont,
+			'codepage':             self.__codepage
+		}
+
+	###########################################################################
+
+	# Called whenever we reach a point in the main body of the document (as
+	# opposed to inside a field, image, etc.) from which parsing could later
+	# be resumed. checkpointType is either 'paragraph' (a new paragraph was
+	# just opened) or 'page' (a page break was just inserted.)
+	def _checkpoint(self, checkpointType):
+
+		callback = self._getCallback('onCheckpoint')
+		if callback:
+			callback(self, checkpointType)
 
 	###########################################################################
 
@@ -1,32 +1,74 @@
 # -*- coding: utf-8 -*-
 
 from ..tokentype import TokenType
+from ..color import packColor, DEFAULT_TINT, DEFAULT_SHADE
+from ..headercache import contentKey
 from .state import ParseState
 
-DEFAULT_TINT  = 255
-DEFAULT_SHADE = 255
-
 class ColorTableState(ParseState):
 
 	def __init__(self, parser):
 
 		super().__init__(parser)
-		self._parser._setStateValue('private', 'colorTable', True)
+		self._parser._setPrivate('colorTable', True)
+
+		# Every color we insert into the color table, in order. This is what
+		# gets stored in the header cache (see replay.)
+		self.__colors = []
+
+		self.__resetCurColor()
+
+	###########################################################################
+
+	# The colors parsed out of the color table.
+	@property
+	def result(self):
+
+		return tuple(self.__colors)
+
+	###########################################################################
+
+	# Returns the key under which the result of parsing a color table is
+	# stored in the header cache.
+	@staticmethod
+	def cacheKey(parser, groupContent):
 
-		self.__curColor = {'tint': DEFAULT_TINT, 'shade': DEFAULT_SHADE}
+		return ('colortbl', contentKey(groupContent))
+
+	###########################################################################
+
+	# Inserts the colors from a previously parsed color table, exactly as if
+	# we'd just parsed it.
+	@staticmethod
+	def replay(parser, result):
+
+		for color in result:
+			parser._insertColor(color)
+
+	###########################################################################
+
+	# Sets up the components of the next color to be parsed.
+	def __resetCurColor(self):
+
+		self.__curColor = {'red': 0, 'green': 0, 'blue': 0, 'tint': DEFAULT_TINT, 'shade': DEFAULT_SHADE}
 		self.__colorParsed = False # True every time we parse a new color
 
 	###########################################################################
 
-	# Inserts the current color into the parser's color table.
+	# Inserts the current color into the parser's color table. Colors are
+	# packed into a single integer (see color.py) once, here, so that
+	# everything downstream can pass them around and compare them cheaply.
 	def __insertCurColor(self):
 
 		if self.__colorParsed:
-			self._parser._insertColor(self.__curColor)
-			self.__curColor = {}
-			self.__colorParsed = False
+			color = packColor(**self.__curColor)
 		else:
-			self._parser._insertColor(False)
+			color = False
+
+		self._parser._insertColor(color)
+		self.__colors.append(color)
+
+		self.__resetCurColor()
 
 	###########################################################################
 
@@ -37,7 +79,7 @@ class ColorTableState(ParseState):
 		# We shouldn't have nested braces inside the color table, but making it
 		# possible to skip over them if they're encountered will make the parser
 		# more robust in the case of a malformatted document.
-		if 'colorTable' not in self._parser._fullState['private']:
+		if not self._parser._getPrivate('colorTable'):
 			return False
 		else:
 			return True
@@ -54,7 +96,7 @@ class ColorTableState(ParseState):
 		else:
 			param = None
 
-		if word in validWords:
+		if word in validWords and param is not None:
 			self.__colorParsed = True
 			self.__curColor[word] = param
 
@@ -8,11 +8,13 @@ class FieldState(ParseState):
 	def __init__(self, parser):
 
 		super().__init__(parser)
-		self._parser._setStateValue('private', 'inField', True)
+		self._parser._setPrivate('inField', True)
+		self._parser._enterField()
 
-		# Initialize the two components of a field
-		self.__fldRslt = ''
-		self.__fldInst = ''
+		# Initialize the two components of a field. Each is collected as a list
+		# of fragments and joined once the field ends.
+		self.__fldRslt = []
+		self.__fldInst = []
 
 	###########################################################################
 
@@ -22,12 +24,13 @@ class FieldState(ParseState):
 		# We let the callback handle it
 		callback = self._parser._getCallback('onField')
 		if callback:
-			callback(self._parser, self.__fldInst, self.__fldRslt)
+			callback(self._parser, ''.join(self.__fldInst), ''.join(self.__fldRslt))
 
 		# There's no callback that knows how to handle it, so we'll just do things
 		# the dumb way by appending the \fldrslt value to the current paragraph.
+		# It was counted against the maxTextLength limit as it was collected.
 		else:
-			self._parser._appendToCurrentParagraph(self.__fldRslt)
+			self._parser._appendToCurrentParagraph(''.join(self.__fldRslt), True)
 
 	###########################################################################
 
@@ -38,7 +41,7 @@ class FieldState(ParseState):
 
 		# Once we've finished with the field group, we can stop parsing in this
 		# state.
-		if 'inField' not in self._parser._fullState['private']:
+		if not self._parser._getPrivate('inField'):
 			self.__append()
 			return False
 		else:
@@ -51,20 +54,34 @@ class FieldState(ParseState):
 		# If we're parsing a \fldinst value and encounter another control word
 		# with the \* prefix, we know we're done parsing the parts of \fldinst
 		# we care about (this will change as I handle more of the RTF spec.)
-		if '\\*' == word and 'inFieldinst' in self._parser._curState['private'] and self._parser._curState['private']['inFieldinst']:
-			self._parser._setStateValue('private', 'inFieldinst', False)
+		if '\\*' == word and self._parser._getLocalPrivate('inFieldinst'):
+			self._parser._setPrivate('inFieldinst', False)
 			return True
 
 		# Most recent calculated result of field. In practice, this is also
 		# the text that would be parsed into the paragraph by an RTF reader
 		# that doesn't understand fields.
 		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\fldrslt' == word:
-			self._parser._setStateValue('private', 'inFieldrslt', True)
+			self._parser._setPrivate('inFieldrslt', True)
 			return True
 
 		# Field instruction
 		elif '\\*' == self._parser._prevToken[1] and '\\fldinst' == word:
-			self._parser._setStateValue('private', 'inFieldinst', True)
+			self._parser._setPrivate('inFieldinst', True)
+			return True
+
+		# The whole field ends up in the paragraph it started in, so a
+		# paragraph or page break inside of it would only leave empty
+		# paragraphs behind. It would also throw off the paragraph and page
+		# numbering used by RTFIndex, which only counts breaks in the main
+		# body. (\pagebb doesn't insert a break, so it's left alone.)
+		elif '\\par' == word or '\\page' == word:
+			return True
+
+		# A field nested inside of this one. Its instruction and result end up
+		# in this field's, but it still counts against the maxFieldDepth limit.
+		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\field' == word:
+			self._parser._enterField()
 			return True
 
 		else:
@@ -74,11 +91,22 @@ class FieldState(ParseState):
 
 	def _parseCharacter(self, token):
 
-		if 'inFieldrslt' in self._parser._fullState['private'] and self._parser._fullState['private']['inFieldrslt']:
-			self.__fldRslt += token
+		return self._parseCharacters(token)
+
+	###########################################################################
+
+	# The field's result is parsed again from a string later on (see
+	# RTFDOM.insertFldrslt), so literal text has to be decoded here.
+	def _parseCharacters(self, text):
+
+		text = self._parser._decodeLiteralText(text)
+
+		if self._parser._getPrivate('inFieldrslt'):
+			self._parser._countText(len(text))
+			self.__fldRslt.append(text)
 
-		elif 'inFieldinst' in self._parser._fullState['private'] and self._parser._fullState['private']['inFieldinst']:
-			self.__fldInst += token
+		elif self._parser._getPrivate('inFieldinst'):
+			self.__fldInst.append(text)
 
 		return True
 
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+from ..tokentype import TokenType
+from ..codepage import charsetCodepage
+from ..headercache import contentKey
+from .state import ParseState
+from .groupskip import GroupSkipState
+
+class FontTableState(ParseState):
+
+	def __init__(self, parser):
+
+		super().__init__(parser)
+		self._parser._setPrivate('fontTable', True)
+
+		# Every font we insert into the font table, in order, as (index, name,
+		# charset, codepage). This is what gets stored in the header cache (see
+		# replay.)
+		self.__fonts = []
+
+		self.__resetCurFont()
+
+	###########################################################################
+
+	# The fonts parsed out of the font table.
+	@property
+	def result(self):
+
+		return tuple(self.__fonts)
+
+	###########################################################################
+
+	# Returns the key under which the result of parsing a font table is
+	# stored in the header cache. Font names written as \'xx bytes are
+	# decoded using the document's code page, so that's part of the key too.
+	@staticmethod
+	def cacheKey(parser, groupContent):
+
+		return ('fonttbl', contentKey(groupContent), parser._getCodepage())
+
+	###########################################################################
+
+	# Inserts the fonts from a previously parsed font table, exactly as if
+	# we'd just parsed it.
+	@staticmethod
+	def replay(parser, result):
+
+		for font in result:
+			parser._insertFont(*font)
+
+	###########################################################################
+
+	def __resetCurFont(self):
+
+		self.__curFont = None
+		self.__charset = 0
+		self.__codepage = None
+		self.__name = []
+
+	###########################################################################
+
+	# Returns the code page of the font we're currently parsing, or None if it
+	# uses the document's code page.
+	def __curCodepage(self):
+
+		if self.__codepage is not None:
+			return self.__codepage
+
+		return charsetCodepage(self.__charset)
+
+	###########################################################################
+
+	# Inserts the font we've been parsing (if any) into the font table.
+	def __insertCurFont(self):
+
+		if self.__curFont is not None:
+			font = (self.__curFont, ''.join(self.__name).strip(), self.__charset, self.__curCodepage())
+			self._parser._insertFont(*font)
+			self.__fonts.append(font)
+
+		self.__resetCurFont()
+
+	###########################################################################
+
+	# Fonts are usually defined in groups of their own, but some writers list
+	# them directly inside \fonttbl, separated only by semicolons.
+	def _parseCloseBrace(self):
+
+		self.__insertCurFont()
+		super()._parseCloseBrace(False)
+
+		# Once we've left the font table group, we can stop parsing in this
+		# state.
+		if not self._parser._getPrivate('fontTable'):
+			return False
+		else:
+			return True
+
+	###########################################################################
+
+	def _parseControl(self, word, param):
+
+		# Destinations inside a font definition, like \*\panose and \*\falt
+		if '\\*' == word and TokenType.OPEN_BRACE == self._parser._prevToken[0]:
+			self._parser._enterState(GroupSkipState(self._parser))
+
+		# Start of a new font definition
+		elif '\\f' == word and isinstance(param, str) and param.isdigit():
+			self.__insertCurFont()
+			self.__curFont = int(param)
+
+		elif '\\fcharset' == word and isinstance(param, str) and param.isdigit():
+			self.__charset = int(param)
+
+		elif '\\cpg' == word and isinstance(param, str) and param.isdigit():
+			self.__codepage = int(param)
+
+		# Font names in other scripts are written as \'xx bytes in the font's
+		# own code page
+		elif "\\'" == word and param and self.__curFont is not None:
+			try:
+				codepage = self.__curCodepage()
+				if codepage is None:
+					codepage = self._parser._getCodepage()
+				self.__name.append(self._decodeHexRun(int(param, 16), codepage))
+			except ValueError:
+				pass
+
+		# Everything else (font families, pitch, etc.) is ignored for now
+		return True
+
+	###########################################################################
+
+	# We're parsing a font's name
+	def _parseCharacter(self, token):
+
+		if ';' == token:
+			self.__insertCurFont()
+
+		elif self.__curFont is not None and '\n' != token and '\r' != token:
+			self.__name.append(token)
+
+		return True
@@ -8,7 +8,7 @@ class GroupSkipState(ParseState):
 	def __init__(self, parser):
 
 		super().__init__(parser)
-		self._parser._setStateValue('private', 'groupSkip', True)
+		self._parser._setPrivate('groupSkip', True)
 
 	###########################################################################
 
@@ -19,7 +19,7 @@ class GroupSkipState(ParseState):
 
 		# Once we've finished skipping over the group, we can stop parsing in
 		# this state.
-		if 'groupSkip' not in self._parser._fullState['private']:
+		if not self._parser._getPrivate('groupSkip'):
 			return False
 		else:
 			return True
@@ -38,3 +38,10 @@ class GroupSkipState(ParseState):
 
 		return True
 
+	###########################################################################
+
+	# Do nothing (all at once)...
+	def _parseCharacters(self, text):
+
+		return True
+
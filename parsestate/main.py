@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import re
+
+from ..codepage import CHARACTER_SET_CODEPAGES
 from ..tokentype import TokenType
 
 from .state import ParseState
@@ -8,6 +11,13 @@ from .pict import PictState
 from .field import FieldState
 from .stylesheet import StylesheetState
 from .colortable import ColorTableState
+from .fonttable import FontTableState
+
+# Groups that are never skipped over (see RTFParser._setSkipGroups): header
+# groups, whose effects last past their end, and groups that contain a
+# paragraph or page break
+HEADER_GROUP_WORD = re.compile(r'\s*\\(?:fonttbl|colortbl|stylesheet)(?![a-zA-Z])')
+BREAK_WORD = re.compile(r'\\(?:par|page)(?![a-zA-Z])')
 
 class MainState(ParseState):
 
@@ -42,52 +52,149 @@ class MainState(ParseState):
 			'\*' == self._parser._prevToken[1] and word == '\\listtable'
 		) or (
 			'\*' == self._parser._prevToken[1] and word == '\\listoverridetable'
+		) or (
+			# Data of an embedded OLE object. We don't do anything with it, but
+			# the \result destination that follows it is still parsed as
+			# ordinary text. If the data's stored in binary form, skipping it
+			# costs nothing (see \binN.)
+			'\*' == self._parser._prevToken[1] and word == '\\objdata'
 		) or (
 			# Skip over these sections. We're not going to use them (at least
 			# for now.)
 			TokenType.OPEN_BRACE == self._parser._prevToken[0] and (
-				word == '\\fonttbl' or
 				word == '\\stylerestrictions' or # Does this even exist...?
 				word == '\\info' # TODO: parse this into document attributes
 			)
 		):
-			state = GroupSkipState(self._parser)
-			state.parse()
+			self._parser._enterState(GroupSkipState(self._parser))
+			return True
+
+		# We're parsing the font table
+		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\fonttbl' == word:
+			self.__parseHeaderGroup(FontTableState)
+			return True
+
+		# Document's character set
+		elif word in CHARACTER_SET_CODEPAGES:
+			self._parser._setCodepage(CHARACTER_SET_CODEPAGES[word])
+			return True
+
+		# Document's code page, which overrides the character set
+		elif '\\ansicpg' == word and isinstance(param, str) and param.isdigit():
+			self._parser._setCodepage(int(param))
+			return True
+
+		# Default font
+		elif '\\deff' == word and isinstance(param, str) and param.isdigit():
+			self._parser._setDefaultFont(param)
 			return True
 
 		# We're parsing the color table
 		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\colortbl' == word:
-			state = ColorTableState(self._parser)
-			state.parse()
+			self.__parseHeaderGroup(ColorTableState)
 			return True
 
 		# We're parsing the stylesheet
 		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\stylesheet' == word:
-			state = StylesheetState(self._parser)
-			state.parse()
+			self.__parseHeaderGroup(StylesheetState)
 			return True
 
 		# Beginning of a field
 		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\field' == word:
-			state = FieldState(self._parser)
-			state.parse()
+			self._parser._enterState(FieldState(self._parser))
 			return True
 
 		# We've entered an embedded image.
 		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\pict' == word:
-			state = PictState(self._parser)
-			state.parse()
+			self._parser._enterState(PictState(self._parser))
 			return True
 
+		# Paragraph and page boundaries in the main body of the document are
+		# points from which parsing can later be resumed
+		elif '\\par' == word or '\\page' == word:
+			retVal = super()._parseControl(word, param)
+			self._parser._checkpoint('paragraph' if '\\par' == word else 'page')
+			return retVal
+
 		else:
 			return super()._parseControl(word, param)
 
 	###########################################################################
 
+	# Parses a header group (the font table, color table or stylesheet) using
+	# the given state class. If an identical group has already been parsed, by
+	# this or any other parser sharing the same header cache, its result is
+	# replayed instead and we skip straight to the end of the group.
+	def __parseHeaderGroup(self, stateClass):
+
+		cache = self._parser._getHeaderCache()
+		groupEnd = self._findGroupEnd() if cache is not None else -1
+
+		if groupEnd < 0:
+			self._parser._enterState(stateClass(self._parser))
+			return
+
+		key = stateClass.cacheKey(self._parser, self._parser._content[self._parser._curPos:groupEnd])
+		result = cache.get(key)
+
+		if result is None:
+			state = stateClass(self._parser)
+
+			# Only cache the result if parsing ended exactly where the group
+			# does, which is what replaying it assumes
+			def onExit():
+				if groupEnd == self._parser._curPos:
+					cache.put(key, state.result)
+
+			self._parser._enterState(state, onExit)
+
+		else:
+			# Leave the group the same way the state would have
+			stateClass.replay(self._parser, result)
+			self._parser._popStateStack()
+			self._parser._curPos = groupEnd
+			self._parser._curToken = [TokenType.CLOSE_BRACE, '}']
+
+	###########################################################################
+
+	# Skips over the group we've just entered if we've been asked to and it
+	# doesn't matter (see RTFParser._setSkipGroups.) It's left the same way
+	# the header cache leaves a group it replays.
+	def _parseOpenBrace(self):
+
+		if self._parser._getSkipGroups():
+
+			content = self._parser._content
+			start = self._parser._curPos
+			groupEnd = self._findGroupEnd()
+
+			if (
+				groupEnd >= 0 and
+				not HEADER_GROUP_WORD.match(content, start, groupEnd) and
+				not BREAK_WORD.search(content, start, groupEnd)
+			):
+				self._parser._curPos = groupEnd
+				self._parser._curToken = [TokenType.CLOSE_BRACE, '}']
+				return True
+
+		return super()._parseOpenBrace()
+
+	###########################################################################
+
 	def _parseCharacter(self, token):
 
-		if '\n' != token:
-			self._parser._appendToCurrentParagraph(token)
+		return self._parseCharacters(token)
+
+	###########################################################################
+
+	# Literal newlines are ignored. Only \line will result in an inserted \n.
+	def _parseCharacters(self, text):
+
+		if '\n' in text or '\r' in text:
+			text = text.replace('\n', '').replace('\r', '')
+
+		if text:
+			self._parser._appendToCurrentParagraph(self._parser._decodeLiteralText(text))
 
 		return True
 
@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 
-import binascii
+import binascii, sys
 
-from ..tokentype import TokenType
 from .state import ParseState
+from .groupskip import GroupSkipState
 
 class PictState(ParseState):
 
@@ -11,41 +11,62 @@ class PictState(ParseState):
 
 		super().__init__(parser)
 
-		self._parser._setStateValue('private', 'inPict', True)
-		self._parser._setStateValue('private', 'pictAttributes', {})
+		self._parser._setPrivate('inPict', True)
+		self._parser._setPrivate('pictAttributes', {})
 
-		# Initialize image data and ID
-		self.__data = ''
+		# Initialize image data and ID. Hex encoded data is collected in a
+		# bytearray, which can be appended to in place (appending to a string
+		# one token at a time takes quadratic time.) If the image is stored in
+		# binary form (see \binN), self.__binary is a memoryview of it.
+		self.__data = bytearray()
+		self.__binary = None
 		self.__blipUIDBuffer = '' # used for parsing integer ID
 		self.__blipUID = False # contains the actual integer ID
 
+		# Hex encoded data can't grow past this many digits without exceeding
+		# the maxImageBytes limit
+		imageBytesRemaining = self._parser._getImageBytesRemaining()
+		if imageBytesRemaining is None:
+			self.__maxDigits = sys.maxsize
+		else:
+			self.__maxDigits = 2 * imageBytesRemaining + 1
+
 	###########################################################################
 
-	# Process a \pict embedded image. For now, this only supports the default
-	# hex dump format.
+	# Process a \pict embedded image. The image data is passed to the onImage
+	# callback as bytes if it was hex encoded, or as a memoryview of the
+	# document's contents if it was stored in binary form.
 	def __append(self, pictAttributes):
 
+		if self.__binary is not None:
+			image = self.__binary
+		else:
+			image = binascii.unhexlify(self.__data)
+
+		self._parser._countImageBytes(len(image))
+
 		callback = self._parser._getCallback('onImage')
 		if callback:
-			callback(self._parser, pictAttributes, binascii.unhexlify(self.__data))
+			callback(self._parser, pictAttributes, image)
 
 	###########################################################################
 
 	# Look out for when we've finished with the embedded image.
 	def _parseCloseBrace(self):
 
-		oldFullStatePrivate = self._parser._fullState['private']
+		inBlipUID = self._parser._getPrivate('inBlipUID')
+		pictAttributes = self._parser._getPrivate('pictAttributes')
 		super()._parseCloseBrace(False)
 
 		# We're finished parsing an image ID (other possible source of ID is
 		# the bliptag control word.)
-		if 'inBlipUID' in oldFullStatePrivate and oldFullStatePrivate['inBlipUID']:
+		if inBlipUID:
 			self.__blipUID = int(self.__blipUIDBuffer.lstrip('0'), 16)
 
 		# Once we've finished with the pict group, we can stop parsing in this
 		# state.
-		elif 'inPict' not in self._parser._fullState['private']:
-			self.__append(oldFullStatePrivate['pictAttributes'])
+		elif not self._parser._getPrivate('inPict'):
+			self.__append(pictAttributes)
 			return False
 		else:
 			return True
@@ -61,12 +82,11 @@ class PictState(ParseState):
 
 			# We already got the ID in a simpler way, so we can skip over this destination
 			if self.__blipUID:
-				state = SkipGroupState()
-				state.parse()
+				self._parser._enterState(GroupSkipState(self._parser))
 
 			# We haven't gotten the ID yet, so go ahead and parse this destination
 			else:
-				self._parser._setStateValue('private', 'inBlipUID', True)
+				self._parser._setPrivate('inBlipUID', True)
 
 			return True
 
@@ -76,7 +96,7 @@ class PictState(ParseState):
 			return True
 
 		# Various image formatting parameters and metadata
-		elif 'pictAttributes' in self._parser._curState['private'] and word in [
+		elif self._parser._getLocalPrivate('pictAttributes') is not None and word in [
 			'\\picscalex',    # Horizontal scaling %
 			'\\picscaley',    # Vertical scaling %
 			'\\piccropl',     # Twips (1/1440 of an inch) to crop off the left
@@ -107,62 +127,60 @@ class PictState(ParseState):
 			                  # next multiple of 16 greater than or equal to the
 			                  # \picw (bitmap width in pixels) value.
 		]:
-			pictAttributes = self._parser._curState['private']['pictAttributes']
+			pictAttributes = self._parser._getLocalPrivate('pictAttributes')
 			pictAttributes[word] = int(param, 10)
-			self._parser._setStateValue('private', 'pictAttributes', pictAttributes)
 			return True
 
 		# JPG
-		elif 'pictAttributes' in self._parser._curState['private'] and '\\jpegblip' == word:
-			pictAttributes = self._parser._curState['private']['pictAttributes']
+		elif self._parser._getLocalPrivate('pictAttributes') is not None and '\\jpegblip' == word:
+			pictAttributes = self._parser._getLocalPrivate('pictAttributes')
 			pictAttributes['source'] = 'jpeg'
-			self._parser._setStateValue('private', 'pictAttributes', pictAttributes)
 			return True
 
 		# PNG
-		elif 'pictAttributes' in self._parser._curState['private'] and '\\pngblip' == word:
-			pictAttributes = self._parser._curState['private']['pictAttributes']
+		elif self._parser._getLocalPrivate('pictAttributes') is not None and '\\pngblip' == word:
+			pictAttributes = self._parser._getLocalPrivate('pictAttributes')
 			pictAttributes['source'] = 'png'
-			self._parser._setStateValue('private', 'pictAttributes', pictAttributes)
 			return True
 
 		# EMF (Enhanced metafile)
-		elif 'pictAttributes' in self._parser._curState['private'] and '\\emfblip' == word:
-			pictAttributes = self._parser._curState['private']['pictAttributes']
+		elif self._parser._getLocalPrivate('pictAttributes') is not None and '\\emfblip' == word:
+			pictAttributes = self._parser._getLocalPrivate('pictAttributes')
 			pictAttributes['source'] = 'emf'
-			self._parser._setStateValue('private', 'pictAttributes', pictAttributes)
 			return True
 
 		# OS/2 metafile
-		elif 'pictAttributes' in self._parser._curState['private'] and '\\pmmetafile' == word:
-			pictAttributes = self._parser._curState['private']['pictAttributes']
+		elif self._parser._getLocalPrivate('pictAttributes') is not None and '\\pmmetafile' == word:
+			pictAttributes = self._parser._getLocalPrivate('pictAttributes')
 			pictAttributes['source'] = 'os2meta'
 			pictAttributes['metafileType'] = param
-			self._parser._setStateValue('private', 'pictAttributes', pictAttributes)
 			return True
 
 		# Windows metafile
-		elif 'pictAttributes' in self._parser._curState['private'] and '\\wmetafile' == word:
-			pictAttributes = self._parser._curState['private']['pictAttributes']
+		elif self._parser._getLocalPrivate('pictAttributes') is not None and '\\wmetafile' == word:
+			pictAttributes = self._parser._getLocalPrivate('pictAttributes')
 			pictAttributes['source'] = 'winmeta'
 			pictAttributes['metafileMappingMode'] = param
-			self._parser._setStateValue('private', 'pictAttributes', pictAttributes)
 			return True
 
 		# Windows device-independent bitmap
-		elif 'pictAttributes' in self._parser._curState['private'] and '\\dibitmap' == word:
-			pictAttributes = self._parser._curState['private']['pictAttributes']
+		elif self._parser._getLocalPrivate('pictAttributes') is not None and '\\dibitmap' == word:
+			pictAttributes = self._parser._getLocalPrivate('pictAttributes')
 			pictAttributes['source'] = 'wdibmp'
 			pictAttributes['bitmapType'] = param
-			self._parser._setStateValue('private', 'pictAttributes', pictAttributes)
 			return True
 
 		# Windows device-dependent bitmap
-		elif 'pictAttributes' in self._parser._curState['private'] and '\\wbitmap' == word:
-			pictAttributes = self._parser._curState['private']['pictAttributes']
+		elif self._parser._getLocalPrivate('pictAttributes') is not None and '\\wbitmap' == word:
+			pictAttributes = self._parser._getLocalPrivate('pictAttributes')
 			pictAttributes['source'] = 'wddbmp'
 			pictAttributes['bitmapType'] = param
-			self._parser._setStateValue('private', 'pictAttributes', pictAttributes)
+			return True
+
+		# Paragraph and page breaks don't belong in an image. Only the main
+		# body of the document can start a new paragraph, or RTFIndex's
+		# paragraph numbering wouldn't match the DOM's.
+		elif '\\par' == word or '\\page' == word:
 			return True
 
 		else:
@@ -170,54 +188,30 @@ class PictState(ParseState):
 
 	###########################################################################
 
-	# This is ordinarily an abstract function and I'm required to implement it,
-	# but it's not actually used because I've overriden self._parse to solve a
-	# significant performance issue.
 	def _parseCharacter(self, token):
 
-		return True
+		return self._parseCharacters(token)
 
 	###########################################################################
 
-	# I had to override this because repeated calls to self._parseCharacter
-	# result in terrible performance for even small images. This isn't a
-	# beautiful solution, but it works *really* well. Prepare your nose for a
-	# code smell (this is mostly a cut-and-paste from the ParseState class's
-	# method with the call to self._parseCharacter removed.)
-	def parse(self):
-
-		if self._parser._content:
+	# Image data comes in long runs of hex digits (broken up by whitespace),
+	# which are collected a whole run at a time.
+	def _parseCharacters(self, text):
 
-			self._parser._curToken = self._getNextToken()
+		if self._parser._getLocalPrivate('inBlipUID'):
+			self.__blipUIDBuffer += text
 
-			while TokenType.EOF != self._parser._curToken[0]:
-				if TokenType.OPEN_BRACE == self._parser._curToken[0]:
-					if not self._parseOpenBrace():
-						return
-
-				# Restore the previous state.
-				elif TokenType.CLOSE_BRACE == self._parser._curToken[0]:
-					if not self._parseCloseBrace():
-						return
-
-				# We're executing a control word. Execute this before
-				# appending tokens to any special destination or group that
-				# might contain control words.
-				elif TokenType.CONTROL_WORDORSYM == self._parser._curToken[0]:
-					tokenParts = self._splitControlWord(self._parser._curToken)
-					if not self._parseControl(tokenParts[0], tokenParts[1]):
-						return
-
-				### Begin code that diverges from ParseState.parse() ###
-
-				elif 'inBlipUID' in self._parser._curState['private'] and self._parser._curState['private']['inBlipUID']:
-					self.__blipUIDBuffer += self._parser._curToken[1]
+		else:
+			self.__data += ''.join(text.split()).encode('latin-1', 'replace')
+			if len(self.__data) > self.__maxDigits:
+				self._parser._countImageBytes(len(self.__data) // 2)
 
-				elif not self._parser._curToken[1].isspace():
-					self.__data += self._parser._curToken[1]
+		return True
 
-				###  End code that diverges from ParseState.parse()  ###
+	###########################################################################
 
-				self._parser._prevToken = self._parser._curToken
-				self._parser._curToken = self._getNextToken()
+	# Image stored in binary form
+	def _parseBinary(self, data):
 
+		self.__binary = data
+		return True
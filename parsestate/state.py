@@ -3,12 +3,58 @@
 import copy, re, time
 from abc import ABCMeta, abstractmethod
 
+from ..codepage import getDecoder
 from ..tokentype import TokenType
 
+# Matches a run of bytes written in \'xx form
+HEX_RUN = re.compile(r"(?:\\'[0-9a-fA-F]{2})+")
+
+# Matches a \binN control word (including its delimiting space, if any)
+BIN_WORD = re.compile(r'\\bin(\d+) ?')
+
+# Matches braces, along with escaped characters (so that \{, \} and \\ can
+# be skipped over) and \binN control words (so that their data can be) when
+# scanning ahead for the end of a group (see findGroupDelimiters.)
+GROUP_DELIMITERS = re.compile(r'\\bin(\d+) ?|\\.|[{}]', re.DOTALL)
+
+# Matches a run of ordinary characters, which is handed out as a single token
+TEXT_RUN = re.compile(r'[^\\{}]+')
+
+# Most characters handed out in a single token, so that huge runs (like the
+# data of an image) don't have to be copied all at once
+TEXT_CHUNK = 65536
+
+###############################################################################
+
+# Yields a match for every brace between start and end that isn't escaped or
+# part of the data that follows a \binN, which is skipped over the same way
+# the tokenizer skips it (see ParseState._getNextToken.)
+def findGroupDelimiters(content, start, end):
+
+	pos = start
+
+	while True:
+
+		match = GROUP_DELIMITERS.search(content, pos, end)
+		if not match:
+			return
+
+		pos = match.end()
+
+		if match.group(1) is not None:
+			pos += int(match.group(1))
+
+		elif '\\' != match.group()[0]:
+			yield match
+
+###############################################################################
+
 # The parser is modeled loosely on a state machine. When we parse different
 # kinds of groups, we're going to enter different states. The main body of the
 # document is considered one state, and is the default state we enter when we
-# begin parsing.
+# begin parsing. Other states are entered (see RTFParser._enterState) when
+# we reach the groups they know how to parse, and the parser's main loop
+# hands each token to the appropriate method of the state we're currently in.
 class ParseState(object):
 
 	def __init__(self, parser):
@@ -24,6 +70,10 @@ class ParseState(object):
 
 		control = token[1].strip()
 
+		# The parameter of \'xx is hexadecimal, so it can start with a letter
+		if control.startswith("\\'"):
+			return ["\\'", control[2:] or None]
+
 		paramSearch = re.search('-?\d+', control)
 		if paramSearch:
 			paramStartIndex = paramSearch.start()
@@ -91,6 +141,89 @@ class ParseState(object):
 
 	###########################################################################
 
+	# Scans ahead for the close brace that ends the group we're currently in
+	# and returns the index just past it, or -1 if the group never ends. This
+	# doesn't tokenize anything, so it's much faster than parsing the group.
+	def _findGroupEnd(self):
+
+		depth = 1
+
+		for match in findGroupDelimiters(self._parser._content, self._parser._curPos, self._parser._endPos):
+
+			delimiter = match.group()
+
+			if '{' == delimiter:
+				depth += 1
+
+			elif '}' == delimiter:
+				depth -= 1
+				if 0 == depth:
+					return match.end()
+
+		return -1
+
+	###########################################################################
+
+	# Decodes the run of consecutive \'xx bytes that starts with firstByte
+	# (which has already been read) using the given code page, and returns
+	# the resulting text. Decoding a whole run at once is much faster than
+	# going one byte at a time, and it's the only way to get multi-byte
+	# characters right.
+	def _decodeHexRun(self, firstByte, codepage):
+
+		data = bytes([firstByte])
+
+		match = HEX_RUN.match(self._parser._content, self._parser._curPos, self._parser._endPos)
+		if match:
+			data += bytes.fromhex(match.group().replace("\\'", ''))
+			self._parser._curPos = match.end()
+
+		decoder = getDecoder(codepage)('replace')
+		text = decoder.decode(data)
+
+		# Writers sometimes leave the trail byte of a double-byte character
+		# as a literal character instead of escaping it
+		if decoder.getstate()[0] and self._parser._curPos < self._parser._endPos:
+			trailByte = self._parser._content[self._parser._curPos]
+			if ord(trailByte) < 128 and trailByte not in '\\{}\r\n':
+				text += decoder.decode(trailByte.encode('ascii'))
+				self._parser._curPos += 1
+
+		return text + decoder.decode(b'', True)
+
+	###########################################################################
+
+	# Skips over the count characters that follow a \uN for the benefit of
+	# readers that don't understand Unicode (see \ucN.) A \'xx byte or a
+	# control word counts as a single character, and we never skip past the
+	# end of the current group.
+	def _skipUnicodeFallback(self, count):
+
+		content = self._parser._content
+
+		while count > 0 and self._parser._curPos < self._parser._endPos:
+
+			char = content[self._parser._curPos]
+
+			if '{' == char or '}' == char:
+				break
+
+			elif '\\' == char:
+				self._parser._curPos += 1
+				if self._parser._curPos < self._parser._endPos:
+					self._getControlWordOrSymbol()
+
+			else:
+				self._parser._curPos += 1
+
+				# Literal newlines are ignored, so they don't count
+				if '\r' == char or '\n' == char:
+					continue
+
+			count -= 1
+
+	###########################################################################
+
 	# Get next token from the currently loaded RTF
 	def _getNextToken(self):
 
@@ -98,27 +231,55 @@ class ParseState(object):
 		if not self._parser._content:
 			return False
 
-		# We've reached the end of the file
-		elif self._parser._curPos >= len(self._parser._content):
+		# Periodically give the client a chance to take back control
+		self._parser._yieldCountdown -= 1
+		if self._parser._yieldCountdown <= 0:
+			self._parser._yield()
+
+		# We've reached the end of the file (or the point where we were asked
+		# to stop parsing)
+		if self._parser._curPos >= self._parser._endPos:
 			return [TokenType.EOF, '']
 
 		# Control words and their parameters count as single tokens
 		elif '\\' == self._parser._content[self._parser._curPos]:
 			self._parser._curPos = self._parser._curPos + 1
-			return [TokenType.CONTROL_WORDORSYM, self._getControlWordOrSymbol()]
+			token = self._getControlWordOrSymbol()
 
-		# Covers '{', '}' and any other character
-		else:
+			# \binN is followed by N bytes of raw binary data, which we hand
+			# out as a single token without looking at them
+			if token.startswith('\\bin'):
+				binWord = BIN_WORD.fullmatch(token)
+				if binWord:
+					start = self._parser._curPos
+					end = min(start + int(binWord.group(1)), len(self._parser._content))
+					self._parser._curPos = end
+					return [TokenType.BINARY, self._parser._getBinary(start, end)]
 
-			tokenType = TokenType.CHARACTER
+			return [TokenType.CONTROL_WORDORSYM, token]
 
-			if '{' == self._parser._content[self._parser._curPos]:
-				tokenType = TokenType.OPEN_BRACE
-			elif '}' == self._parser._content[self._parser._curPos]:
-				tokenType = TokenType.CLOSE_BRACE
+		elif '{' == self._parser._content[self._parser._curPos]:
+			self._parser._curPos = self._parser._curPos + 1
+			return [TokenType.OPEN_BRACE, '{']
 
+		elif '}' == self._parser._content[self._parser._curPos]:
 			self._parser._curPos = self._parser._curPos + 1
-			return [tokenType, self._parser._content[self._parser._curPos - 1]]
+			return [TokenType.CLOSE_BRACE, '}']
+
+		# Any other characters, up to the next brace or control word, come as
+		# a single token. The client still gets a chance to take back control
+		# about as often as if every character had been a token of its own.
+		else:
+			run = TEXT_RUN.match(
+				self._parser._content,
+				self._parser._curPos,
+				min(self._parser._endPos, self._parser._curPos + TEXT_CHUNK)
+			).group()
+
+			self._parser._curPos += len(run)
+			self._parser._yieldCountdown -= len(run) - 1
+
+			return [TokenType.CHARACTER, run]
 
 	###########################################################################
 
@@ -126,8 +287,8 @@ class ParseState(object):
 	# default, we just push the current state onto the stack and create a new
 	# local copy. If a particular parsing state requires us to handle this
 	# token differently, then its class should override this method. If we
-	# return false instead of true, it means we should return from the current
-	# call to self.parse().
+	# return false instead of true, it means we're finished with the current
+	# state.
 	def _parseOpenBrace(self):
 
 		self._parser._pushStateStack()
@@ -140,22 +301,21 @@ class ParseState(object):
 	# previous state. If a particular parsing state needs to handle this token
 	# differently, then its class should override this method. If
 	# callOnStateChange is set to true, we call the onStateChange callback
-	# (this is the default.) If we return false instead of true, it means we
-	# should return from the current call to self.parse().
+	# (this is the default.) If we return false instead of true, it means
+	# we're finished with the current state.
 	def _parseCloseBrace(self, callOnStateChange = True):
 
-		oldStateFullAttributes = self._parser._fullState
-		oldStateFullAttributes.pop('private', None)
-
-		self._parser._popStateStack()
+		callback = self._parser._getCallback('onStateChange') if callOnStateChange else None
 
-		newStateFullAttributes = self._parser._fullState
-		newStateFullAttributes.pop('private', None)
+		# Copying the state is expensive, so only do it if someone's going to
+		# see it
+		if callback:
+			oldStateFullAttributes = self._parser._fullState
+			self._parser._popStateStack()
+			callback(self._parser, oldStateFullAttributes, self._parser._fullState)
 
-		if callOnStateChange:
-			callback = self._parser._getCallback('onStateChange')
-			if callback:
-				callback(self._parser, oldStateFullAttributes, newStateFullAttributes)
+		else:
+			self._parser._popStateStack()
 
 		return True
 
@@ -164,8 +324,8 @@ class ParseState(object):
 	# Executes a control word or symbol. This defines default behavior for all
 	# parser states. If the control words here need to have their behavior
 	# changed, or if new control words need to be defined, this method should
-	# be overridden. If we return false instead of true, it means we should
-	# return from the current call to self.parse().
+	# be overridden. If we return false instead of true, it means we're
+	# finished with the current state.
 	def _parseControl(self, word, param):
 
 		styleControlWordTypes = {
@@ -257,35 +417,44 @@ class ParseState(object):
 			self._parser._appendToCurrentParagraph(time.strftime("%I:%M:%S %p"))
 
 		# A character of the form \uXXX to be added to the current paragraph.
-		# Unlike \'XX, \u takes a decimal number instead of hex.
+		# Unlike \'XX, \u takes a decimal number instead of hex. Values above
+		# 32767 are written as negative numbers.
 		elif '\\u' == word and param:
+
 			try:
-				self._parser._appendToCurrentParagraph(chr(int(param, 10)))
+				codePoint = int(param, 10)
 			except ValueError:
-				return
+				return True
+
+			if codePoint < 0:
+				codePoint += 65536
+
+			self._parser._appendToCurrentParagraph(chr(codePoint))
 
-		# A character of the form \'XX to be added to the current paragraph
+			# Per the RTF standard, a \uXXX unicode symbol is followed by
+			# \ucN characters (1 by default) meant for older RTF readers that
+			# don't understand it. We've already got the real thing, so skip
+			# them.
+			self._skipUnicodeFallback(self._parser._getPrivate('uc', 1))
+
+		# Number of fallback characters that follow each \uXXX
+		elif '\\uc' == word and isinstance(param, str) and param.isdigit():
+			self._parser._setPrivate('uc', int(param))
+
+		# A run of bytes of the form \'XX, to be decoded using the current
+		# font's code page and added to the current paragraph
 		elif "\\'" == word and param:
 
 			try:
+				firstByte = int(param, 16)
+			except ValueError:
+				return True
 
-				charCode = int(param, 16)
-				prevTokenParts = self._splitControlWord(self._parser._prevToken)
-
-				# Per the RTF standard, if a \uXXX unicode symbol has an ANSI
-				# equivalent, the ANSI character will be encoded directly
-				# following \uXXX in the form \'XX. This is for backward
-				# compatibility with older RTF readers. Whenever we encounter
-				# \'XX directly after \uXXX, therefore, we'll ignore it. Also,
-				# \'XX can only have a maximum value of 255 (FF.) Since my
-				# tokenizer doesn't detect this and might pick up extra digits,
-				# we do a bounds check here and ignore the character if it falls
-				# out of bounds.
-				if '\\u' != prevTokenParts[0] and charCode <= 255:
-					self._parser._appendToCurrentParagraph(chr(charCode))
+			self._parser._appendToCurrentParagraph(self._decodeHexRun(firstByte, self._parser._getCodepage()))
 
-			except ValueError:
-				return
+		# Font from the font table
+		elif '\\f' == word and isinstance(param, str) and param.isdigit():
+			self._parser._setPrivate('font', int(param))
 
 		################################################
 		#        Misc control words and symbols        #
@@ -383,52 +552,39 @@ class ParseState(object):
 
 	###########################################################################
 
-	# Defines what we should do when we encounter an ordinary character token.
-	# If function returns false instead of true, it means we should return from
-	# the current call to self.parse().
+	# Defines what we should do with the data that follows a \binN control
+	# word, which is passed in as a memoryview. By default, it's ignored. If
+	# we return false instead of true, it means we're finished with the
+	# current state.
+	def _parseBinary(self, data):
+
+		return True
+
+	###########################################################################
+
+	# Defines what we should do with a single ordinary character. Called once
+	# for each character by the default implementation of _parseCharacters.
+	# If function returns false instead of true, it means we're finished
+	# with the current state.
 	@abstractmethod
 	def _parseCharacter(self, token):
 		pass
 
 	###########################################################################
 
-	# Parse the RTF and return an array of formatted paragraphs.
-	# IMPORTANT: You might find that certain types of large data (such as
-	# embedded images) will perform horribly due to Python's high function call
-	# overhead. To mitigate this, you might have to override this method in
-	# order to eliminate the call to self._parseCharacter. For an example of how
-	# this can be done, see what I did in PictState. Only resort to this if
-	# profiling shows that you're getting bogged down here.
-	def parse(self):
-
-		if self._parser._content:
-
-			self._parser._curToken = self._getNextToken()
-
-			while TokenType.EOF != self._parser._curToken[0]:
-
-				if TokenType.OPEN_BRACE == self._parser._curToken[0]:
-					if not self._parseOpenBrace():
-						return
-
-				# Restore the previous state.
-				elif TokenType.CLOSE_BRACE == self._parser._curToken[0]:
-					if not self._parseCloseBrace():
-						return
-
-				# We're executing a control word. Execute this before
-				# appending tokens to any special destination or group that
-				# might contain control words.
-				elif TokenType.CONTROL_WORDORSYM == self._parser._curToken[0]:
-					tokenParts = self._splitControlWord(self._parser._curToken)
-					if not self._parseControl(tokenParts[0], tokenParts[1]):
-						return
-
-				# Just an ordinary printable character (note that literal
-				# newlines are ignored. Only \line will result in an inserted \n.
-				elif not self._parseCharacter(self._parser._curToken[1]):
-						return
-
-				self._parser._prevToken = self._parser._curToken
-				self._parser._curToken = self._getNextToken()
+	# Defines what we should do with a run of ordinary characters, which the
+	# tokenizer hands out as a single token. By default, each character is
+	# passed to self._parseCharacter in turn, and if one of them finishes
+	# the current state, the characters after it are left for the state we
+	# return to. States that get a lot of text (or, like PictState, a lot of
+	# data) should override this to handle the whole run at once, since
+	# Python's function call overhead adds up quickly. If we return false
+	# instead of true, it means we're finished with the current state.
+	def _parseCharacters(self, text):
+
+		for i in range(len(text)):
+			if not self._parseCharacter(text[i]):
+				self._parser._curPos -= len(text) - i - 1
+				return False
 
+		return True
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import copy
+
 from ..tokentype import TokenType
+from ..headercache import contentKey
 from .state import ParseState
 
 class StylesheetState(ParseState):
@@ -8,45 +11,90 @@ class StylesheetState(ParseState):
 	def __init__(self, parser):
 
 		super().__init__(parser)
-		self._parser._setStateValue('private', 'inStylesheet', True)
+		self._parser._setPrivate('inStylesheet', True)
+
+		# Every style we insert into the stylesheet, in order, as
+		# [styleType, styleIndex, properties]. This is what gets stored in the
+		# header cache (see replay.)
+		self.__styles = []
+
+	###########################################################################
+
+	# The styles parsed out of the stylesheet. Their properties are copies of
+	# the ones in the parser's stylesheet, so that changing those doesn't
+	# change what's in the header cache.
+	@property
+	def result(self):
+
+		return tuple((styleType, styleIndex, copy.deepcopy(properties)) for styleType, styleIndex, properties in self.__styles)
+
+	###########################################################################
+
+	# Returns the key under which the result of parsing a stylesheet is
+	# stored in the header cache. Styles can refer to the color table, so
+	# that's part of the key too.
+	@staticmethod
+	def cacheKey(parser, groupContent):
+
+		return ('stylesheet', contentKey(groupContent), parser._getColorTable())
+
+	###########################################################################
+
+	# Inserts the styles from a previously parsed stylesheet, exactly as if
+	# we'd just parsed it. Each parser gets its own copy of every style's
+	# properties.
+	@staticmethod
+	def replay(parser, result):
+
+		for styleType, styleIndex, properties in result:
+			parser._insertStyle(styleType, styleIndex, copy.deepcopy(properties))
+
+		StylesheetState.__updateDefaults(parser)
 
 	###########################################################################
 
 	# Inserts the currently parsed style into the stylesheet.
 	def __insertStyle(self):
 
-		if 'groupSkip' not in self._parser._fullState['private'] and 'styleName' in self._parser._curState['private'] and 'styleType' in self._parser._curState['private'] and 'styleIndex' in self._parser._curState['private'] and 'styleProperties' in self._parser._curState['private']:
-			self._parser._insertStyle(self._parser._curState['private']['styleType'], self._parser._curState['private']['styleIndex'], {'name': self._parser._curState['private']['styleName'], 'attributes': self._parser._curState['private']['styleProperties']})
+		styleName = self._parser._getLocalPrivate('styleName')
+		styleType = self._parser._getLocalPrivate('styleType')
+		styleIndex = self._parser._getLocalPrivate('styleIndex')
+		styleProperties = self._parser._getLocalPrivate('styleProperties')
+
+		if not self._parser._getPrivate('groupSkip') and styleName is not None and styleType is not None and styleIndex is not None and styleProperties is not None:
+			properties = {'name': styleName, 'attributes': styleProperties}
+			self._parser._insertStyle(styleType, styleIndex, properties)
+			self.__styles.append([styleType, styleIndex, properties])
 
 	###########################################################################
 
 	# Once we're done parsing the stylesheet, make sure to update the document's
 	# default properties if they're defined.
-	def __updateDefaults(self):
+	@staticmethod
+	def __updateDefaults(parser):
 
-		defaultParagraphStyles = self._parser._getStyle('paragraph', 0)
+		defaultParagraphStyles = parser._getStyle('paragraph', 0)
 		if defaultParagraphStyles:
-			self._parser._updateDefaultAttributes('paragraph', defaultParagraphStyles, True)
+			parser._updateDefaultAttributes('paragraph', defaultParagraphStyles, True)
 
 	###########################################################################
 
-	# Look out for when we've finished with the skipped group.
+	# Look out for when we've finished with the stylesheet group.
 	def _parseCloseBrace(self):
 
-		retVal = True
+		# If we just finished parsing a style definition, insert it into the
+		# stylesheet
+		self.__insertStyle()
 
-		# Once we've finished skipping over the group, we can stop parsing in
-		# this state.
-		if 'inStylesheet' not in self._parser._fullState['private']:
-			self.__updateDefaults()
-			retVal = False
+		super()._parseCloseBrace(False)
 
-		# We're inserting a newly parsed style into the stylesheet
+		# Once we've left the stylesheet group, we can stop parsing in this
+		# state.
+		if not self._parser._getPrivate('inStylesheet'):
+			StylesheetState.__updateDefaults(self._parser)
+			return False
 		else:
-			self.__insertStyle()
-
-		super()._parseCloseBrace(False)
-		return retVal
+			return True
 
 	###########################################################################
 
@@ -55,15 +103,15 @@ class StylesheetState(ParseState):
 
 		# If we're in the middle of a style that's invalidly formatted, skip it
 		# in the hopes that the rest of the document is okay.
-		if 'groupSkip' not in self._parser._fullState['private']:
+		if not self._parser._getPrivate('groupSkip'):
 
 			# We're defining a new style definition
 			if TokenType.OPEN_BRACE == self._parser._prevToken[0]:
 
 				# Paragraph style
 				if TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\s' == word:
-					self._parser._setStateValue('private', 'styleType', 'paragraph')
-					self._parser._setStateValue('private', 'styleIndex', param)
+					self._parser._setPrivate('styleType', 'paragraph')
+					self._parser._setPrivate('styleIndex', param)
 
 				# Need to look ahead one extra token to see what kind of style we're
 				# dealing with
@@ -79,43 +127,41 @@ class StylesheetState(ParseState):
 
 					# Section style
 					if '\\ds' == tokenParts[0]:
-						self._parser._setStateValue('private', 'styleType', 'section')
-						self._parser._setStateValue('private', 'styleIndex', tokenParts[1])
+						self._parser._setPrivate('styleType', 'section')
+						self._parser._setPrivate('styleIndex', tokenParts[1])
 
 					# Table style
 					elif '\\ts' == tokenParts[0]:
-						self._parser._setStateValue('private', 'styleType', 'table')
-						self._parser._setStateValue('private', 'styleIndex', tokenParts[1])
+						self._parser._setPrivate('styleType', 'table')
+						self._parser._setPrivate('styleIndex', tokenParts[1])
 
 					# Character style
 					elif '\\cs' == tokenParts[0]:
-						self._parser._setStateValue('private', 'styleType', 'character')
-						self._parser._setStateValue('private', 'styleIndex', tokenParts[1])
+						self._parser._setPrivate('styleType', 'character')
+						self._parser._setPrivate('styleIndex', tokenParts[1])
 
 					# Style definition is invalid, so skip over it and hope for the best
 					else:
-						self._parser._setStateValue('private', 'groupSkip', True)
+						self._parser._setPrivate('groupSkip', True)
 
 				# Style definition is invalid, so skip over it and hope for the best
 				else:
-					self._parser._setStateValue('private', 'groupSkip', True)
+					self._parser._setPrivate('groupSkip', True)
 
 			# We're parsing a style definition's format
-			elif 'styleType' in self._parser._curState['private']:
+			elif self._parser._getLocalPrivate('styleType') is not None:
 
-				styleProperties = {}
-				if 'styleProperties' in self._parser._curState['private']:
-					styleProperties = self._parser._curState['private']['styleProperties']
+				styleProperties = self._parser._getLocalPrivate('styleProperties', {})
 
-				if 'section' == self._parser._curState['private']['styleType']:
+				if 'section' == self._parser._getLocalPrivate('styleType'):
 					# TODO
 					return True
 
-				elif 'table' == self._parser._curState['private']['styleType']:
+				elif 'table' == self._parser._getLocalPrivate('styleType'):
 					# TODO
 					return True
 
-				elif 'paragraph' == self._parser._curState['private']['styleType']:
+				elif 'paragraph' == self._parser._getLocalPrivate('styleType'):
 
 					# Page break before paragraph
 					if '\\pagebb' == word:
@@ -143,7 +189,7 @@ class StylesheetState(ParseState):
 					# TODO: how do I want to handle \qkN alignment? Will require
 					# setting two attributes.
 
-				elif 'character' == self._parser._curState['private']['styleType']:
+				elif 'character' == self._parser._getLocalPrivate('styleType'):
 
 					# Italic
 					if '\\i' == word:
@@ -187,11 +233,11 @@ class StylesheetState(ParseState):
 						if color:
 							styleProperties['bColor'] = color
 
-				self._parser._setStateValue('private', 'styleProperties', styleProperties)
+				self._parser._setPrivate('styleProperties', styleProperties)
 
 			# Style definition is invalid, so skip over it and hope for the best
 			else:
-				self._parser._setStateValue('private', 'groupSkip', True)
+				self._parser._setPrivate('groupSkip', True)
 
 		return True
 
@@ -200,12 +246,9 @@ class StylesheetState(ParseState):
 	# We're parsing the style definition's name
 	def _parseCharacter(self, token):
 
-		if 'groupSkip' not in self._parser._fullState['private'] and ';' != token and '\n' != token:
-			styleName = ''
-			if 'styleName' in self._parser._curState['private']:
-				styleName = self._parser._curState['private']['styleName']
-			styleName += token
-			self._parser._setStateValue('private', 'styleName', styleName)
+		if not self._parser._getPrivate('groupSkip') and ';' != token and '\n' != token and '\r' != token:
+			styleName = self._parser._getLocalPrivate('styleName', '') + token
+			self._parser._setPrivate('styleName', styleName)
 
 		return True
 
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Tests for parsing with asyncio (see asyncparse.py), both in the event loop's
+# own thread and in an executor.
+#
+# Usage: python -m unittest discover -s pyrtfdom/tests -t .
+
+import asyncio, unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pyrtfdom.dom import RTFDOM
+from pyrtfdom.convert import toJSON
+from pyrtfdom.asyncparse import parseEvents
+from pyrtfdom.benchmarks.memory import makeDocument
+
+DOCUMENT = makeDocument(200)
+
+# Returns the JSON structure (see convert.toJSON) of the tree parse() builds.
+def parseTree(rtfContent):
+
+	dom = RTFDOM()
+	dom.openString(rtfContent)
+	dom.parse()
+
+	return toJSON(dom.rootNode)
+
+# Returns the JSON structure of the tree parseAsync() builds, along with the
+# number of times a task running alongside it got to run.
+async def parseTreeAsync(rtfContent, **options):
+
+	ticks = 0
+	done = False
+
+	async def tick():
+		nonlocal ticks
+		while not done:
+			ticks += 1
+			await asyncio.sleep(0)
+
+	ticker = asyncio.ensure_future(tick())
+
+	try:
+		dom = RTFDOM()
+		dom.openString(rtfContent)
+		await dom.parseAsync(**options)
+	finally:
+		done = True
+		await ticker
+
+	return toJSON(dom.rootNode), ticks
+
+# Returns every event parseEvents() yields.
+async def collectEvents(rtfContent, **options):
+
+	return [event async for event in parseEvents(rtfContent, **options)]
+
+###############################################################################
+
+class ParseAsyncTest(unittest.TestCase):
+
+	def testInLoop(self):
+
+		tree, ticks = asyncio.run(parseTreeAsync(DOCUMENT, yieldEvery = 100, yieldInterval = 0))
+
+		self.assertEqual(parseTree(DOCUMENT), tree)
+		self.assertGreater(ticks, 10)
+
+	def testExecutor(self):
+
+		with ThreadPoolExecutor(1) as executor:
+			tree, ticks = asyncio.run(parseTreeAsync(DOCUMENT, executor = executor))
+
+		self.assertEqual(parseTree(DOCUMENT), tree)
+
+	def testTimeout(self):
+
+		for executor in (None, ThreadPoolExecutor(1)):
+			with self.assertRaises(asyncio.TimeoutError):
+				asyncio.run(parseTreeAsync(makeDocument(5000), executor = executor, timeout = 0.01))
+			if executor:
+				executor.shutdown()
+
+	def testCancel(self):
+
+		async def cancel():
+			dom = RTFDOM()
+			dom.openString(makeDocument(5000))
+			task = asyncio.ensure_future(dom.parseAsync(yieldInterval = 0))
+			await asyncio.sleep(0)
+			task.cancel()
+			await task
+
+		with self.assertRaises(asyncio.CancelledError):
+			asyncio.run(cancel())
+
+###############################################################################
+
+class ParseEventsTest(unittest.TestCase):
+
+	def testSameEvents(self):
+
+		inLoop = asyncio.run(collectEvents(DOCUMENT, yieldEvery = 100))
+
+		with ThreadPoolExecutor(1) as executor:
+			inExecutor = asyncio.run(collectEvents(DOCUMENT, executor = executor, yieldEvery = 100))
+
+		self.assertIn('onField', [event[0] for event in inLoop])
+		self.assertEqual(inLoop, inExecutor)
+
+	def testStopEarly(self):
+
+		async def firstEvents(count):
+			events = []
+			async for event in parseEvents(DOCUMENT):
+				events.append(event)
+				if len(events) == count:
+					break
+			return events
+
+		self.assertEqual(5, len(asyncio.run(firstEvents(5))))
+
+###############################################################################
+
+if '__main__' == __name__:
+	unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Tests for the on-disk corpus index (see corpus.py.)
+#
+# Usage: python -m unittest discover -s pyrtfdom/tests -t .
+
+import os, tempfile, unittest
+from unittest import mock
+
+from pyrtfdom.corpus import CorpusIndex
+
+###############################################################################
+
+class CorpusIndexTest(unittest.TestCase):
+
+	def setUp(self):
+
+		self.__dir = tempfile.TemporaryDirectory()
+		self.indexDir = os.path.join(self.__dir.name, 'index')
+
+	def tearDown(self):
+
+		self.__dir.cleanup()
+
+	# Writes an RTF file containing text and returns its filename.
+	def writeDocument(self, name, text):
+
+		filename = os.path.join(self.__dir.name, name)
+		with open(filename, 'w', encoding = 'utf-8') as rtfFile:
+			rtfFile.write('{\\rtf1\\ansi ' + text + '\\par}')
+
+		return filename
+
+	###########################################################################
+
+	def testSearch(self):
+
+		index = CorpusIndex(self.indexDir)
+		index.add([self.writeDocument('a.rtf', 'apple banana'), self.writeDocument('b.rtf', 'banana')], processes = 1)
+
+		self.assertEqual([(0, 0, 6), (1, 0, 0)], CorpusIndex(self.indexDir).search('Banana'))
+
+	def testUnusualFilenames(self):
+
+		# Characters str.splitlines() splits on, but that can be part of a
+		# filename
+		names = ['a\x85b.rtf', 'c d.rtf', 'e\x0cf.rtf', 'g\rh.rtf', 'last.rtf']
+		filenames = [self.writeDocument(name, name) for name in names]
+
+		CorpusIndex(self.indexDir).add(filenames, processes = 1)
+
+		index = CorpusIndex(self.indexDir)
+		self.assertEqual(len(names), index.documentCount)
+		self.assertEqual(filenames, [index.documentName(docId) for docId in range(len(names))])
+
+	def testFailedAdd(self):
+
+		first = self.writeDocument('first.rtf', 'one')
+		lost = self.writeDocument('lost.rtf', 'two')
+		last = self.writeDocument('last.rtf', 'three')
+
+		index = CorpusIndex(self.indexDir)
+		index.add([first], processes = 1)
+
+		# Fail after the segment and document list have been written, but
+		# before the manifest is saved
+		with mock.patch.object(CorpusIndex, '_CorpusIndex__saveManifest', side_effect = OSError('disk full')):
+			with self.assertRaises(OSError):
+				index.add([lost], processes = 1)
+
+		self.assertEqual(['documents.txt', 'manifest.json', 'seg-0.lexicon', 'seg-0.postings'], sorted(os.listdir(self.indexDir)))
+		self.assertEqual(1, index.documentCount)
+
+		index.add([last], processes = 1)
+
+		for index in (index, CorpusIndex(self.indexDir)):
+			self.assertEqual(2, index.documentCount)
+			self.assertEqual([first, last], [index.documentName(0), index.documentName(1)])
+			self.assertEqual([(1, 0, 0)], index.search('three'))
+			self.assertEqual([], index.search('two'))
+
+###############################################################################
+
+if '__main__' == __name__:
+	unittest.main()
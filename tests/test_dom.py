@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Tests for building, printing and serializing DOM trees (see dom.py.)
+#
+# Usage: python -m unittest discover -s pyrtfdom/tests -t .
+
+import contextlib, io, json, unittest
+
+from pyrtfdom.dom import RTFDOM
+from pyrtfdom.convert import toJSON
+
+# Returns an RTFDOM that's parsed rtfContent.
+def parseString(rtfContent):
+
+	dom = RTFDOM()
+	dom.openString(rtfContent)
+	dom.parse()
+
+	return dom
+
+# Returns every node of the given type in the tree rooted at node, in
+# document order.
+def findNodes(node, nodeType):
+
+	nodes = [node] if nodeType == node.nodeType else []
+
+	if node.children:
+		for child in node.children:
+			nodes.extend(findNodes(child, nodeType))
+
+	return nodes
+
+###############################################################################
+
+class BinaryImageTest(unittest.TestCase):
+
+	# An image stored as \binN data, whose value is a memoryview of the
+	# document instead of bytes
+	DOCUMENT = '{\\rtf1 {\\pict\\pngblip\\bin4 abcd}x\\par}'
+
+	def testValue(self):
+
+		images = findNodes(parseString(self.DOCUMENT).rootNode, 'img')
+
+		self.assertEqual(1, len(images))
+		self.assertIsInstance(images[0].value, memoryview)
+		self.assertEqual(b'abcd', bytes(images[0].value))
+
+	def testPrintTree(self):
+
+		output = io.StringIO()
+		with contextlib.redirect_stdout(output):
+			parseString(self.DOCUMENT).printTree()
+
+		self.assertIn('value: <Binary Data>', output.getvalue())
+
+	def testJSON(self):
+
+		serialized = json.loads(json.dumps(toJSON(parseString(self.DOCUMENT).rootNode)))
+		images = [node for node in serialized['children'][0]['children'] if 'img' == node['type']]
+
+		self.assertEqual(1, len(images))
+		self.assertEqual('YWJjZA==', images[0]['value'])
+
+###############################################################################
+
+if '__main__' == __name__:
+	unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Tests for the cache of parsed font tables, color tables and stylesheets
+# shared between parsers (see headercache.py.)
+#
+# Usage: python -m unittest discover -s pyrtfdom/tests -t .
+
+import unittest
+
+from pyrtfdom.parse import RTFParser
+from pyrtfdom.headercache import HeaderCache
+from pyrtfdom.parsestate.fonttable import FontTableState
+from pyrtfdom.parsestate.colortable import ColorTableState
+from pyrtfdom.parsestate.stylesheet import StylesheetState
+
+STYLESHEET = '{\\stylesheet{\\s0 Normal;}{\\s1\\qc Heading;}}'
+
+# Returns a document with the given header groups.
+def makeDocument(header):
+
+	return '{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Arial;}}' + header + '\nText.\\par}'
+
+# Returns a parser that's parsed rtfContent using cache.
+def parse(rtfContent, cache):
+
+	ignore = lambda *args: None
+
+	parser = RTFParser({
+		'callbacks': {
+			'onOpenParagraph':   ignore,
+			'onAppendParagraph': ignore,
+			'onStateChange':     ignore,
+			'onField':           ignore
+		},
+		'headerCache': cache
+	})
+	parser.openString(rtfContent)
+	parser.parse()
+
+	return parser
+
+###############################################################################
+
+class HeaderCacheTest(unittest.TestCase):
+
+	def testReplayedStylesAreCopies(self):
+
+		cache = HeaderCache()
+		rtfContent = makeDocument(STYLESHEET)
+
+		# The first parser's styles end up in the cache, and the second
+		# one's are replayed from it
+		first = parse(rtfContent, cache)
+		first._getStyle('paragraph', 1)['attributes']['alignment'] = 'right'
+		first._getStyle('paragraph', 1)['name'] = 'Changed'
+
+		second = parse(rtfContent, cache)
+		second._getStyle('paragraph', 1)['attributes']['alignment'] = 'justified'
+
+		third = parse(rtfContent, cache)
+
+		# Font table and stylesheet, twice
+		self.assertEqual(4, cache.stats()['hits'])
+		for parser in (second, third):
+			self.assertEqual('Heading', parser._getStyle('paragraph', 1)['name'])
+		self.assertEqual('center', third._getStyle('paragraph', 1)['attributes']['alignment'])
+
+	def testSameLength(self):
+
+		cache = HeaderCache()
+
+		red = parse(makeDocument('{\\colortbl;\\red255\\green0\\blue0;}'), cache)
+		blue = parse(makeDocument('{\\colortbl;\\red0\\green0\\blue255;}'), cache)
+
+		# Only the font tables are the same
+		self.assertEqual(1, cache.stats()['hits'])
+		self.assertNotEqual(red._getColorTable(), blue._getColorTable())
+
+	def testKeysDontHoldGroups(self):
+
+		fonts = '{\\fonttbl{\\f0 Arial;}' + ''.join('{\\f' + str(i) + ' Font ' + str(i) + ';}' for i in range(1, 1000)) + '}'
+		parser = parse(makeDocument(''), HeaderCache())
+
+		for stateClass in (FontTableState, ColorTableState, StylesheetState):
+			with self.subTest(stateClass.__name__):
+				key = stateClass.cacheKey(parser, fonts)
+				self.assertLess(len(repr(key)), 200)
+				self.assertNotEqual(key, stateClass.cacheKey(parser, fonts[:-2] + 'x}'))
+
+###############################################################################
+
+if '__main__' == __name__:
+	unittest.main()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+# Tests for updating a tree and its index after an edit (see
+# RTFDOM.applyEdit and RTFIndex.applyEdit.) Every edit is checked against a
+# full parse of the edited document.
+#
+# Usage: python -m unittest discover -s pyrtfdom/tests -t .
+
+import json, random, unittest
+
+from pyrtfdom.dom import RTFDOM
+from pyrtfdom.index import RTFIndex
+from pyrtfdom.convert import toJSON
+
+DOCUMENT = (
+	'{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Arial;}{\\f1 Courier;}}'
+	'{\\colortbl;\\red255\\green0\\blue0;}\n'
+	'First paragraph.\\par\n'
+	'Second with {\\b bold} text.\\par\n'
+	'{\\i Italic across\\par two paragraphs.}\\par\n'
+	'A {\\field{\\*\\fldinst HYPERLINK "http://example.com/"}{\\fldrslt link}} here.\\par\n'
+	'Before a page\\page after it.\\par\n'
+	'Escaped \\{ brace and \\\'e9.\\par\n'
+	'Last paragraph.}'
+)
+
+# Returns a tree's JSON structure (see convert.toJSON.)
+def parseTree(rtfContent):
+
+	dom = RTFDOM()
+	dom.openString(rtfContent)
+	dom.parse()
+
+	return toJSON(dom.rootNode)
+
+# Returns an index's checkpoints with their state stacks in place of the
+# states' indices, which depend on the order they were added in.
+def indexEntries(index):
+
+	def resolve(entries):
+		return json.loads(json.dumps([[entry[0], entry[1], index.states[entry[2]], entry[3]] for entry in entries]))
+
+	return resolve(index.paragraphs), resolve(index.pages)
+
+###############################################################################
+
+class ApplyEditTest(unittest.TestCase):
+
+	# Replaces the characters between start and end of source and checks that
+	# the tree and index match those of a full parse of the result (or that
+	# applyEdit fails the same way, if the result can't be parsed.) Returns
+	# what applyEdit did.
+	def checkEdit(self, start, end, replacement, source = DOCUMENT):
+
+		dom = RTFDOM()
+		dom.openString(source)
+		dom.parse()
+		index = RTFIndex.build(source)
+
+		edited = source[:start] + replacement + source[end:]
+		message = 'replacing %r with %r' % (source[start:end], replacement)
+
+		try:
+			expected = parseTree(edited)
+		except ValueError:
+			with self.assertRaises(ValueError, msg = message):
+				dom.applyEdit(index, start, end, replacement)
+			return None
+
+		incremental = dom.applyEdit(index, start, end, replacement)
+
+		self.assertEqual(expected, toJSON(dom.rootNode), message)
+		self.assertEqual(indexEntries(RTFIndex.build(edited)), indexEntries(index), message)
+
+		return incremental
+
+	# Offset of the first occurrence of text in the document, or of the end
+	# of it if after is True
+	def find(self, text, after = False):
+
+		offset = DOCUMENT.index(text)
+		return offset + len(text) if after else offset
+
+	###########################################################################
+
+	def testWithinParagraph(self):
+
+		start = self.find('with')
+		self.assertTrue(self.checkEdit(start, start + 4, 'without any'))
+
+	def testBeforeCheckpoint(self):
+
+		# Ends right where a \par starts
+		end = self.find('text.\\par', True) - len('\\par')
+		self.assertTrue(self.checkEdit(end - 1, end, '!'))
+
+	def testAtCheckpoint(self):
+
+		# Starts right after a \par, which could change how it's tokenized
+		start = self.find('Second with {\\b bold} text.\\par', True)
+		self.assertTrue(self.checkEdit(start, start, 'd'))
+		self.assertTrue(self.checkEdit(start, start, ' more'))
+
+	def testAcrossCheckpoints(self):
+
+		start = self.find('text.')
+		end = self.find('Before')
+		self.assertTrue(self.checkEdit(start, end, 'merged '))
+
+	def testAddParagraphs(self):
+
+		start = self.find('Second ', True)
+		self.assertTrue(self.checkEdit(start, start, 'new\\par another\\par '))
+
+	def testRemoveParagraph(self):
+
+		start = self.find('text.\\par', True) - len('\\par')
+		self.assertTrue(self.checkEdit(start, start + len('\\par'), ''))
+
+	def testPages(self):
+
+		start = self.find('\\page')
+		self.checkEdit(start, start + len('\\page'), '')
+		self.checkEdit(start, start, '\\page')
+
+	def testChangesFollowingState(self):
+
+		# Opening a group that isn't closed before the next \par changes the
+		# state of everything after it
+		start = self.find('Second')
+		self.assertFalse(self.checkEdit(start, start, '{\\b '))
+
+	def testInsideGroupAcrossParagraphs(self):
+
+		start = self.find('Italic')
+		self.checkEdit(start, start + len('Italic'), 'Slanted')
+		self.checkEdit(start, start, '}{')
+
+	def testField(self):
+
+		start = self.find('link}')
+		self.checkEdit(start, start + len('link'), 'a longer link')
+		start = self.find('http')
+		self.checkEdit(start, start + len('http'), 'https')
+
+	def testLastParagraph(self):
+
+		start = self.find('Last')
+		self.assertTrue(self.checkEdit(start, start + 4, 'Final'))
+
+	def testHeader(self):
+
+		for text, replacement in (('Courier', 'Times'), ('255', '0'), ('{\\f1 Courier;}', '')):
+			start = self.find(text)
+			self.assertFalse(self.checkEdit(start, start + len(text), replacement))
+
+		start = self.find('First')
+		self.assertFalse(self.checkEdit(start, start, '{\\colortbl;\\red0\\green0\\blue255;}'))
+
+	def testRandomEdits(self):
+
+		generator = random.Random(1)
+		pieces = ['x', ' ', '\\par ', '\\page ', '{', '}', '{\\b ', '\\i0 ', '\\\'e9', '\\{', '']
+
+		for unused in range(200):
+			start = generator.randrange(len(DOCUMENT) + 1)
+			end = min(len(DOCUMENT), start + generator.choice([0, 0, 1, 3, 10, 40]))
+			replacement = ''.join(generator.choice(pieces) for unused in range(generator.randrange(3)))
+			self.checkEdit(start, end, replacement)
+
+###############################################################################
+
+if '__main__' == __name__:
+	unittest.main()
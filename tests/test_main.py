@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# Tests for the command line converter (see __main__.py.)
+#
+# Usage: python -m unittest discover -s pyrtfdom/tests -t .
+
+import contextlib, io, json, os, tempfile, unittest
+from unittest import mock
+
+from pyrtfdom import __main__ as command
+from pyrtfdom.convert import convertWorker
+
+DOCUMENT = '{\\rtf1\\ansi Hello, {\\b world}.\\par}'
+
+# Worker that kills its process when asked to convert a file called
+# crash.rtf, the way running out of memory would, and otherwise converts
+# the file as usual
+def crashingWorker(inputFilename, outputFilename, outputFormat):
+
+	if 'crash.rtf' == os.path.basename(inputFilename):
+		os._exit(1)
+
+	return convertWorker(inputFilename, outputFilename, outputFormat)
+
+###############################################################################
+
+class MainTest(unittest.TestCase):
+
+	def setUp(self):
+
+		self.__dir = tempfile.TemporaryDirectory()
+		self.dir = self.__dir.name
+
+	def tearDown(self):
+
+		self.__dir.cleanup()
+
+	# Writes the given files to the input directory and runs the converter
+	# on it with the given extra arguments. Returns the exit status and
+	# whatever was written to stderr.
+	def convert(self, filenames, *args):
+
+		inputDir = os.path.join(self.dir, 'input')
+		os.makedirs(inputDir, exist_ok = True)
+
+		for filename in filenames:
+			with open(os.path.join(inputDir, filename), 'w') as rtfFile:
+				rtfFile.write(DOCUMENT)
+
+		stdout = io.StringIO()
+		stderr = io.StringIO()
+		with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+			status = command.main(['-o', os.path.join(self.dir, 'output'), '-j', '1'] + list(args) + [inputDir])
+
+		return status, stderr.getvalue()
+
+	# Returns the contents of the output directory's manifest.
+	def manifest(self):
+
+		with open(os.path.join(self.dir, 'output', command.MANIFEST_FILENAME)) as manifestFile:
+			return json.load(manifestFile)
+
+	###########################################################################
+
+	def testConvert(self):
+
+		status, stderr = self.convert(['a.rtf', 'b.rtf'])
+
+		self.assertEqual(0, status)
+		self.assertEqual(['a.txt', 'b.txt'], sorted(self.manifest().keys()))
+		self.assertIn('2 converted, 0 skipped, 0 failed', stderr)
+
+		status, stderr = self.convert([])
+		self.assertIn('0 converted, 2 skipped, 0 failed', stderr)
+
+	def testWorkerDies(self):
+
+		with mock.patch.object(command, 'convertWorker', crashingWorker):
+			status, stderr = self.convert(['a.rtf', 'crash.rtf'])
+
+		self.assertEqual(1, status)
+		self.assertIn('crash.rtf: BrokenProcessPool', stderr)
+
+		# a.rtf comes first, and there's a single worker, so it's converted
+		# before the worker dies and has to be recorded
+		self.assertIn('a.txt', self.manifest())
+		self.assertNotIn('crash.txt', self.manifest())
+
+###############################################################################
+
+if '__main__' == __name__:
+	unittest.main()
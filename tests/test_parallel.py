@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# Tests that parsing a document in chunks on several processes (see
+# RTFDOM.parseParallel and parallel.py) builds the same tree as parsing it in
+# one go, especially where the prescan has to get group boundaries right.
+#
+# Usage: python -m unittest discover -s pyrtfdom/tests -t .
+
+import unittest
+
+from pyrtfdom.dom import RTFDOM
+from pyrtfdom.parse import RTFParser
+from pyrtfdom.parallel import findChunks
+from pyrtfdom.convert import toJSON
+from pyrtfdom.benchmarks.memory import makeDocument
+
+# Chunks are made much smaller than usual, so that small documents are split
+# into lots of them
+MIN_CHUNK_SIZE = 1000
+CHUNK_COUNT = 16
+
+HEADER = (
+	'{\\rtf1\\ansi\\ansicpg1252\\deff0{\\fonttbl{\\f0 Arial;}{\\f1 Courier;}}{\\colortbl;\\red255\\green0\\blue0;}'
+	'{\\stylesheet{\\s0 Normal;}{\\s1\\qc\\b Heading;}}\n'
+)
+
+# Returns a document made of count copies of body, each of which gets its
+# number substituted for %d.
+def repeatDocument(body, count = 300):
+
+	return HEADER + ''.join(body.replace('%d', str(i)) for i in range(count)) + '}'
+
+# Name and content of each document
+DOCUMENTS = [
+	('paragraphs in groups', repeatDocument(
+		'Paragraph %d {\\b bold\\par still bold {\\i and italic\\par}} plain.\\par\n'
+	)),
+	('page breaks in groups', repeatDocument(
+		'Page %d {\\cf1 red\\page more red} plain\\par\n'
+	)),
+	('binary data with braces', repeatDocument(
+		'Image %d {\\pict\\pngblip\\picw1\\pich1\\bin12 }{\\par{\\par}} after\\par\n'
+	)),
+	('binary data at top level', repeatDocument(
+		'Data %d \\bin5 \\par} then text\\par\n'
+	)),
+	('escaped braces', repeatDocument(
+		'\\{Escaped %d\\}\\par\\}{\\b \\{ bold \\}}\\par\n\\{\\par'
+	)),
+	('escaped braces in skipped groups', repeatDocument(
+		'Text %d {\\i not a \\{ group} and {\\b \\} either}\\par\n'
+	)),
+	('fields', repeatDocument(
+		'See {\\field{\\*\\fldinst HYPERLINK "http://example.com/%d"}{\\fldrslt link \\{%d\\}}} here.\\par\n'
+		'{\\field{\\*\\fldinst PAGE}{\\fldrslt 1\\page 2\\par 3}}\\par\n'
+	)),
+	('header groups in the body', repeatDocument(
+		'\\s1 Heading %d {\\colortbl;\\red0\\green0\\blue255;}\\par\\pard\\plain Text {\\stylesheet{\\s0 Normal;}{\\s1 Heading;}} more\\par\n'
+	)),
+	('ignored destinations', repeatDocument(
+		'Text %d {\\*\\generator Writer {\\par} \\{;}{\\info{\\title Title\\par}} end\\par\n'
+	)),
+	('plain top level text', repeatDocument(
+		'Just some text at the top level, paragraph number %d.\\par\n'
+	)),
+	('generated', makeDocument(500))
+]
+
+# Returns the tree parse() builds, as JSON (see convert.toJSON.)
+def parseTree(rtfContent, normalize = False):
+
+	dom = RTFDOM(normalize)
+	dom.openString(rtfContent)
+	dom.parse()
+
+	return toJSON(dom.rootNode), dom.nodeCounts
+
+# Returns the tree parseParallel() builds, as JSON, along with the paragraphs
+# it passed to onParagraph if streaming is True.
+def parseTreeParallel(rtfContent, normalize = False, streaming = False):
+
+	dom = RTFDOM(normalize)
+	dom.PARALLEL_MIN_CHUNK_SIZE = MIN_CHUNK_SIZE
+	dom.openString(rtfContent)
+
+	if streaming:
+		paragraphs = []
+		dom.parseParallel(2, CHUNK_COUNT, lambda para: paragraphs.append(toJSON(para)))
+		return paragraphs, dom.nodeCounts
+
+	dom.parseParallel(2, CHUNK_COUNT)
+	return toJSON(dom.rootNode), dom.nodeCounts
+
+# Returns the number of chunks the document is split into.
+def countChunks(rtfContent):
+
+	ignore = lambda *args: None
+
+	parser = RTFParser({'callbacks': {
+		'onOpenParagraph':   ignore,
+		'onAppendParagraph': ignore,
+		'onStateChange':     ignore,
+		'onField':           ignore
+	}})
+	parser.openString(rtfContent)
+
+	return len(findChunks(parser, CHUNK_COUNT, MIN_CHUNK_SIZE))
+
+###############################################################################
+
+class ParseParallelTest(unittest.TestCase):
+
+	def testSameTree(self):
+
+		for name, rtfContent in DOCUMENTS:
+			with self.subTest(name):
+				self.assertGreater(countChunks(rtfContent), 2)
+				self.assertEqual(parseTree(rtfContent), parseTreeParallel(rtfContent))
+
+	def testBytes(self):
+
+		for name, rtfContent in DOCUMENTS:
+			with self.subTest(name):
+				rtfContent = rtfContent.encode('latin-1')
+				self.assertEqual(parseTree(rtfContent), parseTreeParallel(rtfContent))
+
+	def testNormalized(self):
+
+		for name, rtfContent in DOCUMENTS[:3]:
+			with self.subTest(name):
+				self.assertEqual(parseTree(rtfContent, True), parseTreeParallel(rtfContent, True))
+
+	def testStreaming(self):
+
+		for name, rtfContent in DOCUMENTS[:3]:
+			with self.subTest(name):
+				tree, nodeCounts = parseTree(rtfContent)
+				self.assertEqual((tree['children'], nodeCounts), parseTreeParallel(rtfContent, streaming = True))
+
+###############################################################################
+
+if '__main__' == __name__:
+	unittest.main()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+# Tests that the amount of work the parser does grows linearly with the size
+# of the document, for each of the features in benchmarks/scaling.py. Work is
+# measured in lines of Python executed (see scaling.countSteps), which is the
+# same on every run, unlike runtime.
+#
+# Usage: python -m unittest discover -s pyrtfdom/tests -t .
+
+import unittest
+
+from pyrtfdom.benchmarks import scaling
+
+###############################################################################
+
+class ScalingTest(unittest.TestCase):
+
+	def testLinearSteps(self):
+
+		for name, makeDocument, smallest, smallestSteps in scaling.FEATURES:
+			with self.subTest(name):
+				steps, exponent = scaling.measureSteps(makeDocument, smallestSteps)
+				self.assertLessEqual(exponent, scaling.STEP_TOLERANCE, 'steps: %r' % steps)
+
+	def testDeterministic(self):
+
+		rtfContent = scaling.nestingDocument(50)
+		self.assertEqual(scaling.countSteps(rtfContent), scaling.countSteps(rtfContent))
+
+###############################################################################
+
+if '__main__' == __name__:
+	unittest.main()
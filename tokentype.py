@@ -9,4 +9,5 @@ class TokenType(Enum):
 	CONTROL_WORDORSYM = 3
 	CHARACTER         = 4
 	EOF               = 5
+	BINARY            = 6
 